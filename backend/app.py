@@ -4,9 +4,11 @@ Salvar como: backend/app.py
 """
 
 from flask import Flask, send_from_directory, request
+import click
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from datetime import timedelta
+import hmac
 import sys
 import os
 
@@ -21,7 +23,26 @@ from backend.routes.discover_routes import discover_bp
 from backend.routes.profile_routes import profile_bp
 from backend.routes.chat_routes import chat_bp
 from backend.routes.ratings_routes import ratings_bp
-from backend.database import init_database
+from backend.routes.events_routes import events_bp
+from backend.routes.tags_routes import tags_bp
+from backend.database import (
+    init_database, init_app as init_database_app, get_pool_stats, backfill_rating_stats, backfill_tag_dictionary,
+    reload_postal_centroids
+)
+from backend.write_queue import get_write_queue_stats
+from backend.events import get_event_hub_stats
+from backend.chat_gateway import get_chat_gateway_stats
+from backend.discover_deck import get_discover_deck_stats
+from backend.tag_index import tag_index, get_tag_index_stats
+from backend.swipe_cache import get_swipe_cache_stats
+from backend.conditional import get_conditional_stats
+from backend.response_cache import get_response_cache_stats
+
+# Gateway WebSocket do chat (opcional: requer websockets)
+try:
+    from backend.chat_ws_server import ChatWebSocketServer, CHAT_WS_PORT
+except ImportError:
+    ChatWebSocketServer = None
 
 def create_app():
     """Cria e configura a aplicação Flask"""
@@ -31,6 +52,9 @@ def create_app():
     app.config['SECRET_KEY'] = 'sua-chave-secreta-aqui-mude-em-producao'
     app.config['JWT_SECRET_KEY'] = 'sua-chave-jwt-secreta-aqui-mude-em-producao'
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
+    # /api/metrics só responde com o header X-Metrics-Token igual a este valor
+    # (sem METRICS_TOKEN no ambiente, a rota fica desligada)
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
     
     # Detectar o domínio (localhost ou Codespace)
     allowed_origins = [
@@ -62,6 +86,9 @@ def create_app():
     # Inicializar JWT
     jwt = JWTManager(app)
     
+    # Pool de conexões SQLite vinculado ao contexto da aplicação
+    init_database_app(app)
+    
     # Log de requisições para debug
     @app.before_request
     def log_request():
@@ -70,12 +97,48 @@ def create_app():
         if request.method in ['POST', 'PUT']:
             print(f"   Body: {request.get_json()}")
     
+    # Comandos de manutenção (flask --app backend.app <comando>)
+    @app.cli.command('backfill-rating-stats')
+    def backfill_rating_stats_command():
+        """Recalcula os agregados de avaliações (user_rating_stats)"""
+        total = backfill_rating_stats()
+        print(f"✅ Agregados de avaliações recalculados para {total} usuários")
+    
+    @app.cli.command('backfill-tag-ids')
+    def backfill_tag_ids_command():
+        """Liga ao dicionário de tags (tag_id) as habilidades/interesses gravados sem ele"""
+        total = backfill_tag_dictionary()
+        print(f"✅ {total} tags ligadas ao dicionário")
+    
+    @app.cli.command('load-postal-centroids')
+    @click.argument('csv_path', required=False, type=click.Path(exists=True, dir_okay=False))
+    def load_postal_centroids_command(csv_path):
+        """Recarrega os centroides de CEP (os da migração 12 ou os de um CSV) e recalcula as coordenadas"""
+        ranges, located = reload_postal_centroids(csv_path)
+        print(f"✅ {ranges} faixas de CEP carregadas, {located} usuários localizados")
+    
+    @app.cli.command('recompute-recommendations')
+    @click.option('--top-k', default=100, show_default=True, help='Candidatos gravados por usuário')
+    @click.option('--chunk-size', default=2048, show_default=True, help='Linhas por multiplicação esparsa')
+    @click.option('--trace-memory', is_flag=True, help='Medir o pico de alocações (mais lento)')
+    def recompute_recommendations_command(top_k, chunk_size, trace_memory):
+        """Recalcula os decks de descoberta de todos os usuários (requer numpy e scipy)"""
+        from backend.batch_scoring import recompute_recommendations
+        report = recompute_recommendations(top_k=top_k, chunk_size=chunk_size, trace_memory=trace_memory)
+        print(f"✅ Decks recalculados: {report['decks_written']} usuários, "
+              f"{report['recommendations_written']} recomendações em {report['elapsed_s']}s "
+              f"({report['users_per_s']} usuários/s)")
+        for key, value in report.items():
+            print(f"   {key}: {value}")
+    
     # Registrar blueprints (rotas)
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(discover_bp, url_prefix='/api/discover')
     app.register_blueprint(profile_bp, url_prefix='/api/profile')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     app.register_blueprint(ratings_bp, url_prefix='/api/ratings')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
+    app.register_blueprint(tags_bp, url_prefix='/api/tags')
     
     # Rota de teste
     @app.route('/api')
@@ -88,7 +151,9 @@ def create_app():
                 'discover': '/api/discover',
                 'profile': '/api/profile',
                 'chat': '/api/chat',
-                'ratings': '/api/ratings'
+                'ratings': '/api/ratings',
+                'events': '/api/events/stream',
+                'tags': '/api/tags'
             }
         }
     
@@ -97,6 +162,27 @@ def create_app():
     def health():
         return {'status': 'healthy'}, 200
     
+    # Métricas internas (pool de conexões etc.), protegidas por METRICS_TOKEN
+    @app.route('/api/metrics')
+    def metrics():
+        expected = app.config.get('METRICS_TOKEN')
+        if not expected:
+            return {'error': 'Métricas desativadas'}, 404
+        provided = request.headers.get('X-Metrics-Token', '')
+        if not hmac.compare_digest(provided.encode(), expected.encode()):
+            return {'error': 'Token de métricas inválido'}, 403
+        return {
+            'database': get_pool_stats(),
+            'write_queue': get_write_queue_stats(),
+            'events': get_event_hub_stats(),
+            'websocket': get_chat_gateway_stats(),
+            'discover_deck': get_discover_deck_stats(),
+            'tag_index': get_tag_index_stats(),
+            'swipe_cache': get_swipe_cache_stats(),
+            'conditional_get': get_conditional_stats(),
+            'response_cache': get_response_cache_stats()
+        }, 200
+    
     # Servir arquivos estáticos do frontend
     @app.route('/')
     def index():
@@ -115,6 +201,8 @@ if __name__ == '__main__':
     # Inicializar o banco de dados
     print("🔧 Inicializando banco de dados...")
     init_database()
+    tag_index.ensure_loaded()
+    print(f"🏷️  Índice de tags carregado: {tag_index.stats()['users']} usuários")
     
     # Criar e executar a aplicação
     app = create_app()
@@ -122,6 +210,15 @@ if __name__ == '__main__':
     print("📍 Acesse: http://localhost:5000")
     print("📍 API: http://localhost:5000/api")
     print("📍 (Em Codespace, use a URL do seu preview)")
+    
+    # WebSocket do chat em porta própria; com o reloader do debug, só no
+    # processo que atende (o processo pai apenas vigia os arquivos)
+    if ChatWebSocketServer is None:
+        print("⚠️  websockets não instalado: WebSocket do chat desabilitado")
+    elif os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ws_port = int(os.environ.get('CHAT_WS_PORT', CHAT_WS_PORT))
+        ChatWebSocketServer(app, port=ws_port).start()
+        print(f"💬 WebSocket do chat: ws://localhost:{ws_port}/api/chat/ws")
     print("")
     print("⏹️  Para parar: Ctrl+C")
     print("")
@@ -0,0 +1,360 @@
+"""
+Recálculo em Lote das Recomendações (matriz esparsa usuários × tags)
+Salvar como: backend/batch_scoring.py
+
+Job noturno: monta matrizes CSR a partir de student_interests/teacher_skills,
+calcula a compatibilidade de todos os pares por multiplicação esparsa (em
+blocos de alunos ou professores, para limitar a memória), descarta os pares
+que já tiveram swipe e grava o top-K de cada usuário como o novo deck em
+discover_queue. Só os decks que mudaram ganham versão nova; um deck igual
+ao já gravado não reinicia os cursores de paginação dos clientes. Os decks
+continuam sendo completados/recalculados online pelo backend/discover_deck.py
+entre uma execução e outra.
+
+A pontuação e a ordem são as do caminho online (discover_deck.rank_candidates),
+então o deck não muda conforme quem o montou:
+- aluno: tags em comum (tag_index.score), com matrizes de 0/1;
+- professor: soma, por tag em comum, do melhor encaixe de nível e avaliação
+  (discover_deck.level_fit_weight, a conta de TEACHER_SCORES_SQL). A coluna
+  é (tag, níveis do professor nessa tag) e a célula do aluno já guarda o
+  melhor encaixe contra esses níveis, então o produto escalar soma um
+  encaixe por tag, como o MAX do SQL;
+- empates pela média de avaliações e depois pelo id.
+
+Requer numpy e scipy, usados apenas por este job:
+    flask --app backend.app recompute-recommendations --top-k 100
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+
+from backend.database import get_read_connection, get_write_connection
+from backend.discover_deck import (
+    INSERT_DECK_ROW_SQL, UPSERT_DECK_STATE_SQL, deck_row, deck_state_row, level_fit_weight, level_rank
+)
+
+DEFAULT_TOP_K = 100
+DEFAULT_CHUNK_SIZE = 2048
+
+# Usuários gravados por transação (o escritor é liberado entre um lote e outro)
+WRITE_BATCH_USERS = 500
+
+# Casas decimais da pontuação (as mesmas de discover_deck.teacher_scores)
+SCORE_DECIMALS = 4
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _read_tags(cursor, query):
+    """{user_id: {tag_id: {(nível, exige avaliação)}}} em ordem crescente de user_id"""
+    cursor.execute(query)
+    tags = {}
+    for user_id, tag_id, level, requires_evaluation in cursor:
+        levels = tags.setdefault(user_id, {}).setdefault(tag_id, set())
+        levels.add((level_rank(level), bool(requires_evaluation)))
+    return tags
+
+
+def _to_csr(entries, n_rows, n_columns):
+    if entries:
+        rows, columns = zip(*entries)
+        weights = list(entries.values())
+    else:
+        rows, columns, weights = (), (), ()
+    return sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(columns, dtype=np.int32))),
+        shape=(n_rows, n_columns)
+    )
+
+
+def load_tag_matrices(cursor):
+    """
+    Matrizes CSR das duas passadas e os user_ids de cada linha, em ordem
+    crescente de id (a coluna do produto desempata por id):
+    - students, teachers: usuários × tags com 1 por tag (passada dos alunos);
+    - teacher_levels, student_fits: professores e alunos × (tag, níveis do
+      professor), 1 para o professor e o melhor encaixe para o aluno
+      (passada dos professores).
+    """
+    student_tags = _read_tags(cursor, '''
+        SELECT i.user_id, i.tag_id, COALESCE(i.desired_level, i.difficulty_level), i.requires_evaluation
+        FROM student_interests i
+        JOIN users u ON u.id = i.user_id
+        WHERE u.user_type = 'student' AND i.tag_id IS NOT NULL
+        ORDER BY i.user_id
+    ''')
+    teacher_tags = _read_tags(cursor, '''
+        SELECT s.user_id, s.tag_id, s.skill_level, s.requires_evaluation
+        FROM teacher_skills s
+        JOIN users u ON u.id = s.user_id
+        WHERE u.user_type = 'teacher' AND s.tag_id IS NOT NULL
+        ORDER BY s.user_id
+    ''')
+
+    vocabulary = {}
+    student_entries = {
+        (row, vocabulary.setdefault(tag_id, len(vocabulary))): 1.0
+        for row, tags in enumerate(student_tags.values()) for tag_id in tags
+    }
+    teacher_entries = {
+        (row, vocabulary.setdefault(tag_id, len(vocabulary))): 1.0
+        for row, tags in enumerate(teacher_tags.values()) for tag_id in tags
+    }
+
+    # Professor com a mesma tag em níveis diferentes tem uma coluna própria
+    # (o conjunto de níveis), para o aluno guardar o melhor encaixe contra todos
+    level_columns = {}
+    teacher_level_entries = {}
+    for row, tags in enumerate(teacher_tags.values()):
+        for tag_id, levels in tags.items():
+            column = level_columns.setdefault((tag_id, frozenset(levels)), len(level_columns))
+            teacher_level_entries[(row, column)] = 1.0
+    columns_by_tag = {}
+    for (tag_id, levels), column in level_columns.items():
+        columns_by_tag.setdefault(tag_id, []).append((column, levels))
+
+    best_fit = {}
+    student_fit_entries = {}
+    for row, tags in enumerate(student_tags.values()):
+        for tag_id, student_levels in tags.items():
+            for column, teacher_levels in columns_by_tag.get(tag_id, ()):
+                key = (teacher_levels, frozenset(student_levels))
+                if key not in best_fit:
+                    best_fit[key] = max(
+                        level_fit_weight(teacher_rank, student_rank, teacher_evaluation, student_evaluation)
+                        for teacher_rank, teacher_evaluation in teacher_levels
+                        for student_rank, student_evaluation in student_levels
+                    )
+                student_fit_entries[(row, column)] = best_fit[key]
+
+    n_students, n_teachers = len(student_tags), len(teacher_tags)
+    return {
+        'student_ids': np.asarray(list(student_tags), dtype=np.int64),
+        'teacher_ids': np.asarray(list(teacher_tags), dtype=np.int64),
+        'students': _to_csr(student_entries, n_students, len(vocabulary)),
+        'teachers': _to_csr(teacher_entries, n_teachers, len(vocabulary)),
+        'teacher_levels': _to_csr(teacher_level_entries, n_teachers, len(level_columns)),
+        'student_fits': _to_csr(student_fit_entries, n_students, len(level_columns)),
+        'tags': len(vocabulary)
+    }
+
+
+def load_rating_averages(cursor, user_ids):
+    """Média de avaliações de cada user_id (0 sem avaliações), no desempate do caminho online"""
+    cursor.execute('''
+        SELECT user_id, rating_sum * 1.0 / rating_count FROM user_rating_stats WHERE rating_count > 0
+    ''')
+    averages = dict(cursor.fetchall())
+    return np.asarray([averages.get(int(user_id), 0.0) for user_id in user_ids], dtype=np.float64)
+
+
+def load_swiped_matrices(cursor, student_ids, teacher_ids):
+    """Pares já avaliados como matrizes esparsas aluno→professor e professor→aluno"""
+    student_row = {int(user_id): row for row, user_id in enumerate(student_ids)}
+    teacher_row = {int(user_id): row for row, user_id in enumerate(teacher_ids)}
+    by_student = ([], [])
+    by_teacher = ([], [])
+
+    cursor.execute('SELECT from_user_id, to_user_id FROM swipes')
+    for from_user_id, to_user_id in cursor:
+        if from_user_id in student_row and to_user_id in teacher_row:
+            by_student[0].append(student_row[from_user_id])
+            by_student[1].append(teacher_row[to_user_id])
+        elif from_user_id in teacher_row and to_user_id in student_row:
+            by_teacher[0].append(teacher_row[from_user_id])
+            by_teacher[1].append(student_row[to_user_id])
+
+    def build(pairs, shape):
+        return sparse.csr_matrix(
+            (np.ones(len(pairs[0]), dtype=np.float32), (pairs[0], pairs[1])), shape=shape
+        )
+
+    return (
+        build(by_student, (len(student_ids), len(teacher_ids))),
+        build(by_teacher, (len(teacher_ids), len(student_ids)))
+    )
+
+
+def top_k_scores(viewers, candidates, swiped, top_k, chunk_size=DEFAULT_CHUNK_SIZE, candidate_ratings=None):
+    """
+    Para cada linha de viewers, os top_k candidatos por score (produto
+    escalar dos pesos das tags, arredondado a SCORE_DECIMALS), sem os pares
+    em swiped. Gera (linha, colunas, scores) em ordem de score decrescente,
+    média de avaliações decrescente (candidate_ratings, por coluna) e coluna crescente.
+    """
+    if candidate_ratings is None:
+        candidate_ratings = np.zeros(candidates.shape[0])
+    candidates_t = candidates.T.tocsc()
+    for start in range(0, viewers.shape[0], chunk_size):
+        product = (viewers[start:start + chunk_size] @ candidates_t).tocsr()
+        if swiped.nnz:
+            product = (product - product.multiply(swiped[start:start + chunk_size])).tocsr()
+            product.eliminate_zeros()
+
+        for offset in range(product.shape[0]):
+            low, high = product.indptr[offset], product.indptr[offset + 1]
+            if low == high:
+                continue
+            columns = product.indices[low:high]
+            scores = np.round(product.data[low:high].astype(np.float64), SCORE_DECIMALS)
+            if len(scores) > top_k:
+                # Mantém todos os empatados com o k-ésimo; o desempate decide quem entra
+                threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+                keep = scores >= threshold
+                columns, scores = columns[keep], scores[keep]
+            order = np.lexsort((columns, -candidate_ratings[columns], -scores))[:top_k]
+            yield start + offset, columns[order], scores[order]
+
+
+def _deck_unchanged(cursor, user_id, candidates):
+    """
+    O deck gravado não está stale e já começa pelos mesmos candidatos, na
+    mesma ordem e com os mesmos scores (o restante é a recarga online, que
+    segue valendo)
+    """
+    cursor.execute('SELECT stale FROM discover_deck_state WHERE user_id = ?', (user_id,))
+    state = cursor.fetchone()
+    if state is None or state[0]:
+        return False
+    cursor.execute(
+        'SELECT candidate_id, score FROM discover_queue WHERE user_id = ? ORDER BY position LIMIT ?',
+        (user_id, max(len(candidates), 1))
+    )
+    return [(row[0], round(row[1], SCORE_DECIMALS)) for row in cursor.fetchall()] == [
+        (candidate_id, round(score, SCORE_DECIMALS)) for candidate_id, score in candidates
+    ]
+
+
+def _write_decks(decks):
+    """
+    Grava os decks informados [(user_id, user_type, [(candidate_id, score)])]
+    em uma transação. Só os decks cujo conteúdo mudou são substituídos e
+    ganham versão nova; os demais mantêm linhas, posições e versão, para os
+    cursores de paginação dos clientes continuarem valendo.
+    Retorna quantos decks mudaram.
+    """
+    conn = get_write_connection()
+    cursor = conn.cursor()
+    try:
+        changed = [deck for deck in decks if not _deck_unchanged(cursor, deck[0], deck[2])]
+        changed_ids = {user_id for user_id, _, _ in changed}
+        cursor.executemany('DELETE FROM discover_queue WHERE user_id = ?', [(user_id,) for user_id in changed_ids])
+        cursor.executemany(INSERT_DECK_ROW_SQL, [
+            deck_row(user_id, candidate_id, position, score)
+            for user_id, _, candidates in changed
+            for position, (candidate_id, score) in enumerate(candidates)
+        ])
+        # Deck recalculado: não está stale e pode ser completado online com os candidatos sem score
+        cursor.executemany(UPSERT_DECK_STATE_SQL, [
+            deck_state_row(user_id, user_type, exhausted=False, rebuild=True, new_version=user_id in changed_ids)
+            for user_id, user_type, _ in decks
+        ])
+        conn.commit()
+        return len(changed)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _mark_stale(user_ids):
+    """Decks que o job não reescreveu (sem candidato pontuado) são recalculados online"""
+    conn = get_write_connection()
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(user_ids), WRITE_BATCH_USERS):
+            cursor.executemany(
+                'UPDATE discover_deck_state SET stale = 1 WHERE user_id = ? AND stale = 0',
+                [(user_id,) for user_id in user_ids[start:start + WRITE_BATCH_USERS]]
+            )
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def recompute_recommendations(top_k=DEFAULT_TOP_K, chunk_size=DEFAULT_CHUNK_SIZE, trace_memory=False):
+    """
+    Recalcula o deck de todos os alunos e professores com tags. Decks de
+    quem ficou sem candidato pontuado são marcados como stale.
+    Retorna um relatório com volumes, tempo de cada etapa, vazão e pico de memória
+    (trace_memory mede o pico de alocações via tracemalloc, mas deixa o job mais lento).
+    """
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor()
+        matrices = load_tag_matrices(cursor)
+        student_ids, teacher_ids = matrices['student_ids'], matrices['teacher_ids']
+        swiped_by_student, swiped_by_teacher = load_swiped_matrices(cursor, student_ids, teacher_ids)
+        student_ratings = load_rating_averages(cursor, student_ids)
+        teacher_ratings = load_rating_averages(cursor, teacher_ids)
+        cursor.execute('SELECT user_id FROM discover_deck_state')
+        existing_decks = {row[0] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+    loaded = time.perf_counter()
+
+    pairs = 0
+    written = 0
+    changed = 0
+    pending = []
+    rewritten = set()
+    passes = (
+        (matrices['students'], student_ids, 'student',
+         matrices['teachers'], teacher_ids, teacher_ratings, swiped_by_student),
+        (matrices['teacher_levels'], teacher_ids, 'teacher',
+         matrices['student_fits'], student_ids, student_ratings, swiped_by_teacher),
+    )
+    for viewers, viewer_ids, viewer_type, candidates, candidate_ids, ratings, swiped in passes:
+        for row, columns, scores in top_k_scores(viewers, candidates, swiped, top_k, chunk_size, ratings):
+            deck = [(int(candidate_id), float(score))
+                    for candidate_id, score in zip(candidate_ids[columns], scores)]
+            pending.append((int(viewer_ids[row]), viewer_type, deck))
+            rewritten.add(int(viewer_ids[row]))
+            pairs += len(deck)
+            if len(pending) >= WRITE_BATCH_USERS:
+                changed += _write_decks(pending)
+                written += len(pending)
+                pending = []
+    if pending:
+        changed += _write_decks(pending)
+        written += len(pending)
+    stale = sorted(existing_decks - rewritten)
+    _mark_stale(stale)
+
+    finished = time.perf_counter()
+
+    elapsed = finished - started
+    report = {
+        'students': len(student_ids),
+        'teachers': len(teacher_ids),
+        'tags': matrices['tags'],
+        'recommendations_written': pairs,
+        'decks_written': written,
+        'decks_changed': changed,
+        'decks_marked_stale': len(stale),
+        'load_s': round(loaded - started, 3),
+        'score_and_write_s': round(finished - loaded, 3),
+        'elapsed_s': round(elapsed, 3),
+        'users_per_s': round((len(student_ids) + len(teacher_ids)) / elapsed, 1) if elapsed else None
+    }
+    if trace_memory:
+        report['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+    if resource is not None:
+        # ru_maxrss vem em KB no Linux
+        report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
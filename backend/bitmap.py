@@ -0,0 +1,199 @@
+"""
+Bitmap Comprimido de Inteiros (estilo Roaring)
+Salvar como: backend/bitmap.py
+
+Os ids são divididos pelos 16 bits altos; cada faixa de 65536 ids vira
+um contêiner com a representação mais compacta para o seu conteúdo:
+
+- ArrayContainer: lista ordenada dos 16 bits baixos (até 4096 valores);
+- BitmapContainer: 8 KB, um bit por valor (faixas densas);
+- RunContainer: intervalos [início, fim] (ids consecutivos, comum em
+  usuários que avaliam perfis em sequência).
+
+Usado para guardar em memória os perfis que cada usuário já avaliou
+(backend/swipe_cache.py).
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Acima disso um array ocupa mais que o bitmap de 8 KB
+ARRAY_MAX_SIZE = 4096
+BITMAP_BYTES = 8192
+
+
+class ArrayContainer:
+    __slots__ = ('values',)
+
+    def __init__(self, values=None):
+        self.values = values if values is not None else array('H')
+
+    def __contains__(self, low):
+        position = bisect_left(self.values, low)
+        return position < len(self.values) and self.values[position] == low
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def add(self, low):
+        """Retorna o contêiner resultante (vira bitmap ao passar de ARRAY_MAX_SIZE)"""
+        position = bisect_left(self.values, low)
+        if position < len(self.values) and self.values[position] == low:
+            return self
+        if len(self.values) >= ARRAY_MAX_SIZE:
+            return BitmapContainer.from_values(self.values).add(low)
+        self.values.insert(position, low)
+        return self
+
+    def size_in_bytes(self):
+        return 2 * len(self.values)
+
+
+class BitmapContainer:
+    __slots__ = ('bits', 'cardinality')
+
+    def __init__(self):
+        self.bits = bytearray(BITMAP_BYTES)
+        self.cardinality = 0
+
+    @classmethod
+    def from_values(cls, values):
+        container = cls()
+        for low in values:
+            container.bits[low >> 3] |= 1 << (low & 7)
+        container.cardinality = len(values)
+        return container
+
+    def __contains__(self, low):
+        return bool(self.bits[low >> 3] & (1 << (low & 7)))
+
+    def __len__(self):
+        return self.cardinality
+
+    def __iter__(self):
+        bits = self.bits
+        for index in range(BITMAP_BYTES):
+            byte = bits[index]
+            if byte:
+                base = index << 3
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield base + bit
+
+    def add(self, low):
+        mask = 1 << (low & 7)
+        if not self.bits[low >> 3] & mask:
+            self.bits[low >> 3] |= mask
+            self.cardinality += 1
+        return self
+
+    def size_in_bytes(self):
+        return BITMAP_BYTES
+
+
+class RunContainer:
+    __slots__ = ('starts', 'ends', 'cardinality')
+
+    def __init__(self, starts, ends):
+        self.starts = starts
+        self.ends = ends
+        self.cardinality = sum(end - start + 1 for start, end in zip(starts, ends))
+
+    @classmethod
+    def from_sorted(cls, values):
+        starts, ends = array('H'), array('H')
+        for low in values:
+            if ends and low == ends[-1] + 1:
+                ends[-1] = low
+            else:
+                starts.append(low)
+                ends.append(low)
+        return cls(starts, ends)
+
+    def __contains__(self, low):
+        position = bisect_right(self.starts, low) - 1
+        return position >= 0 and low <= self.ends[position]
+
+    def __len__(self):
+        return self.cardinality
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield from range(start, end + 1)
+
+    def add(self, low):
+        # Runs são otimizados para leitura; uma escrita volta para array/bitmap
+        if low in self:
+            return self
+        return _values_container(list(self)).add(low)
+
+    def size_in_bytes(self):
+        return 4 * len(self.starts)
+
+
+def _values_container(values):
+    if len(values) > ARRAY_MAX_SIZE:
+        return BitmapContainer.from_values(values)
+    return ArrayContainer(array('H', values))
+
+
+def _best_container(values):
+    """Menor representação para os valores (ordenados, sem repetição)"""
+    runs = RunContainer.from_sorted(values)
+    plain = _values_container(values)
+    return runs if runs.size_in_bytes() < plain.size_in_bytes() else plain
+
+
+class RoaringBitmap:
+    """Conjunto de inteiros não negativos com contêineres por faixa de 65536"""
+
+    __slots__ = ('_containers',)
+
+    def __init__(self, values=()):
+        self._containers = {}
+        if values:
+            self._bulk_load(sorted(set(values)))
+
+    def _bulk_load(self, values):
+        high = None
+        chunk = []
+        for value in values:
+            if value >> 16 != high:
+                if chunk:
+                    self._containers[high] = _best_container(chunk)
+                high = value >> 16
+                chunk = []
+            chunk.append(value & 0xFFFF)
+        if chunk:
+            self._containers[high] = _best_container(chunk)
+
+    def add(self, value):
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            container = ArrayContainer()
+        self._containers[high] = container.add(low)
+
+    def __contains__(self, value):
+        container = self._containers.get(value >> 16)
+        return container is not None and (value & 0xFFFF) in container
+
+    def __len__(self):
+        return sum(len(container) for container in self._containers.values())
+
+    def __iter__(self):
+        for high in sorted(self._containers):
+            base = high << 16
+            for low in self._containers[high]:
+                yield base + low
+
+    def run_optimize(self):
+        """Reescolhe a representação de cada contêiner (após muitas inserções)"""
+        for high, container in list(self._containers.items()):
+            self._containers[high] = _best_container(list(container))
+
+    def size_in_bytes(self):
+        return sum(container.size_in_bytes() for container in self._containers.values())
@@ -0,0 +1,207 @@
+"""
+Gateway de Chat via WebSocket (protocolo de frames, independente do servidor)
+Salvar como: backend/chat_gateway.py
+
+Cada socket autenticado vira uma ChatConnection inscrita no event_hub, o
+mesmo hub que alimenta o stream SSE: uma mensagem enviada por HTTP ou por
+WebSocket chega às conexões abertas dos dois participantes, em qualquer
+um dos transportes. O frontend web usa SSE + HTTP; o gateway atende
+clientes que preferem um único socket bidirecional (ex.: apps móveis).
+
+O servidor (backend/chat_ws_server.py) atende todos os sockets em um único
+event loop: um socket ocioso custa uma corrotina e uma inscrição no hub,
+sem thread própria. Acima de MAX_CONNECTIONS sockets por processo a
+conexão é recusada e o cliente deve usar SSE + HTTP.
+
+Frames do cliente (JSON):
+- {"type": "send", "match_id": 1, "message_text": "Oi", "client_id": "a1"}
+- {"type": "read", "match_id": 1, "client_id": "a2"}
+- {"type": "ack", "event_id": 42}  (confirma o recebimento de um evento)
+
+Frames do servidor:
+- {"type": "ack", "client_id": "a1", "message_id": 10}  (send/read aceitos)
+- {"type": "error", "client_id": "a1", "error": "..."}
+- {"type": "message" | "unread" | "match" | "rating", "event_id": 42, "data": {...}}
+- {"type": "resync"}  (eventos descartados, o cliente deve recarregar)
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from backend.events import event_hub
+from backend.routes.chat_routes import deliver_message, mark_conversation_read
+
+# Eventos enviados aguardando ack do cliente, por conexão (para medir a entrega)
+MAX_PENDING_ACKS = 100
+
+# Sockets simultâneos por processo (cada um é um descritor de arquivo:
+# o ulimit -n do processo precisa ficar acima deste valor)
+MAX_CONNECTIONS = 10000
+
+
+class ChatConnection:
+    """Um socket aberto de um usuário"""
+
+    def __init__(self, user_id, subscription):
+        self.user_id = user_id
+        self.subscription = subscription
+        self.opened_at = time.time()
+        # event_id -> published_at dos eventos ainda não confirmados
+        self.pending_acks = OrderedDict()
+
+
+class ChatGateway:
+    """Interpreta os frames dos sockets e distribui os eventos do hub"""
+
+    def __init__(self, hub=event_hub, max_connections=MAX_CONNECTIONS):
+        self.hub = hub
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._stats = {
+            'connections': 0,
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'connections_rejected': 0,
+            'frames_in': 0,
+            'frames_out': 0,
+            'frame_errors': 0,
+            'frame_latency_ms_total': 0.0,
+            'frame_latency_ms_max': 0.0,
+            'acks': 0,
+            'delivery_latency_ms_total': 0.0,
+            'delivery_latency_ms_max': 0.0
+        }
+
+    def connect(self, user_id, notify=None):
+        """
+        Nova conexão do usuário, ou None se o limite de sockets foi atingido.
+        notify é chamado a cada evento publicado para a conexão (ver Subscription).
+        """
+        with self._lock:
+            if self._stats['connections'] >= self.max_connections:
+                self._stats['connections_rejected'] += 1
+                return None
+            self._stats['connections'] += 1
+            self._stats['connections_opened'] += 1
+        return ChatConnection(user_id, self.hub.subscribe(user_id, notify))
+
+    def disconnect(self, connection):
+        self.hub.unsubscribe(connection.subscription)
+        with self._lock:
+            self._stats['connections'] -= 1
+            self._stats['connections_closed'] += 1
+
+    def next_frame(self, connection, timeout=None):
+        """Próximo frame a enviar para o socket, ou None se nada chegar no timeout"""
+        event = connection.subscription.get(timeout=timeout)
+        if connection.subscription.overflowed:
+            connection.subscription.overflowed = False
+            connection.pending_acks.clear()
+            self._count_out()
+            return {'type': 'resync'}
+        if event is None:
+            return None
+
+        connection.pending_acks[event['id']] = event['published_at']
+        if len(connection.pending_acks) > MAX_PENDING_ACKS:
+            connection.pending_acks.popitem(last=False)
+        self._count_out()
+        return {'type': event['type'], 'event_id': event['id'], 'data': event['data']}
+
+    def handle_frame(self, connection, raw):
+        """Processa um frame recebido; retorna o frame de resposta (ou None)"""
+        started = time.perf_counter()
+        reply = self._dispatch(connection, raw)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self._stats['frames_in'] += 1
+            self._stats['frame_latency_ms_total'] += elapsed_ms
+            self._stats['frame_latency_ms_max'] = max(self._stats['frame_latency_ms_max'], elapsed_ms)
+            if reply is not None:
+                self._stats['frames_out'] += 1
+                if reply['type'] == 'error':
+                    self._stats['frame_errors'] += 1
+        return reply
+
+    def _dispatch(self, connection, raw):
+        try:
+            frame = json.loads(raw)
+        except (TypeError, ValueError):
+            return {'type': 'error', 'error': 'Frame deve ser um JSON válido'}
+        if not isinstance(frame, dict):
+            return {'type': 'error', 'error': 'Frame deve ser um objeto JSON'}
+
+        client_id = frame.get('client_id')
+        frame_type = frame.get('type')
+
+        if frame_type == 'ack':
+            self._record_ack(connection, frame.get('event_id'))
+            return None
+
+        if frame_type not in ('send', 'read'):
+            return _error(client_id, 'Tipo de frame desconhecido')
+
+        match_id = frame.get('match_id')
+        if not isinstance(match_id, int) or isinstance(match_id, bool):
+            return _error(client_id, 'match_id inválido')
+
+        try:
+            if frame_type == 'read':
+                if mark_conversation_read(match_id, connection.user_id) is None:
+                    return _error(client_id, 'Match não encontrado')
+                return {'type': 'ack', 'client_id': client_id, 'match_id': match_id}
+
+            message_text = frame.get('message_text')
+            if not isinstance(message_text, str) or not message_text.strip():
+                return _error(client_id, 'Mensagem não pode estar vazia')
+
+            result = deliver_message(connection.user_id, match_id, message_text.strip())
+            if result is None:
+                return _error(client_id, 'Match não encontrado ou inválido')
+            return {'type': 'ack', 'client_id': client_id, 'message_id': result['message_id']}
+
+        except Exception as e:
+            print(f"Erro no frame WebSocket ({frame_type}): {e}")
+            return _error(client_id, 'Erro ao processar frame')
+
+    def _record_ack(self, connection, event_id):
+        published_at = connection.pending_acks.pop(event_id, None)
+        if published_at is None:
+            return
+        latency_ms = (time.time() - published_at) * 1000
+        with self._lock:
+            self._stats['acks'] += 1
+            self._stats['delivery_latency_ms_total'] += latency_ms
+            self._stats['delivery_latency_ms_max'] = max(self._stats['delivery_latency_ms_max'], latency_ms)
+
+    def _count_out(self):
+        with self._lock:
+            self._stats['frames_out'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        frame_latency_total = stats.pop('frame_latency_ms_total')
+        delivery_latency_total = stats.pop('delivery_latency_ms_total')
+        stats['frame_latency_ms_avg'] = (
+            frame_latency_total / stats['frames_in'] if stats['frames_in'] else 0.0
+        )
+        stats['delivery_latency_ms_avg'] = (
+            delivery_latency_total / stats['acks'] if stats['acks'] else 0.0
+        )
+        return stats
+
+
+def _error(client_id, message):
+    return {'type': 'error', 'client_id': client_id, 'error': message}
+
+
+chat_gateway = ChatGateway()
+
+
+def get_chat_gateway_stats():
+    """Métricas do gateway WebSocket"""
+    return chat_gateway.stats()
@@ -0,0 +1,183 @@
+"""
+Servidor WebSocket do Chat (asyncio, biblioteca websockets)
+Salvar como: backend/chat_ws_server.py
+
+Conexão: ws://<host>:<CHAT_WS_PORT>/api/chat/ws?token=<token de POST /api/events/token>
+(o WebSocket do navegador não envia headers, então vai na query string o
+token curto do stream; o JWT de login só é aceito no header Authorization).
+O protocolo de frames está em backend/chat_gateway.py.
+
+Um único event loop, em uma thread do processo, atende todos os sockets:
+um socket ocioso custa uma corrotina e uma inscrição no event_hub, sem
+thread do sistema. O hub acorda a corrotina pelo notify da inscrição
+(call_soon_threadsafe), então publicar continua sendo uma chamada comum
+nas rotas HTTP. Só o que toca o banco ou o app Flask (autenticação e
+frames send/read) sai do loop, para um pool de FRAME_WORKERS threads.
+
+O servidor HTTP (Flask) segue na porta 5000; o WebSocket escuta em
+CHAT_WS_PORT e é iniciado por python backend/app.py. Acima de
+chat_gateway.MAX_CONNECTIONS sockets por processo a conexão é fechada com
+1013 e o cliente deve usar SSE + HTTP.
+"""
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from flask_jwt_extended import decode_token
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from backend.chat_gateway import chat_gateway
+from backend.routes.events_routes import user_from_stream_token
+
+CHAT_WS_PATH = '/api/chat/ws'
+
+# Porta padrão do WebSocket (o HTTP fica na 5000)
+CHAT_WS_PORT = 5001
+
+# Intervalo máximo sem frames do servidor; mantém proxies e NATs com a conexão aberta
+PING_INTERVAL_S = 25
+
+# Threads para autenticação e frames que acessam o banco (o loop nunca bloqueia)
+FRAME_WORKERS = 8
+
+# Tamanho máximo de um frame do cliente; limita a memória por socket
+MAX_FRAME_BYTES = 64 * 1024
+
+# Código de fechamento para violação de política (token ausente/inválido)
+CLOSE_POLICY_VIOLATION = 1008
+
+# Código de fechamento para servidor sem capacidade (limite de sockets)
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class ChatWebSocketServer:
+    """Event loop do WebSocket do chat, rodando em uma thread própria"""
+
+    def __init__(self, app, gateway=chat_gateway, host='0.0.0.0', port=CHAT_WS_PORT,
+                 frame_workers=FRAME_WORKERS):
+        self.app = app
+        self.gateway = gateway
+        self.host = host
+        self.port = port
+        self.frame_workers = frame_workers
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._stopped = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """Inicia o servidor e retorna a porta em que ele escuta (port=0 escolhe uma livre)"""
+        self._executor = ThreadPoolExecutor(self.frame_workers, thread_name_prefix='chat-ws')
+        self._thread = threading.Thread(target=self._run, name='chat-ws-loop', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self.port
+
+    def stop(self):
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.set()
+            self._loop.close()
+
+    async def _serve(self):
+        self._stopped = asyncio.Event()
+        async with serve(
+            self._handle, self.host, self.port,
+            process_request=self._check_path,
+            max_size=MAX_FRAME_BYTES
+        ) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stopped.wait()
+
+    def _check_path(self, connection, request):
+        if urlsplit(request.path).path != CHAT_WS_PATH:
+            return connection.respond(HTTPStatus.NOT_FOUND, 'Not Found\n')
+        return None
+
+    async def _in_app(self, func, *args):
+        """Executa func no pool de threads, dentro do contexto do app Flask"""
+        def call():
+            with self.app.app_context():
+                return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def _authenticate(self, query, authorization):
+        token = parse_qs(query).get('token', [None])[0]
+        user_id = user_from_stream_token(token)
+        if user_id is not None:
+            return user_id
+        try:
+            if not authorization or not authorization.startswith('Bearer '):
+                raise ValueError('token ausente')
+            claims = decode_token(authorization[len('Bearer '):])
+            return int(claims[self.app.config['JWT_IDENTITY_CLAIM']])
+        except Exception as e:
+            print(f"WebSocket recusado: {e}")
+            return None
+
+    async def _handle(self, websocket):
+        request = websocket.request
+        user_id = await self._in_app(
+            self._authenticate, urlsplit(request.path).query, request.headers.get('Authorization')
+        )
+        if user_id is None:
+            await websocket.close(CLOSE_POLICY_VIOLATION, 'Token inválido')
+            return
+
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        connection = self.gateway.connect(user_id, notify=lambda: loop.call_soon_threadsafe(wakeup.set))
+        if connection is None:
+            await websocket.close(CLOSE_TRY_AGAIN_LATER, 'Limite de conexões atingido')
+            return
+
+        pusher = asyncio.create_task(self._push_events(websocket, connection, wakeup))
+        try:
+            async for raw in websocket:
+                reply = await self._in_app(self.gateway.handle_frame, connection, raw)
+                if reply is not None:
+                    await websocket.send(json.dumps(reply, ensure_ascii=False))
+        except ConnectionClosed:
+            pass
+        finally:
+            pusher.cancel()
+            self.gateway.disconnect(connection)
+
+    async def _push_events(self, websocket, connection, wakeup):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), PING_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    await websocket.send(json.dumps({'type': 'ping'}))
+                    continue
+                # Limpar antes de drenar: um evento publicado durante o envio acorda de novo
+                wakeup.clear()
+                frame = self.gateway.next_frame(connection, timeout=0)
+                while frame is not None:
+                    await websocket.send(json.dumps(frame, ensure_ascii=False))
+                    frame = self.gateway.next_frame(connection, timeout=0)
+        except ConnectionClosed:
+            pass
@@ -0,0 +1,135 @@
+"""
+Respostas Condicionais (ETag / 304) nas Rotas de Leitura
+Salvar como: backend/conditional.py
+
+Cada usuário tem contadores em user_versions, incrementados por triggers
+(migração 8): profile_version muda com o cadastro, as tags e a média de
+avaliações; activity_version com swipes, matches, conversas, avaliações
+e mudanças no perfil de quem deu match com ele.
+
+O ETag de uma rota é derivado desses contadores. A versão é lida antes da
+consulta da rota, em uma busca pela chave primária: se o cliente já tem
+essa versão (If-None-Match), a resposta é 304 sem executar a rota. Uma
+escrita entre a leitura da versão e a da rota só deixa o ETag mais velho
+que o conteúdo, o que força uma nova consulta na próxima visita.
+
+Com cache=True o corpo da resposta também fica guardado no processo
+(backend/response_cache.py), válido enquanto o ETag for o mesmo.
+"""
+
+import hashlib
+import threading
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from backend.database import get_read_connection
+from backend.loaders import placeholders
+from backend.response_cache import response_cache
+
+_stats_lock = threading.Lock()
+_stats = {
+    'not_modified': 0,
+    'full': 0
+}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def read_versions(cursor, user_ids):
+    """{user_id: (profile_version, activity_version)} dos usuários existentes"""
+    user_ids = sorted(set(user_ids))
+    cursor.execute(
+        f'''
+        SELECT user_id, profile_version, activity_version
+        FROM user_versions WHERE user_id IN ({placeholders(user_ids)})
+        ''',
+        user_ids
+    )
+    return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def _snapshot(response):
+    return response.status_code, response.get_data(), response.mimetype
+
+
+def conditional_get(name, profile_of=None, activity=False, cache=False):
+    """
+    Decorator para rotas GET autenticadas (aplicar abaixo de @jwt_required()).
+
+    - profile_of: 'self' (usuário autenticado) ou o nome do argumento da rota
+      com o id do usuário cujo perfil é exibido
+    - activity: a resposta depende da atividade do usuário autenticado
+    - cache: guardar a resposta em backend/response_cache.py, validada pelo ETag
+
+    O perfil de outro usuário não depende de quem o visualiza: o ETag e o
+    cache são do dono do perfil.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current_user_id = int(get_jwt_identity())
+            profile_user_id = None
+            if profile_of == 'self':
+                profile_user_id = current_user_id
+            elif profile_of is not None:
+                profile_user_id = kwargs[profile_of]
+
+            conn = get_read_connection()
+            try:
+                versions = read_versions(
+                    conn.cursor(), [uid for uid in (current_user_id, profile_user_id) if uid is not None]
+                )
+            finally:
+                conn.close()
+
+            owner = current_user_id if activity or profile_user_id is None else profile_user_id
+            query = request.query_string.decode()
+            parts = [name, owner, query]
+            if profile_user_id is not None:
+                if profile_user_id not in versions:
+                    # Usuário inexistente: a rota responde o erro
+                    return view(*args, **kwargs)
+                parts += [profile_user_id, versions[profile_user_id][0]]
+            if activity:
+                if current_user_id not in versions:
+                    return view(*args, **kwargs)
+                parts.append(versions[current_user_id][1])
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                _count('not_modified')
+                response = current_app.response_class(status=304)
+            elif cache:
+                _count('full')
+                status, data, mimetype = response_cache.get_or_compute(
+                    (name, owner, query), etag,
+                    lambda: _snapshot(make_response(view(*args, **kwargs))),
+                    store_if=lambda snapshot: snapshot[0] == 200
+                )
+                response = current_app.response_class(data, status=status, mimetype=mimetype)
+                if status != 200:
+                    return response
+            else:
+                _count('full')
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            # O navegador guarda a resposta, mas sempre revalida com o ETag
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def get_conditional_stats():
+    """Respostas 304 e respostas completas das rotas com ETag"""
+    with _stats_lock:
+        return dict(_stats)
@@ -3,194 +3,413 @@ Configuração do Banco de Dados SQLite
 Salvar como: backend/database.py
 """
 
+import pathlib
 import sqlite3
-from datetime import datetime
+import threading
+import time
+
+from flask import g, has_app_context
+
+from backend.migrations import migrate, rebuild_rating_stats
 
 DATABASE_PATH = 'tintin.db'
 
-def get_db_connection():
-    """Retorna uma conexão com o banco de dados SQLite"""
-    conn = sqlite3.connect(DATABASE_PATH)
+# Ajustes aplicados uma única vez, quando a conexão é aberta
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 128 * 1024 * 1024
+CACHED_STATEMENTS = 256
+POOL_MAX_IDLE = 16
+
+
+def _open_connection(path, readonly=False):
+    """Abre uma conexão nova já configurada (WAL, timeouts, cache, FKs)"""
+    if readonly:
+        # Conexão somente leitura via URI: nunca disputa o lock de escrita
+        target = f'{pathlib.Path(path).absolute().as_uri()}?mode=ro'
+    else:
+        target = path
+    conn = sqlite3.connect(
+        target,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False,  # a conexão circula entre threads via pool
+        uri=readonly
+    )
     conn.row_factory = sqlite3.Row  # Permite acessar colunas por nome
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    else:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute('PRAGMA foreign_keys = ON')
     return conn
 
 
-def init_database():
-    """Inicializa o banco de dados com todas as tabelas necessárias"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Tabela de Usuários
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            photo_url TEXT,
-            bio TEXT,
-            user_type TEXT NOT NULL CHECK(user_type IN ('student', 'teacher')),
-            -- Campos adicionais para melhorar informações do usuário
-            location TEXT,
-            languages TEXT,
-            availability TEXT,
-            price_per_hour REAL,
-            credentials TEXT,
-            postal_code TEXT,
-            address_street TEXT,
-            address_number TEXT,
-            address_complement TEXT,
-            address_neighborhood TEXT,
-            address_city TEXT,
-            address_state TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Garantir que colunas extras existam em bases já criadas
-    cursor.execute('PRAGMA table_info(users)')
-    existing_columns = {row[1] for row in cursor.fetchall()}
-    address_columns = {
-        'postal_code': 'TEXT',
-        'address_street': 'TEXT',
-        'address_number': 'TEXT',
-        'address_complement': 'TEXT',
-        'address_neighborhood': 'TEXT',
-        'address_city': 'TEXT',
-        'address_state': 'TEXT'
+class PooledConnection:
+    """
+    Envoltório de sqlite3.Connection devolvido pelas faixas de leitura/escrita.
+
+    Repassa tudo para a conexão real; close() devolve a conexão à faixa
+    de origem em vez de fechá-la, então as rotas continuam usando o padrão
+    conn = get_db_connection() ... finally: conn.close()
+    """
+
+    def __init__(self, lane, conn, path):
+        self._lane = lane
+        self._conn = conn
+        self._path = path
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._lane.release(conn, self._path)
+
+
+class ConnectionPool:
+    """
+    Pool de conexões somente leitura por processo (worker).
+
+    Conexões ociosas são reaproveitadas entre requisições, de modo que o
+    custo de abrir o arquivo, ler o schema e aplicar os PRAGMAs é pago
+    uma vez por conexão e não a cada requisição. Como o banco está em WAL,
+    leitores não bloqueiam o escritor nem uns aos outros.
+    """
+
+    def __init__(self, max_idle=POOL_MAX_IDLE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._path = None
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'in_use': 0
+        }
+
+    def acquire(self):
+        path = DATABASE_PATH
+        conn = None
+        with self._lock:
+            if path != self._path:
+                # O caminho do banco mudou (ex.: testes): descartar conexões antigas
+                self._close_idle()
+                self._path = path
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['reused'] += 1
+            self._stats['in_use'] += 1
+
+        if conn is None:
+            try:
+                conn = _open_connection(path, readonly=True)
+            except Exception:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                raise
+            with self._lock:
+                self._stats['created'] += 1
+
+        return PooledConnection(self, conn, path)
+
+    def release(self, conn, path):
+        healthy = True
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                healthy = False
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if healthy and path == self._path and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                self._stats['released'] += 1
+                return
+            self._stats['discarded'] += 1
+
+        conn.close()
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas do pool"""
+        with self._lock:
+            self._close_idle()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['max_idle'] = self.max_idle
+        return stats
+
+    def _close_idle(self):
+        for conn in self._idle:
+            conn.close()
+        self._idle = []
+
+
+class WriterLane:
+    """
+    Faixa de escrita: uma única conexão dedicada, usada por um escritor de cada vez.
+
+    Todas as mutações passam por aqui, então escritores fazem fila em um
+    lock do processo em vez de disputar o lock do SQLite e receber
+    "database is locked". O lock é reentrante para a mesma thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._conn = None
+        self._path = None
+        self._depth = 0
+        self._stats = {
+            'acquired': 0,
+            'opened': 0,
+            'waiting': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0
+        }
+
+    def acquire(self):
+        with self._stats_lock:
+            self._stats['waiting'] += 1
+        started = time.perf_counter()
+        self._lock.acquire()
+        waited_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            path = DATABASE_PATH
+            if self._depth == 0 and (self._conn is None or path != self._path):
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                self._conn = _open_connection(path)
+                self._path = path
+                self._stats['opened'] += 1
+        except Exception:
+            with self._stats_lock:
+                self._stats['waiting'] -= 1
+            self._lock.release()
+            raise
+
+        self._depth += 1
+        with self._stats_lock:
+            self._stats['waiting'] -= 1
+            self._stats['acquired'] += 1
+            self._stats['wait_ms_total'] += waited_ms
+            self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], waited_ms)
+        return PooledConnection(self, self._conn, self._path)
+
+    def release(self, conn, path):
+        try:
+            self._depth -= 1
+            if self._depth == 0 and conn.in_transaction:
+                # Transação esquecida aberta (ex.: retorno antecipado sem commit)
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    conn.close()
+                    self._conn = None
+        finally:
+            self._lock.release()
+
+    def close_all(self):
+        """Fecha a conexão de escrita (reaberta sob demanda)"""
+        with self._lock:
+            if self._depth == 0 and self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 3)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+        return stats
+
+
+_read_pool = ConnectionPool()
+_writer = WriterLane()
+
+
+def _track_in_context(conn):
+    # Dentro de um contexto Flask a conexão é devolvida no teardown caso
+    # a rota não chame close()
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
+    return conn
+
+
+def get_read_connection():
+    """
+    Retorna uma conexão somente leitura (mode=ro) do pool de leitura.
+
+    Use nas rotas GET: tentativas de escrita falham com
+    "attempt to write a readonly database".
+    """
+    return _track_in_context(_read_pool.acquire())
+
+
+def get_write_connection():
+    """
+    Retorna a conexão de escrita dedicada, com acesso exclusivo até close().
+
+    Segure-a apenas pelo tempo da transação: enquanto estiver aberta,
+    os demais escritores do processo ficam aguardando.
+    """
+    return _track_in_context(_writer.acquire())
+
+
+def get_db_connection():
+    """Retorna uma conexão de leitura e escrita (faixa de escrita)"""
+    return get_write_connection()
+
+
+def release_context_connections(exception=None):
+    """Devolve às faixas as conexões que ficaram abertas no contexto atual"""
+    for conn in reversed(g.pop('_db_connections', [])):
+        conn.close()
+
+
+def close_all_connections():
+    """Fecha as conexões ociosas (ex.: ao trocar de banco nos testes)"""
+    _read_pool.close_all()
+    _writer.close_all()
+
+
+def get_pool_stats():
+    """Métricas das faixas de leitura e escrita"""
+    return {
+        'read': _read_pool.stats(),
+        'write': _writer.stats()
     }
-    for column, definition in address_columns.items():
-        if column not in existing_columns:
-            cursor.execute(f'ALTER TABLE users ADD COLUMN {column} {definition}')
-    
-    # Tabela de Habilidades/Tags para Professores
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS teacher_skills (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            skill_name TEXT NOT NULL,
-            skill_description TEXT,
-            -- nível/competência da habilidade (opcional)
-            skill_level TEXT,
-            -- se o professor exige alguma avaliação/entrevista para ensinar essa habilidade
-            requires_evaluation BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    ''')
-    
-    # Tabela de Interesses/Dificuldades para Alunos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS student_interests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            interest_name TEXT NOT NULL,
-            difficulty_level TEXT CHECK(difficulty_level IN ('beginner', 'intermediate', 'advanced')),
-            description TEXT,
-            -- nível/expectativa do aluno (p.ex. "beginner")
-            desired_level TEXT,
-            -- se o aluno solicita avaliação ou verificação antes de iniciar
-            requires_evaluation BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    ''')
-    
-    # Tabela de Swipes (deslizes)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS swipes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            from_user_id INTEGER NOT NULL,
-            to_user_id INTEGER NOT NULL,
-            swipe_type TEXT NOT NULL CHECK(swipe_type IN ('like', 'skip')),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (from_user_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (to_user_id) REFERENCES users(id) ON DELETE CASCADE,
-            UNIQUE(from_user_id, to_user_id)
-        )
-    ''')
-    
-    # Tabela de Matches
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS matches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user1_id INTEGER NOT NULL,
-            user2_id INTEGER NOT NULL,
-            matched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active BOOLEAN DEFAULT 1,
-            FOREIGN KEY (user1_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (user2_id) REFERENCES users(id) ON DELETE CASCADE,
-            UNIQUE(user1_id, user2_id)
-        )
-    ''')
-    
-    # Tabela de Mensagens
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            match_id INTEGER NOT NULL,
-            sender_id INTEGER NOT NULL,
-            message_text TEXT NOT NULL,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_read BOOLEAN DEFAULT 0,
-            FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE,
-            FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    ''')
-    
-    # Tabela de Avaliações
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ratings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            match_id INTEGER NOT NULL,
-            rater_id INTEGER NOT NULL,
-            rated_id INTEGER NOT NULL,
-            rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
-            comment TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE,
-            FOREIGN KEY (rater_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (rated_id) REFERENCES users(id) ON DELETE CASCADE,
-            UNIQUE(match_id, rater_id)
-        )
-    ''')
-    
-    # Criar índices para melhor performance
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_swipes_users ON swipes(from_user_id, to_user_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_users ON matches(user1_id, user2_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_match ON messages(match_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_teacher_skills_user ON teacher_skills(user_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_interests_user ON student_interests(user_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_teacher_skills_name ON teacher_skills(skill_name)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_interests_name ON student_interests(interest_name)')
-    
-    conn.commit()
-    conn.close()
-    
+
+
+def init_app(app):
+    """Vincula as faixas de conexão ao ciclo de vida da aplicação Flask"""
+    app.teardown_appcontext(release_context_connections)
+
+
+def init_database():
+    """Inicializa o banco de dados aplicando as migrações pendentes"""
+    conn = get_write_connection()
+
+    try:
+        applied = migrate(conn)
+    finally:
+        conn.close()
+
+    if applied:
+        print(f"✅ Banco de dados migrado para a versão {applied[-1]}")
     print("✅ Banco de dados inicializado com sucesso!")
 
 
+def backfill_rating_stats():
+    """
+    Recalcula user_rating_stats a partir da tabela ratings.
+    Retorna quantos usuários têm avaliações.
+    """
+    conn = get_write_connection()
+    cursor = conn.cursor()
+
+    try:
+        total = rebuild_rating_stats(cursor)
+        conn.commit()
+        return total
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def backfill_tag_dictionary():
+    """
+    Preenche tag_id das habilidades/interesses gravados sem ele (ver backend/tags.py).
+    Retorna quantas linhas foram atualizadas.
+    """
+    from backend.tags import backfill_tag_ids
+
+    conn = get_write_connection()
+    cursor = conn.cursor()
+
+    try:
+        total = backfill_tag_ids(cursor)
+        conn.commit()
+        return total
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def reload_postal_centroids(path=None):
+    """
+    Recarrega as faixas de CEP, as da migração 12 ou as de um CSV com uma base
+    mais fina, e recalcula as coordenadas dos usuários (ver backend/geo.py).
+    Retorna (faixas carregadas, usuários localizados).
+    """
+    from backend.geo import POSTAL_CODE_CENTROIDS, geocode_all_users, load_centroids, read_centroids_csv
+
+    rows = read_centroids_csv(path) if path else POSTAL_CODE_CENTROIDS
+    conn = get_write_connection()
+    cursor = conn.cursor()
+
+    try:
+        ranges = load_centroids(cursor, rows)
+        located = geocode_all_users(cursor)
+        conn.commit()
+        return ranges, located
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 def reset_database():
     """Remove todas as tabelas e recria o banco (USE COM CUIDADO!)"""
-    conn = get_db_connection()
+    conn = get_write_connection()
     cursor = conn.cursor()
-    
-    # Deletar todas as tabelas
-    cursor.execute('DROP TABLE IF EXISTS ratings')
-    cursor.execute('DROP TABLE IF EXISTS messages')
-    cursor.execute('DROP TABLE IF EXISTS matches')
-    cursor.execute('DROP TABLE IF EXISTS swipes')
-    cursor.execute('DROP TABLE IF EXISTS student_interests')
-    cursor.execute('DROP TABLE IF EXISTS teacher_skills')
-    cursor.execute('DROP TABLE IF EXISTS users')
-    
-    conn.commit()
-    conn.close()
-    
+
+    try:
+        # Deletar todas as tabelas (inclusive as criadas por migrações)
+        cursor.execute('PRAGMA foreign_keys = OFF')
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+        for (table,) in cursor.fetchall():
+            cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+        cursor.execute('PRAGMA user_version = 0')
+        conn.commit()
+    finally:
+        cursor.execute('PRAGMA foreign_keys = ON')
+        conn.close()
+
     print("⚠️  Banco de dados resetado!")
-    
+
     # Recriar as tabelas
     init_database()
 
@@ -0,0 +1,423 @@
+"""
+Deck de Descoberta Pré-calculado por Usuário
+Salvar como: backend/discover_deck.py
+
+Em vez de sortear 50 perfis com ORDER BY RANDOM() + NOT IN (swipes) a
+cada carregamento, cada usuário tem um deck em discover_queue com os
+candidatos já ordenados por relevância:
+
+- a primeira visita monta o deck (ranqueado pelo índice de tags em memória,
+  backend/tag_index.py);
+- cada swipe remove o candidato do deck (trigger em swipes);
+- quando sobram menos de REFILL_THRESHOLD candidatos, uma thread de fundo
+  completa o deck com os próximos melhores ainda não vistos;
+- mudanças de tags marcam os decks afetados como desatualizados (stale,
+  via triggers) e eles são recalculados em segundo plano.
+
+O ranqueamento roda numa conexão de leitura; só a gravação do resultado
+passa pela fila de escrita, então a consulta pesada não segura o escritor.
+"""
+
+import queue
+import threading
+
+from backend.database import get_read_connection
+from backend.loaders import chunks, placeholders
+from backend.swipe_cache import swipe_cache
+from backend.tag_index import tag_index
+from backend.write_queue import write_queue
+
+# Candidatos mantidos por deck e nível que dispara a recarga em segundo plano
+DECK_SIZE = 200
+REFILL_THRESHOLD = 50
+
+# Linhas lidas por vez ao completar o deck com candidatos sem tag em comum
+FILL_FETCH_SIZE = 500
+
+# Pontuação do professor: ordem dos níveis, peso de cada tag em comum pela
+# distância entre o nível do professor e o nível desejado pelo aluno, e peso
+# quando só um dos lados exige avaliação prévia
+LEVEL_RANKS = {'beginner': 1, 'intermediate': 2, 'advanced': 3, 'expert': 4}
+LEVEL_FIT_WEIGHTS = {0: 1.0, 1: 0.5}
+LEVEL_FIT_FAR_WEIGHT = 0.25
+LEVEL_FIT_UNKNOWN_WEIGHT = 0.75
+EVALUATION_MISMATCH_WEIGHT = 0.8
+
+
+# Linha do deck; quem recebeu swipe depois do ranqueamento é ignorado
+INSERT_DECK_ROW_SQL = '''
+    INSERT OR IGNORE INTO discover_queue (user_id, candidate_id, position, score)
+    SELECT ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM swipes WHERE from_user_id = ? AND to_user_id = ?)
+'''
+
+# Parâmetros: ver deck_state_row(); rebuild limpa o stale e new_version muda a
+# versão do deck (os cursores de paginação do deck anterior passam a reiniciar)
+UPSERT_DECK_STATE_SQL = '''
+    INSERT INTO discover_deck_state (user_id, user_type, built_at, stale, exhausted)
+    VALUES (?, ?, CURRENT_TIMESTAMP, 0, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        user_type = excluded.user_type,
+        built_at = excluded.built_at,
+        stale = CASE WHEN ? THEN 0 ELSE stale END,
+        exhausted = excluded.exhausted,
+        version = version + ?
+'''
+
+
+def deck_row(user_id, candidate_id, position, score):
+    """Parâmetros de INSERT_DECK_ROW_SQL"""
+    return (user_id, candidate_id, position, score, user_id, candidate_id)
+
+
+def deck_state_row(user_id, user_type, exhausted, rebuild, new_version=None):
+    """Parâmetros de UPSERT_DECK_STATE_SQL (new_version, por padrão, acompanha rebuild)"""
+    if new_version is None:
+        new_version = rebuild
+    return (user_id, user_type, int(exhausted), int(rebuild), int(new_version))
+
+
+def opposite_type(user_type):
+    return 'teacher' if user_type == 'student' else 'student'
+
+
+def deck_status(cursor, user_id):
+    """Estado do deck (stale, exhausted, version, remaining), ou None se ainda não foi montado"""
+    cursor.execute(
+        '''
+        SELECT s.user_type, s.stale, s.exhausted, s.version,
+               (SELECT COUNT(*) FROM discover_queue q WHERE q.user_id = s.user_id) AS remaining
+        FROM discover_deck_state s
+        WHERE s.user_id = ?
+        ''',
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def read_deck(cursor, user_id, limit, after_position=-1):
+    """Próximos candidatos do deck (após after_position), na ordem de relevância"""
+    cursor.execute(
+        '''
+        SELECT u.id, u.name, u.bio, u.user_type, u.photo_url, q.score AS match_score, q.position
+        FROM discover_queue q
+        JOIN users u ON u.id = q.candidate_id
+        WHERE q.user_id = ? AND q.position > ?
+        ORDER BY q.position
+        LIMIT ?
+        ''',
+        (user_id, after_position, limit)
+    )
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def _exclusion_filter(cursor, user_id, exclude_queued):
+    """
+    Filtro em memória dos candidatos que não podem entrar no deck: já
+    avaliados (bitmap do swipe_cache), já no deck e o próprio usuário
+    """
+    swiped = swipe_cache.get(cursor, user_id)
+    excluded = {user_id}
+    if exclude_queued:
+        cursor.execute('SELECT candidate_id FROM discover_queue WHERE user_id = ?', (user_id,))
+        excluded.update(row[0] for row in cursor.fetchall())
+    return lambda candidate_id: candidate_id in excluded or candidate_id in swiped
+
+
+def _rating_averages(cursor, user_ids):
+    averages = {}
+    for chunk in chunks(list(user_ids)):
+        cursor.execute(
+            f'''
+            SELECT user_id, rating_sum * 1.0 / rating_count AS average
+            FROM user_rating_stats
+            WHERE rating_count > 0 AND user_id IN ({placeholders(chunk)})
+            ''',
+            chunk
+        )
+        averages.update((row['user_id'], row['average']) for row in cursor.fetchall())
+    return averages
+
+
+def level_rank(level):
+    """Posição do nível em LEVEL_RANKS, ou None se desconhecido (como _level_rank_sql)"""
+    return LEVEL_RANKS.get((level or '').strip(' ').lower())
+
+
+def level_fit_weight(teacher_rank, student_rank, teacher_evaluation, student_evaluation):
+    """
+    Peso de uma tag em comum na pontuação do professor: a mesma conta de
+    TEACHER_SCORES_SQL, para quem pontua fora do SQL (backend/batch_scoring.py)
+    """
+    if teacher_rank is None or student_rank is None:
+        weight = LEVEL_FIT_UNKNOWN_WEIGHT
+    else:
+        gap = student_rank - teacher_rank
+        weight = next(
+            (fit for distance, fit in LEVEL_FIT_WEIGHTS.items() if gap <= distance), LEVEL_FIT_FAR_WEIGHT
+        )
+    if bool(teacher_evaluation) != bool(student_evaluation):
+        weight *= EVALUATION_MISMATCH_WEIGHT
+    return weight
+
+
+def _level_rank_sql(expression):
+    whens = ' '.join(f"WHEN '{level}' THEN {rank}" for level, rank in LEVEL_RANKS.items())
+    return f'(CASE lower(trim({expression})) {whens} END)'
+
+
+def _level_fit_sql():
+    gap = f"({_level_rank_sql('COALESCE(i.desired_level, i.difficulty_level)')} - {_level_rank_sql('s.skill_level')})"
+    near = ' '.join(f'WHEN {gap} <= {distance} THEN {weight}' for distance, weight in LEVEL_FIT_WEIGHTS.items())
+    return f'(CASE WHEN {gap} IS NULL THEN {LEVEL_FIT_UNKNOWN_WEIGHT} {near} ELSE {LEVEL_FIT_FAR_WEIGHT} END)'
+
+
+# Um JOIN agrupado: cada tag do professor encontra os alunos com a mesma tag
+# por idx_student_interests_tag_fit (coberto, sem ler a tabela). Tag repetida
+# no mesmo perfil conta uma vez, com o melhor encaixe
+TEACHER_SCORES_SQL = f'''
+    SELECT fit.candidate_id, SUM(fit.weight) AS score
+    FROM (
+        SELECT i.user_id AS candidate_id,
+               MAX({_level_fit_sql()}
+                   * (CASE WHEN COALESCE(s.requires_evaluation, 0) = COALESCE(i.requires_evaluation, 0)
+                      THEN 1.0 ELSE {EVALUATION_MISMATCH_WEIGHT} END)) AS weight
+        FROM teacher_skills s
+        JOIN student_interests i ON i.tag_id = s.tag_id
+        WHERE s.user_id = ? AND s.tag_id IS NOT NULL
+        GROUP BY i.user_id, s.tag_id
+    ) fit
+    JOIN users u ON u.id = fit.candidate_id
+    WHERE u.user_type = 'student'
+    GROUP BY fit.candidate_id
+'''
+
+
+def teacher_scores(cursor, teacher_id):
+    """
+    {aluno: pontuação} para o professor: soma, por tag em comum, do encaixe
+    entre o nível do professor e o nível desejado pelo aluno, reduzido
+    quando só um dos lados exige avaliação prévia
+    """
+    cursor.execute(TEACHER_SCORES_SQL, (teacher_id,))
+    return {row[0]: round(row[1], 4) for row in cursor.fetchall()}
+
+
+def candidate_scores(cursor, user_id, user_type):
+    """{candidate_id: pontuação} dos candidatos do tipo oposto com alguma tag em comum"""
+    if user_type == 'teacher':
+        return teacher_scores(cursor, user_id)
+    return tag_index.score(user_id, opposite_type(user_type))
+
+
+def rank_nearby(cursor, user_id, user_type, distances):
+    """
+    Candidatos dentro do raio ({candidate_id: km}, ver backend/geo.py) ainda
+    não avaliados, como [(candidate_id, score, km)] ordenados por pontuação,
+    distância e id. Não usa o deck: o raio já limita os candidatos. Sem a
+    gravação do deck para conferir swipes no banco, os que passam pelo
+    swipe_cache são conferidos aqui.
+    """
+    is_excluded = _exclusion_filter(cursor, user_id, exclude_queued=False)
+    remaining = [candidate_id for candidate_id in distances if not is_excluded(candidate_id)]
+    swiped = set()
+    for chunk in chunks(remaining):
+        cursor.execute(
+            f'''
+            SELECT to_user_id FROM swipes
+            WHERE from_user_id = ? AND to_user_id IN ({placeholders(chunk)})
+            ''',
+            [user_id] + chunk
+        )
+        swiped.update(row[0] for row in cursor.fetchall())
+
+    scores = candidate_scores(cursor, user_id, user_type)
+    ranked = [
+        (candidate_id, scores.get(candidate_id, 0), distances[candidate_id])
+        for candidate_id in remaining
+        if candidate_id not in swiped
+    ]
+    ranked.sort(key=lambda item: (-item[1], item[2], item[0]))
+    return ranked
+
+
+def rank_candidates(cursor, user_id, user_type, limit, exclude_queued=True):
+    """
+    Melhores candidatos do tipo oposto ainda não avaliados pelo usuário.
+    Pontuação do aluno = tags em comum, calculada sobre toda a população
+    pelo índice invertido; a do professor pondera cada tag em comum pelos
+    níveis e pela exigência de avaliação (teacher_scores). Empates pela
+    média de avaliações e depois pelo id. Candidatos sem tag em comum
+    completam o deck pela mesma ordem de desempate.
+    """
+    candidate_type = opposite_type(user_type)
+    is_excluded = _exclusion_filter(cursor, user_id, exclude_queued)
+
+    levels = {}
+    for candidate_id, score in candidate_scores(cursor, user_id, user_type).items():
+        if not is_excluded(candidate_id):
+            levels.setdefault(score, []).append(candidate_id)
+
+    # Do maior para o menor score; avaliações só são lidas para os níveis que entram
+    ranked = []
+    for score in sorted(levels, reverse=True):
+        if len(ranked) >= limit:
+            break
+        ids = levels[score]
+        averages = _rating_averages(cursor, ids)
+        ids.sort(key=lambda candidate_id: (-averages.get(candidate_id, 0), candidate_id))
+        ranked.extend((candidate_id, score) for candidate_id in ids[:limit - len(ranked)])
+
+    if len(ranked) < limit:
+        # Completar com quem não tem tag em comum, na ordem de desempate
+        ranked_ids = {candidate_id for candidate_id, _ in ranked}
+        fill = cursor.connection.cursor()
+        try:
+            fill.execute(
+                '''
+                SELECT u.id
+                FROM users u
+                LEFT JOIN user_rating_stats r ON r.user_id = u.id
+                WHERE u.user_type = ?
+                ORDER BY COALESCE(r.rating_sum * 1.0 / NULLIF(r.rating_count, 0), 0) DESC, u.id
+                ''',
+                (candidate_type,)
+            )
+            while len(ranked) < limit:
+                rows = fill.fetchmany(FILL_FETCH_SIZE)
+                if not rows:
+                    break
+                for (candidate_id,) in rows:
+                    if candidate_id in ranked_ids or is_excluded(candidate_id):
+                        continue
+                    ranked.append((candidate_id, 0))
+                    if len(ranked) >= limit:
+                        break
+        finally:
+            # Encerra a leitura antes de devolver a conexão ao pool
+            fill.close()
+
+    return ranked
+
+
+def _store_deck(cursor, user_id, user_type, candidates, rebuild, wanted):
+    """Operação da fila de escrita: grava os candidatos ranqueados no deck"""
+    if rebuild:
+        cursor.execute('DELETE FROM discover_queue WHERE user_id = ?', (user_id,))
+        start = 0
+    else:
+        cursor.execute(
+            'SELECT COALESCE(MAX(position) + 1, 0) FROM discover_queue WHERE user_id = ?',
+            (user_id,)
+        )
+        start = cursor.fetchone()[0]
+
+    cursor.executemany(
+        INSERT_DECK_ROW_SQL,
+        [deck_row(user_id, candidate_id, start + index, score)
+         for index, (candidate_id, score) in enumerate(candidates)]
+    )
+    added = cursor.rowcount if candidates else 0
+
+    cursor.execute(
+        UPSERT_DECK_STATE_SQL,
+        deck_state_row(user_id, user_type, len(candidates) < wanted, rebuild)
+    )
+    return added
+
+
+def refill_deck(user_id, rebuild=False):
+    """
+    Monta o deck do zero (rebuild, deck inexistente ou stale) ou completa
+    o deck atual até DECK_SIZE quando ele está abaixo de REFILL_THRESHOLD.
+    Retorna quantos candidatos foram adicionados.
+    """
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT user_type FROM users WHERE id = ?', (user_id,))
+        user = cursor.fetchone()
+        if not user:
+            return 0
+        user_type = user['user_type']
+
+        status = deck_status(cursor, user_id)
+        rebuild = rebuild or status is None or bool(status['stale']) or status['user_type'] != user_type
+        if rebuild:
+            wanted = DECK_SIZE
+        else:
+            if status['exhausted'] or status['remaining'] >= REFILL_THRESHOLD:
+                return 0
+            wanted = DECK_SIZE - status['remaining']
+
+        candidates = rank_candidates(cursor, user_id, user_type, wanted, exclude_queued=not rebuild)
+    finally:
+        conn.close()
+
+    return write_queue.execute(_store_deck, user_id, user_type, candidates, rebuild, wanted)
+
+
+class DeckRefiller:
+    """Thread de fundo que recarrega decks, no máximo uma vez por usuário na fila"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            'scheduled': 0,
+            'refills': 0,
+            'candidates_added': 0,
+            'errors': 0
+        }
+
+    def schedule(self, user_id):
+        """Agenda a verificação/recarga do deck; ignora se o usuário já está na fila"""
+        with self._lock:
+            if user_id in self._pending:
+                return False
+            self._pending.add(user_id)
+            self._stats['scheduled'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='discover-deck', daemon=True)
+                self._thread.start()
+        self._queue.put(user_id)
+        return True
+
+    def flush(self):
+        """Aguarda as recargas agendadas terminarem"""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def _run(self):
+        while True:
+            user_id = self._queue.get()
+            try:
+                # Sai da lista antes de recarregar: um swipe durante a recarga agenda outra
+                with self._lock:
+                    self._pending.discard(user_id)
+                added = refill_deck(user_id)
+                with self._lock:
+                    self._stats['refills'] += 1
+                    self._stats['candidates_added'] += added
+            except Exception as e:
+                print(f"❌ Erro ao recarregar deck do usuário {user_id}: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+            finally:
+                self._queue.task_done()
+
+
+deck_refiller = DeckRefiller()
+
+
+def get_discover_deck_stats():
+    """Métricas da recarga de decks"""
+    return deck_refiller.stats()
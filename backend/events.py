@@ -0,0 +1,138 @@
+"""
+Hub de Eventos em Memória (publish/subscribe por usuário)
+Salvar como: backend/events.py
+
+As rotas publicam eventos depois de gravar (nova mensagem, novo match,
+contador de não lidas, avaliação) e cada conexão aberta do usuário
+(SSE, WebSocket) recebe uma cópia. O hub é por processo: cada worker
+entrega apenas para as conexões que ele mesmo atende.
+"""
+
+import itertools
+import queue
+import threading
+import time
+
+# Eventos pendentes por conexão; um cliente lento não segura memória indefinidamente
+MAX_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    Fila limitada de eventos de uma conexão de um usuário.
+
+    notify (opcional) é chamado, na thread de quem publicou, a cada evento
+    enfileirado: conexões atendidas por um event loop (WebSocket) usam-no
+    para acordar, em vez de deixar uma thread bloqueada em get().
+    """
+
+    def __init__(self, user_id, max_queue_size=MAX_QUEUE_SIZE, notify=None):
+        self.user_id = user_id
+        self.notify = notify
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        # Quando a fila transborda, o cliente perdeu eventos e precisa recarregar
+        self.overflowed = False
+
+    def put(self, event):
+        """Enfileira sem bloquear; descarta o evento mais antigo se a fila estiver cheia"""
+        delivered = self._enqueue(event)
+        if self.notify is not None:
+            self.notify()
+        return delivered
+
+    def _enqueue(self, event):
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                pass
+            return False
+
+    def get(self, timeout=None):
+        """Próximo evento, ou None se nada chegar dentro do timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    """Distribui eventos para as conexões abertas de cada usuário"""
+
+    def __init__(self, max_queue_size=MAX_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._stats = {
+            'published': 0,
+            'delivered': 0,
+            'dropped': 0
+        }
+
+    def subscribe(self, user_id, notify=None):
+        subscription = Subscription(user_id, self.max_queue_size, notify)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event_type, data=None):
+        """Entrega o evento a todas as conexões do usuário; retorna quantas receberam"""
+        event = {
+            'id': next(self._ids),
+            'type': event_type,
+            'data': data or {},
+            'published_at': time.time()
+        }
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+
+        delivered = 0
+        dropped = 0
+        for subscription in subscriptions:
+            if subscription.put(event):
+                delivered += 1
+            else:
+                dropped += 1
+
+        with self._lock:
+            self._stats['published'] += 1
+            self._stats['delivered'] += delivered
+            self._stats['dropped'] += dropped
+        return delivered
+
+    def is_connected(self, user_id):
+        with self._lock:
+            return user_id in self._subscribers
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['connected_users'] = len(self._subscribers)
+            stats['subscriptions'] = sum(len(s) for s in self._subscribers.values())
+        return stats
+
+
+event_hub = EventHub()
+
+
+def get_event_hub_stats():
+    """Métricas do hub de eventos"""
+    return event_hub.stats()
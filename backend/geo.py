@@ -0,0 +1,123 @@
+"""
+Proximidade Geográfica (centroides de CEP e grade de células)
+Salvar como: backend/geo.py
+
+users.latitude/longitude são derivadas do CEP por triggers (migração 12)
+a partir de postal_code_centroids: faixas de CEP (5 primeiros dígitos) com
+o centroide aproximado da capital ou, fora dela, do estado. Quando mais de
+uma faixa contém o CEP, vale a mais estreita. É uma aproximação: dentro de
+uma capital a distância é entre centros da cidade (0 km) e fora das
+capitais o erro chega a centenas de km. Por isso cada distância entregue
+pela API vem com distance_precision: 'city' quando os dois CEPs caíram em
+faixas de uma cidade (distância entre centros de cidade) e 'state' quando
+algum caiu numa faixa de estado (a distância é só uma ordem de grandeza).
+
+As faixas, a grade e o SQL de geocodificação são os da migração 12
+(backend/migrations.py), importados daqui. Uma base mais fina, em CSV com
+as colunas de postal_code_centroids, pode ser carregada com
+    flask --app backend.app load-postal-centroids caminho/da/base.csv
+
+Cada usuário geocodificado também recebe geo_cell, a célula de uma grade
+de CELL_DEGREES graus (linha * CELLS_PER_ROW + coluna). A busca por raio
+lê só as células que cobrem o retângulo do raio (uma faixa contígua de
+geo_cell por linha da grade, pelo índice idx_users_geo) e calcula a
+distância exata (haversine) apenas para esses candidatos.
+"""
+
+import csv
+import math
+
+from backend.migrations import (
+    GEO_CELL_DEGREES, GEO_CELLS_PER_ROW, POSTAL_CODE_CENTROIDS,
+    geocode_users, postal_code_centroid_sql, replace_postal_code_centroids
+)
+
+# Grade dos triggers da migração 12; longitudes não dão a volta em ±180
+# (suficiente para endereços no Brasil)
+CELL_DEGREES = GEO_CELL_DEGREES
+CELLS_PER_ROW = GEO_CELLS_PER_ROW
+
+# Precisão dos centroides, da mais fina para a mais grosseira
+PRECISIONS = ('city', 'state')
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+# Coluna com a precisão do centroide do CEP do usuário (SELECT ... FROM users)
+LOCATION_PRECISION_SQL = postal_code_centroid_sql('precision')
+
+
+def distance_precision(*precisions):
+    """Precisão de uma distância: a do centroide mais grosseiro entre as pontas (desconhecida = a mais grosseira)"""
+    coarsest = len(PRECISIONS) - 1
+    return PRECISIONS[max(PRECISIONS.index(p) if p in PRECISIONS else coarsest for p in precisions)]
+
+
+def read_centroids_csv(path):
+    """Faixas de um CSV com as colunas de postal_code_centroids"""
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        return [
+            (int(row['cep_start']), int(row['cep_end']), row['state'], row['place'],
+             float(row['latitude']), float(row['longitude']), row['precision'])
+            for row in csv.DictReader(csv_file)
+        ]
+
+
+def load_centroids(cursor, rows=POSTAL_CODE_CENTROIDS):
+    """Substitui postal_code_centroids pelas faixas informadas. Retorna quantas foram carregadas"""
+    replace_postal_code_centroids(cursor, rows)
+    return len(rows)
+
+
+def geocode_all_users(cursor):
+    """Recalcula as coordenadas de todos os usuários com CEP. Retorna quantos ficaram localizados"""
+    geocode_users(cursor, 'postal_code IS NOT NULL')
+    cursor.execute('SELECT COUNT(*) FROM users WHERE geo_cell IS NOT NULL')
+    return cursor.fetchone()[0]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (graus)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _row_col(lat, lon):
+    row = int((min(max(lat, -90.0), 90.0 - 1e-9) + 90) / CELL_DEGREES)
+    col = int((min(max(lon, -180.0), 180.0 - 1e-9) + 180) / CELL_DEGREES)
+    return row, col
+
+
+def cell_ranges(lat, lon, radius_km):
+    """Faixas [início, fim] de geo_cell (uma por linha da grade) que cobrem o círculo"""
+    d_lat = radius_km / KM_PER_DEGREE
+    # Longitude medida na latitude mais distante do equador dentro do retângulo
+    widest = min(abs(lat) + d_lat, 89.0)
+    d_lon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest)))
+
+    row_low, col_low = _row_col(lat - d_lat, lon - d_lon)
+    row_high, col_high = _row_col(lat + d_lat, lon + d_lon)
+    return [
+        (row * CELLS_PER_ROW + col_low, row * CELLS_PER_ROW + col_high)
+        for row in range(row_low, row_high + 1)
+    ]
+
+
+def users_within(cursor, user_type, lat, lon, radius_km):
+    """{user_id: distância em km} dos usuários do tipo até radius_km do ponto"""
+    ranges = cell_ranges(lat, lon, radius_km)
+    query = ' UNION ALL '.join(
+        'SELECT id, latitude, longitude FROM users WHERE user_type = ? AND geo_cell BETWEEN ? AND ?'
+        for _ in ranges
+    )
+    cursor.execute(query, [value for low, high in ranges for value in (user_type, low, high)])
+
+    distances = {}
+    for user_id, user_lat, user_lon in cursor.fetchall():
+        distance = haversine_km(lat, lon, user_lat, user_lon)
+        if distance <= radius_km:
+            distances[user_id] = distance
+    return distances
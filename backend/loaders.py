@@ -0,0 +1,142 @@
+"""
+Carregamento em Lote de Dados Relacionados
+Salvar como: backend/loaders.py
+
+Em vez de uma consulta por perfil/match (N+1), as rotas juntam os ids
+que vão exibir e pedem cada tipo de dado de uma vez: uma consulta
+IN (...) por tipo, não importa quantos perfis/matches há na resposta.
+"""
+
+# SQLite aceita no máximo 999 parâmetros por consulta em builds antigos
+MAX_PARAMS_PER_QUERY = 900
+
+SKILL_COLUMNS = ('skill_name', 'skill_description', 'skill_level', 'requires_evaluation')
+INTEREST_COLUMNS = ('interest_name', 'difficulty_level', 'description', 'desired_level', 'requires_evaluation')
+
+
+def chunks(keys, size=MAX_PARAMS_PER_QUERY):
+    for start in range(0, len(keys), size):
+        yield keys[start:start + size]
+
+
+def placeholders(keys):
+    return ', '.join('?' for _ in keys)
+
+
+def _empty_rating_summary():
+    return {
+        'average': None,
+        'count': 0,
+        'histogram': {str(star): 0 for star in range(1, 6)},
+        'last_rated_at': None
+    }
+
+
+class BatchLoader:
+    """
+    Carregador por requisição (estilo DataLoader).
+
+    Cada método recebe uma lista de ids e devolve um dict id -> valor,
+    buscando no banco só os ids ainda não carregados nesta requisição.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self._cache = {}
+
+    def _load(self, kind, keys, fetch, default):
+        keys = list(dict.fromkeys(keys))
+        missing = [key for key in keys if (kind, key) not in self._cache]
+        if missing:
+            found = {}
+            for chunk in chunks(missing):
+                found.update(fetch(chunk))
+            for key in missing:
+                self._cache[(kind, key)] = found[key] if key in found else default()
+        return {key: self._cache[(kind, key)] for key in keys}
+
+    def _group_rows(self, query, keys, key_column, columns):
+        self.cursor.execute(query.format(placeholders=placeholders(keys)), keys)
+        grouped = {}
+        for row in self.cursor.fetchall():
+            grouped.setdefault(row[key_column], []).append({c: row[c] for c in columns})
+        return grouped
+
+    def skills(self, user_ids):
+        """Habilidades (teacher_skills) por usuário"""
+        def fetch(keys):
+            return self._group_rows(
+                '''
+                SELECT user_id, skill_name, skill_description, skill_level, requires_evaluation
+                FROM teacher_skills
+                WHERE user_id IN ({placeholders})
+                ORDER BY user_id, id
+                ''',
+                keys, 'user_id', SKILL_COLUMNS
+            )
+        return self._load('skills', user_ids, fetch, list)
+
+    def interests(self, user_ids):
+        """Interesses (student_interests) por usuário"""
+        def fetch(keys):
+            return self._group_rows(
+                '''
+                SELECT user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation
+                FROM student_interests
+                WHERE user_id IN ({placeholders})
+                ORDER BY user_id, id
+                ''',
+                keys, 'user_id', INTEREST_COLUMNS
+            )
+        return self._load('interests', user_ids, fetch, list)
+
+    def rating_summaries(self, user_ids):
+        """
+        Resumo das avaliações recebidas por usuário, lido de user_rating_stats
+        (mantida por triggers): média sem arredondar, total e histograma 1-5
+        """
+        def fetch(keys):
+            self.cursor.execute(
+                f'''
+                SELECT user_id, rating_sum, rating_count,
+                       stars_1, stars_2, stars_3, stars_4, stars_5, last_rated_at
+                FROM user_rating_stats
+                WHERE user_id IN ({placeholders(keys)}) AND rating_count > 0
+                ''',
+                keys
+            )
+            return {
+                row['user_id']: {
+                    'average': row['rating_sum'] / row['rating_count'],
+                    'count': row['rating_count'],
+                    'histogram': {str(star): row[f'stars_{star}'] for star in range(1, 6)},
+                    'last_rated_at': row['last_rated_at']
+                }
+                for row in self.cursor.fetchall()
+            }
+        return self._load('rating_summaries', user_ids, fetch, _empty_rating_summary)
+
+    def match_ratings(self, match_ids, user_id):
+        """
+        Avaliações de cada match do ponto de vista do usuário:
+        {'mine': linha ou None, 'received': linha ou None}
+        """
+        def fetch(keys):
+            self.cursor.execute(
+                f'''
+                SELECT match_id, rater_id, rated_id, rating, comment, created_at
+                FROM ratings
+                WHERE match_id IN ({placeholders(keys)})
+                ''',
+                keys
+            )
+            found = {}
+            for row in self.cursor.fetchall():
+                entry = found.setdefault(row['match_id'], {'mine': None, 'received': None})
+                if row['rater_id'] == user_id:
+                    entry['mine'] = dict(row)
+                elif row['rated_id'] == user_id:
+                    entry['received'] = dict(row)
+            return found
+        return self._load(('match_ratings', user_id), match_ids, fetch,
+                          lambda: {'mine': None, 'received': None})
@@ -0,0 +1,967 @@
+"""
+Migrações Versionadas do Schema
+Salvar como: backend/migrations.py
+
+A versão do schema fica gravada no próprio arquivo do banco
+(PRAGMA user_version). Na inicialização basta comparar esse número com
+a última migração registrada: se o banco já está atualizado nada mais é
+executado. Migrações pendentes rodam em ordem, cada uma na sua própria
+transação, uma única vez.
+
+Para evoluir o schema, acrescente uma nova função ao final deste arquivo
+com @migration(<próxima versão>, '<descrição>'). Nunca altere migrações
+já publicadas. Cada migração carrega o próprio SQL e os próprios dados (não
+importa módulos do app), para continuar fazendo o mesmo em bancos novos
+mesmo depois que o código do app mudar.
+"""
+
+import sqlite3
+import threading
+import unicodedata
+
+MIGRATIONS = []
+
+# Tamanho do trecho da última mensagem guardado em conversation_state
+MESSAGE_PREVIEW_LENGTH = 280
+
+# Bancos grandes podem levar mais tempo que o busy_timeout padrão para migrar;
+# os demais workers aguardam o lock por até este tempo
+MIGRATION_BUSY_TIMEOUT_MS = 120000
+
+_migration_lock = threading.Lock()
+
+
+def migration(version, description):
+    """Registra uma função de migração para a versão informada"""
+    def decorator(func):
+        if MIGRATIONS and version != MIGRATIONS[-1][0] + 1:
+            raise ValueError(f'Migração {version} fora de ordem')
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Aplica as migrações pendentes na conexão de escrita informada.
+    Retorna a lista de versões aplicadas (vazia se o banco já estava atualizado).
+    """
+    if current_version(conn) >= latest_version():
+        return []
+
+    applied = []
+    with _migration_lock:
+        previous_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+        conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}')
+        try:
+            for version, description, func in MIGRATIONS:
+                # BEGIN IMMEDIATE trava a escrita entre processos: outro worker
+                # pode ter aplicado esta migração enquanto aguardávamos
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    if current_version(conn) >= version:
+                        conn.rollback()
+                        continue
+                    print(f"🔧 Aplicando migração {version}: {description}")
+                    func(cursor)
+                    cursor.execute(f'PRAGMA user_version = {version}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(version)
+        finally:
+            conn.execute(f'PRAGMA busy_timeout = {previous_timeout}')
+
+    return applied
+
+
+@migration(1, 'schema inicial')
+def _initial_schema(cursor):
+    
+    # Tabela de Usuários
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            photo_url TEXT,
+            bio TEXT,
+            user_type TEXT NOT NULL CHECK(user_type IN ('student', 'teacher')),
+            -- Campos adicionais para melhorar informações do usuário
+            location TEXT,
+            languages TEXT,
+            availability TEXT,
+            price_per_hour REAL,
+            credentials TEXT,
+            postal_code TEXT,
+            address_street TEXT,
+            address_number TEXT,
+            address_complement TEXT,
+            address_neighborhood TEXT,
+            address_city TEXT,
+            address_state TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Garantir que colunas extras existam em bases já criadas
+    cursor.execute('PRAGMA table_info(users)')
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    address_columns = {
+        'postal_code': 'TEXT',
+        'address_street': 'TEXT',
+        'address_number': 'TEXT',
+        'address_complement': 'TEXT',
+        'address_neighborhood': 'TEXT',
+        'address_city': 'TEXT',
+        'address_state': 'TEXT'
+    }
+    for column, definition in address_columns.items():
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN {column} {definition}')
+    
+    # Tabela de Habilidades/Tags para Professores
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS teacher_skills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            skill_name TEXT NOT NULL,
+            skill_description TEXT,
+            -- nível/competência da habilidade (opcional)
+            skill_level TEXT,
+            -- se o professor exige alguma avaliação/entrevista para ensinar essa habilidade
+            requires_evaluation BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Tabela de Interesses/Dificuldades para Alunos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_interests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            interest_name TEXT NOT NULL,
+            difficulty_level TEXT CHECK(difficulty_level IN ('beginner', 'intermediate', 'advanced')),
+            description TEXT,
+            -- nível/expectativa do aluno (p.ex. "beginner")
+            desired_level TEXT,
+            -- se o aluno solicita avaliação ou verificação antes de iniciar
+            requires_evaluation BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Tabela de Swipes (deslizes)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS swipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_user_id INTEGER NOT NULL,
+            to_user_id INTEGER NOT NULL,
+            swipe_type TEXT NOT NULL CHECK(swipe_type IN ('like', 'skip')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (from_user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (to_user_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(from_user_id, to_user_id)
+        )
+    ''')
+    
+    # Tabela de Matches
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS matches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user1_id INTEGER NOT NULL,
+            user2_id INTEGER NOT NULL,
+            matched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (user1_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (user2_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(user1_id, user2_id)
+        )
+    ''')
+    
+    # Tabela de Mensagens
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            match_id INTEGER NOT NULL,
+            sender_id INTEGER NOT NULL,
+            message_text TEXT NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_read BOOLEAN DEFAULT 0,
+            FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE,
+            FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Tabela de Avaliações
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            match_id INTEGER NOT NULL,
+            rater_id INTEGER NOT NULL,
+            rated_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE,
+            FOREIGN KEY (rater_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (rated_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(match_id, rater_id)
+        )
+    ''')
+    
+    # Índices
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_swipes_users ON swipes(from_user_id, to_user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_users ON matches(user1_id, user2_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_match ON messages(match_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_teacher_skills_user ON teacher_skills(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_interests_user ON student_interests(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_teacher_skills_name ON teacher_skills(skill_name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_interests_name ON student_interests(interest_name)')
+
+
+def rebuild_rating_stats(cursor):
+    """Recalcula user_rating_stats inteira a partir de ratings"""
+    cursor.execute('DELETE FROM user_rating_stats')
+    cursor.execute('''
+        INSERT INTO user_rating_stats (
+            user_id, rating_sum, rating_count,
+            stars_1, stars_2, stars_3, stars_4, stars_5, last_rated_at
+        )
+        SELECT rated_id, SUM(rating), COUNT(*),
+               SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+               MAX(created_at)
+        FROM ratings
+        GROUP BY rated_id
+    ''')
+    return cursor.rowcount
+
+
+@migration(2, 'agregados de avaliações por usuário (user_rating_stats)')
+def _user_rating_stats(cursor):
+    # Resumo de avaliações recebidas, mantido por triggers: leitura O(1) por usuário.
+    # (INSERT OR IGNORE não serve dentro do trigger: a política de conflito do
+    # UPSERT externo em submit_rating() prevalece sobre a do trigger)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_rating_stats (
+            user_id INTEGER PRIMARY KEY,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            stars_1 INTEGER NOT NULL DEFAULT 0,
+            stars_2 INTEGER NOT NULL DEFAULT 0,
+            stars_3 INTEGER NOT NULL DEFAULT 0,
+            stars_4 INTEGER NOT NULL DEFAULT 0,
+            stars_5 INTEGER NOT NULL DEFAULT 0,
+            last_rated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ratings_rated ON ratings(rated_id)')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_ratings_stats_insert
+        AFTER INSERT ON ratings
+        BEGIN
+            INSERT INTO user_rating_stats (user_id)
+            SELECT NEW.rated_id
+            WHERE NOT EXISTS (SELECT 1 FROM user_rating_stats WHERE user_id = NEW.rated_id);
+            UPDATE user_rating_stats SET
+                rating_sum = rating_sum + NEW.rating,
+                rating_count = rating_count + 1,
+                stars_1 = stars_1 + (NEW.rating = 1),
+                stars_2 = stars_2 + (NEW.rating = 2),
+                stars_3 = stars_3 + (NEW.rating = 3),
+                stars_4 = stars_4 + (NEW.rating = 4),
+                stars_5 = stars_5 + (NEW.rating = 5),
+                last_rated_at = NEW.created_at
+            WHERE user_id = NEW.rated_id;
+        END
+    ''')
+
+    # Disparado pelo ON CONFLICT ... DO UPDATE de submit_rating()
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_ratings_stats_update
+        AFTER UPDATE OF rating, rated_id, created_at ON ratings
+        BEGIN
+            UPDATE user_rating_stats SET
+                rating_sum = rating_sum - OLD.rating,
+                rating_count = rating_count - 1,
+                stars_1 = stars_1 - (OLD.rating = 1),
+                stars_2 = stars_2 - (OLD.rating = 2),
+                stars_3 = stars_3 - (OLD.rating = 3),
+                stars_4 = stars_4 - (OLD.rating = 4),
+                stars_5 = stars_5 - (OLD.rating = 5)
+            WHERE user_id = OLD.rated_id;
+            INSERT INTO user_rating_stats (user_id)
+            SELECT NEW.rated_id
+            WHERE NOT EXISTS (SELECT 1 FROM user_rating_stats WHERE user_id = NEW.rated_id);
+            UPDATE user_rating_stats SET
+                rating_sum = rating_sum + NEW.rating,
+                rating_count = rating_count + 1,
+                stars_1 = stars_1 + (NEW.rating = 1),
+                stars_2 = stars_2 + (NEW.rating = 2),
+                stars_3 = stars_3 + (NEW.rating = 3),
+                stars_4 = stars_4 + (NEW.rating = 4),
+                stars_5 = stars_5 + (NEW.rating = 5),
+                last_rated_at = NEW.created_at
+            WHERE user_id = NEW.rated_id;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_ratings_stats_delete
+        AFTER DELETE ON ratings
+        BEGIN
+            UPDATE user_rating_stats SET
+                rating_sum = rating_sum - OLD.rating,
+                rating_count = rating_count - 1,
+                stars_1 = stars_1 - (OLD.rating = 1),
+                stars_2 = stars_2 - (OLD.rating = 2),
+                stars_3 = stars_3 - (OLD.rating = 3),
+                stars_4 = stars_4 - (OLD.rating = 4),
+                stars_5 = stars_5 - (OLD.rating = 5)
+            WHERE user_id = OLD.rated_id;
+        END
+    ''')
+
+    # Backfill das avaliações já existentes
+    rebuild_rating_stats(cursor)
+
+
+@migration(3, 'estado das conversas por participante (conversation_state)')
+def _conversation_state(cursor):
+    # Uma linha por (match, participante) com a última mensagem e o total de
+    # não lidas: a lista de conversas e o contador global viram leituras diretas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_state (
+            match_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            other_user_id INTEGER NOT NULL,
+            last_message_id INTEGER,
+            last_message_preview TEXT,
+            last_sender_id INTEGER,
+            last_sent_at TIMESTAMP,
+            -- última atividade: envio da última mensagem ou criação do match
+            activity_at TIMESTAMP,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (match_id, user_id),
+            FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversation_state_user_activity
+        ON conversation_state(user_id, activity_at, match_id)
+    ''')
+
+    # Todo match nasce com as linhas dos dois participantes
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_matches_conversation_state
+        AFTER INSERT ON matches
+        BEGIN
+            INSERT INTO conversation_state (match_id, user_id, other_user_id, activity_at)
+            VALUES (NEW.id, NEW.user1_id, NEW.user2_id, NEW.matched_at),
+                   (NEW.id, NEW.user2_id, NEW.user1_id, NEW.matched_at);
+        END
+    ''')
+
+    # Backfill dos matches e mensagens existentes
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO conversation_state (
+            match_id, user_id, other_user_id, last_message_id, last_message_preview,
+            last_sender_id, last_sent_at, activity_at, unread_count
+        )
+        SELECT
+            p.match_id, p.user_id, p.other_user_id,
+            last.id, substr(last.message_text, 1, {MESSAGE_PREVIEW_LENGTH}), last.sender_id, last.sent_at,
+            COALESCE(last.sent_at, p.matched_at),
+            (
+                SELECT COUNT(*) FROM messages msg
+                WHERE msg.match_id = p.match_id AND msg.sender_id != p.user_id AND msg.is_read = 0
+            )
+        FROM (
+            SELECT id AS match_id, user1_id AS user_id, user2_id AS other_user_id, matched_at FROM matches
+            UNION ALL
+            SELECT id, user2_id, user1_id, matched_at FROM matches
+        ) p
+        LEFT JOIN messages last ON last.id = (
+            SELECT id FROM messages WHERE match_id = p.match_id ORDER BY sent_at DESC, id DESC LIMIT 1
+        )
+    ''')
+
+
+@migration(4, 'deck de descoberta pré-calculado por usuário (discover_queue)')
+def _discover_queue(cursor):
+    # Candidatos de cada usuário, já em ordem de relevância; consumidos a cada swipe
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discover_queue (
+            user_id INTEGER NOT NULL,
+            candidate_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            score REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, candidate_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (candidate_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_discover_queue_user_position
+        ON discover_queue(user_id, position)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_discover_queue_candidate ON discover_queue(candidate_id)')
+
+    # Estado do deck: stale = pontuações desatualizadas (tags mudaram),
+    # exhausted = a última recarga não encontrou mais candidatos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discover_deck_state (
+            user_id INTEGER PRIMARY KEY,
+            user_type TEXT NOT NULL,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            stale INTEGER NOT NULL DEFAULT 0,
+            exhausted INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Perfil já avaliado sai do deck na mesma transação do swipe
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_swipes_discover_queue
+        AFTER INSERT ON swipes
+        BEGIN
+            DELETE FROM discover_queue
+            WHERE user_id = NEW.from_user_id AND candidate_id = NEW.to_user_id;
+        END
+    ''')
+
+    # Usuário novo pode entrar nos decks que já tinham se esgotado
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_users_discover_deck
+        AFTER INSERT ON users
+        BEGIN
+            UPDATE discover_deck_state SET exhausted = 0
+            WHERE exhausted = 1 AND user_type != NEW.user_type;
+        END
+    ''')
+
+    # Troca de tipo (complete_profile): o usuário muda de população
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_users_type_discover_deck
+        AFTER UPDATE OF user_type ON users
+        WHEN NEW.user_type != OLD.user_type
+        BEGIN
+            DELETE FROM discover_queue WHERE user_id = NEW.id OR candidate_id = NEW.id;
+            DELETE FROM discover_deck_state WHERE user_id = NEW.id;
+            UPDATE discover_deck_state SET exhausted = 0
+            WHERE exhausted = 1 AND user_type != NEW.user_type;
+        END
+    ''')
+
+    # Tags alteradas mudam a pontuação do próprio deck do usuário e a posição
+    # dele nos decks do tipo oposto
+    for table, opposite_type in (('teacher_skills', 'student'), ('student_interests', 'teacher')):
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_discover_deck
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE discover_deck_state SET stale = 1
+                    WHERE stale = 0 AND (user_id = {row}.user_id OR user_type = '{opposite_type}');
+                END
+            ''')
+
+
+@migration(5, 'versão do deck de descoberta (cursores de paginação)')
+def _discover_deck_version(cursor):
+    # Incrementada a cada recálculo completo do deck: um cursor de outra
+    # versão aponta para posições que não existem mais
+    cursor.execute('PRAGMA table_info(discover_deck_state)')
+    if 'version' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE discover_deck_state ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+
+@migration(6, 'match criado por trigger no swipe e índice do par inverso')
+def _swipe_match_trigger(cursor):
+    # O par exato (from_user_id, to_user_id) já é uma busca de uma linha pelo
+    # UNIQUE da tabela; faltava servir as buscas pelo destino (likes recebidos,
+    # like inverso por to_user_id) sem ler a tabela
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_swipes_to_type_from
+        ON swipes(to_user_id, swipe_type, from_user_id)
+    ''')
+
+    # Like mútuo vira match no mesmo statement do swipe: com o escritor
+    # único, dois likes opostos simultâneos não perdem nem duplicam o match
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_swipes_match
+        AFTER INSERT ON swipes
+        WHEN NEW.swipe_type = 'like'
+        BEGIN
+            INSERT INTO matches (user1_id, user2_id)
+            SELECT min(NEW.from_user_id, NEW.to_user_id), max(NEW.from_user_id, NEW.to_user_id)
+            WHERE EXISTS (
+                SELECT 1 FROM swipes
+                WHERE to_user_id = NEW.from_user_id AND swipe_type = 'like'
+                  AND from_user_id = NEW.to_user_id
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM matches
+                WHERE user1_id = min(NEW.from_user_id, NEW.to_user_id)
+                  AND user2_id = max(NEW.from_user_id, NEW.to_user_id)
+            );
+        END
+    ''')
+
+
+@migration(7, 'índice de matches pelo segundo participante')
+def _matches_user2_index(cursor):
+    # "user1_id = ? OR user2_id = ?": idx_matches_users só atende o primeiro lado
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_user2 ON matches(user2_id)')
+
+
+@migration(8, 'versões por usuário para respostas condicionais (ETag)')
+def _user_versions(cursor):
+    # profile_version: dados exibidos no perfil do usuário (cadastro, tags, média de avaliações)
+    # activity_version: swipes, matches, conversas e avaliações que envolvem o usuário,
+    # incluindo mudanças no perfil de quem deu match com ele (lista de matches)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            profile_version INTEGER NOT NULL DEFAULT 0,
+            activity_version INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO user_versions (user_id) SELECT id FROM users')
+
+    def bump(column, user_expr):
+        return f'UPDATE user_versions SET {column} = {column} + 1 WHERE user_id = {user_expr};'
+
+    triggers = {
+        'trg_users_versions_insert': ('AFTER INSERT ON users', '''
+            INSERT INTO user_versions (user_id)
+            SELECT NEW.id WHERE NOT EXISTS (SELECT 1 FROM user_versions WHERE user_id = NEW.id);
+        '''),
+        'trg_users_versions_update': ('AFTER UPDATE ON users', bump('profile_version', 'NEW.id')),
+        'trg_swipes_versions': ('AFTER INSERT ON swipes',
+                                bump('activity_version', 'NEW.from_user_id')
+                                + bump('activity_version', 'NEW.to_user_id')),
+        'trg_matches_versions_insert': ('AFTER INSERT ON matches',
+                                        bump('activity_version', 'NEW.user1_id')
+                                        + bump('activity_version', 'NEW.user2_id')),
+        'trg_matches_versions_update': ('AFTER UPDATE ON matches',
+                                        bump('activity_version', 'NEW.user1_id')
+                                        + bump('activity_version', 'NEW.user2_id')),
+        # Mensagens novas e leituras passam por conversation_state (última mensagem, não lidas)
+        'trg_conversation_state_versions_insert': ('AFTER INSERT ON conversation_state',
+                                                   bump('activity_version', 'NEW.user_id')),
+        'trg_conversation_state_versions_update': ('AFTER UPDATE ON conversation_state',
+                                                   bump('activity_version', 'NEW.user_id')),
+        # Perfil alterado: a lista de matches dos parceiros mostra nome, foto e tags dele
+        'trg_user_versions_partners': ('AFTER UPDATE OF profile_version ON user_versions', '''
+            UPDATE user_versions SET activity_version = activity_version + 1
+            WHERE user_id IN (
+                SELECT user2_id FROM matches WHERE user1_id = NEW.user_id
+                UNION ALL
+                SELECT user1_id FROM matches WHERE user2_id = NEW.user_id
+            );
+        '''),
+    }
+    for table in ('teacher_skills', 'student_interests'):
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            triggers[f'trg_{table}_{event.lower()}_versions'] = (
+                f'AFTER {event} ON {table}', bump('profile_version', f'{row}.user_id')
+            )
+    # Avaliação muda a média no perfil de quem foi avaliado e a avaliação exibida no match
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        triggers[f'trg_ratings_{event.lower()}_versions'] = (
+            f'AFTER {event} ON ratings',
+            bump('profile_version', f'{row}.rated_id')
+            + bump('activity_version', f'{row}.rater_id')
+            + bump('activity_version', f'{row}.rated_id')
+        )
+
+    for name, (timing, body) in triggers.items():
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {timing}
+            BEGIN
+                {body}
+            END
+        ''')
+
+
+@migration(9, 'dicionário de tags com ids inteiros (tags, tag_aliases, tag_id)')
+def _tag_dictionary(cursor):
+    # Regras de normalização e apelidos congeladas nesta migração (mudanças
+    # posteriores em backend/tags.py não alteram o que ela faz)
+    seed_aliases = {
+        'js': 'javascript',
+        'ts': 'typescript',
+        'py': 'python',
+        'golang': 'go',
+        'postgres': 'postgresql',
+        'c sharp': 'c#',
+        'csharp': 'c#',
+        'node': 'node.js',
+        'nodejs': 'node.js',
+        'react.js': 'react',
+        'reactjs': 'react'
+    }
+
+    def normalize(name):
+        decomposed = unicodedata.normalize('NFKD', str(name))
+        stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+        return ' '.join(stripped.split()).casefold()
+
+    def tag_id_for(name):
+        canonical = normalize(name)
+        if not canonical:
+            return None
+        cursor.execute(
+            '''
+            SELECT tag_id FROM tag_aliases WHERE alias = ?
+            UNION ALL
+            SELECT id FROM tags WHERE canonical = ?
+            LIMIT 1
+            ''',
+            (canonical, canonical)
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        cursor.execute(
+            'INSERT INTO tags (canonical, display_name) VALUES (?, ?)',
+            (canonical, ' '.join(str(name).split()))
+        )
+        return cursor.lastrowid
+
+    # Uma linha por forma canônica; display_name é a grafia de quem usou a tag primeiro
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            canonical TEXT NOT NULL UNIQUE,
+            display_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tag_aliases (
+            alias TEXT PRIMARY KEY,
+            tag_id INTEGER NOT NULL,
+            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+        )
+    ''')
+
+    tag_tables = (('teacher_skills', 'skill_name'), ('student_interests', 'interest_name'))
+    for table, _ in tag_tables:
+        cursor.execute(f'PRAGMA table_info({table})')
+        if 'tag_id' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN tag_id INTEGER REFERENCES tags(id)')
+        # Quem tem a tag X: busca só no índice
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_tag ON {table}(tag_id, user_id)')
+
+    for alias, canonical in seed_aliases.items():
+        tag_id = tag_id_for(canonical)
+        cursor.execute(
+            '''
+            INSERT INTO tag_aliases (alias, tag_id)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM tag_aliases WHERE alias = ?)
+            ''',
+            (alias, tag_id, alias)
+        )
+
+    for table, column in tag_tables:
+        cursor.execute(f'SELECT id, {column} FROM {table} WHERE tag_id IS NULL')
+        ids_by_name = {}
+        params = []
+        for row_id, name in cursor.fetchall():
+            if name not in ids_by_name:
+                ids_by_name[name] = tag_id_for(name)
+            if ids_by_name[name] is not None:
+                params.append((ids_by_name[name], row_id))
+        cursor.executemany(f'UPDATE {table} SET tag_id = ? WHERE id = ?', params)
+
+
+@migration(10, 'índices cobrindo a pontuação do professor por nível (teacher_scores)')
+def _teacher_score_indexes(cursor):
+    # backend/discover_deck.py TEACHER_SCORES_SQL: tags do professor pela chave
+    # e alunos com cada tag, com os níveis e a avaliação, direto dos índices
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_teacher_skills_user_fit
+        ON teacher_skills(user_id, tag_id, skill_level, requires_evaluation)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_student_interests_tag_fit
+        ON student_interests(tag_id, user_id, desired_level, difficulty_level, requires_evaluation)
+    ''')
+    # Prefixo do índice acima
+    cursor.execute('DROP INDEX IF EXISTS idx_student_interests_tag')
+
+
+@migration(11, 'busca textual de perfis (profile_search, FTS5)')
+def _profile_search(cursor):
+    # Bancos antigos podem não ter as colunas lidas pela busca
+    cursor.execute('PRAGMA table_info(users)')
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for column in ('bio', 'credentials', 'photo_url'):
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN {column} TEXT')
+
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS profile_search USING fts5(
+                name, bio, credentials, skills, interests,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as exc:
+        if 'fts5' not in str(exc).lower():
+            raise
+        # SQLite compilado sem FTS5: o restante do app segue funcionando
+        print("⚠️  SQLite sem FTS5: busca de perfis desativada (/api/discover/search responde 503)")
+        return
+
+    # Documento de um usuário: nome, bio, credenciais, habilidades e interesses
+    document_select = '''
+        SELECT u.id, u.name, COALESCE(u.bio, ''), COALESCE(u.credentials, ''),
+            COALESCE((
+                SELECT group_concat(s.skill_name || ' ' || COALESCE(s.skill_description, ''), ' ')
+                FROM teacher_skills s WHERE s.user_id = u.id
+            ), ''),
+            COALESCE((
+                SELECT group_concat(i.interest_name || ' ' || COALESCE(i.description, ''), ' ')
+                FROM student_interests i WHERE i.user_id = u.id
+            ), '')
+        FROM users u
+    '''
+    insert_documents = 'INSERT INTO profile_search (rowid, name, bio, credentials, skills, interests)'
+
+    def reindex(user_expr):
+        return f'''
+            DELETE FROM profile_search WHERE rowid = {user_expr};
+            {insert_documents}
+            {document_select} WHERE u.id = {user_expr};
+        '''
+
+    # Documento refeito a cada mudança nos campos indexados ou nas tags do usuário
+    triggers = {
+        'trg_users_insert_search': ('AFTER INSERT ON users', reindex('NEW.id')),
+        'trg_users_update_search': ('AFTER UPDATE OF name, bio, credentials ON users', reindex('NEW.id')),
+        'trg_users_delete_search': ('AFTER DELETE ON users', 'DELETE FROM profile_search WHERE rowid = OLD.id;'),
+    }
+    for table in ('teacher_skills', 'student_interests'):
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            triggers[f'trg_{table}_{event.lower()}_search'] = (
+                f'AFTER {event} ON {table}', reindex(f'{row}.user_id')
+            )
+
+    for name, (timing, body) in triggers.items():
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {timing}
+            BEGIN
+                {body}
+            END
+        ''')
+
+    cursor.execute('DELETE FROM profile_search')
+    cursor.execute(f'{insert_documents} {document_select}')
+
+
+# Grade e faixas de CEP da migração 12. backend/geo.py importa estes valores
+# e o SQL abaixo, para o app calcular exatamente o que os triggers gravam;
+# por fazerem parte da migração, mudanças aqui vão numa nova migração
+
+# Grade de 0,25° (~28 km de altura): geo_cell = linha * GEO_CELLS_PER_ROW + coluna
+GEO_CELL_DEGREES = 0.25
+GEO_CELLS_PER_ROW = int(360 / GEO_CELL_DEGREES)
+
+# Faixas de CEP (5 primeiros dígitos) com o centroide aproximado da capital
+# ou, fora dela, do estado: (cep_start, cep_end, state, place, latitude,
+# longitude, precision)
+POSTAL_CODE_CENTROIDS = (
+    (1000, 5999, 'SP', 'São Paulo', -23.5505, -46.6333, 'city'),
+    (8000, 8499, 'SP', 'São Paulo', -23.5505, -46.6333, 'city'),
+    (1000, 19999, 'SP', 'São Paulo (estado)', -22.1900, -48.7900, 'state'),
+    (20000, 23799, 'RJ', 'Rio de Janeiro', -22.9068, -43.1729, 'city'),
+    (20000, 28999, 'RJ', 'Rio de Janeiro (estado)', -22.2500, -42.6600, 'state'),
+    (29000, 29099, 'ES', 'Vitória', -20.3155, -40.3128, 'city'),
+    (29000, 29999, 'ES', 'Espírito Santo (estado)', -19.6000, -40.7000, 'state'),
+    (30000, 31999, 'MG', 'Belo Horizonte', -19.9167, -43.9345, 'city'),
+    (30000, 39999, 'MG', 'Minas Gerais (estado)', -18.5000, -44.6000, 'state'),
+    (40000, 42499, 'BA', 'Salvador', -12.9777, -38.5016, 'city'),
+    (40000, 48999, 'BA', 'Bahia (estado)', -12.5000, -41.7000, 'state'),
+    (49000, 49099, 'SE', 'Aracaju', -10.9472, -37.0731, 'city'),
+    (49000, 49999, 'SE', 'Sergipe (estado)', -10.6000, -37.4000, 'state'),
+    (50000, 52999, 'PE', 'Recife', -8.0476, -34.8770, 'city'),
+    (50000, 56999, 'PE', 'Pernambuco (estado)', -8.4000, -37.9000, 'state'),
+    (57000, 57099, 'AL', 'Maceió', -9.6658, -35.7353, 'city'),
+    (57000, 57999, 'AL', 'Alagoas (estado)', -9.6000, -36.6000, 'state'),
+    (58000, 58099, 'PB', 'João Pessoa', -7.1195, -34.8450, 'city'),
+    (58000, 58999, 'PB', 'Paraíba (estado)', -7.2000, -36.8000, 'state'),
+    (59000, 59099, 'RN', 'Natal', -5.7945, -35.2110, 'city'),
+    (59000, 59999, 'RN', 'Rio Grande do Norte (estado)', -5.8000, -36.6000, 'state'),
+    (60000, 60999, 'CE', 'Fortaleza', -3.7319, -38.5267, 'city'),
+    (60000, 63999, 'CE', 'Ceará (estado)', -5.3000, -39.6000, 'state'),
+    (64000, 64099, 'PI', 'Teresina', -5.0920, -42.8038, 'city'),
+    (64000, 64999, 'PI', 'Piauí (estado)', -7.7000, -42.7000, 'state'),
+    (65000, 65099, 'MA', 'São Luís', -2.5307, -44.3068, 'city'),
+    (65000, 65999, 'MA', 'Maranhão (estado)', -5.0000, -45.3000, 'state'),
+    (66000, 66999, 'PA', 'Belém', -1.4558, -48.4902, 'city'),
+    (66000, 68899, 'PA', 'Pará (estado)', -3.8000, -52.5000, 'state'),
+    (68900, 68999, 'AP', 'Amapá (estado)', 1.4000, -51.8000, 'state'),
+    (69000, 69099, 'AM', 'Manaus', -3.1190, -60.0217, 'city'),
+    (69000, 69299, 'AM', 'Amazonas (estado)', -4.2000, -64.6000, 'state'),
+    (69300, 69399, 'RR', 'Roraima (estado)', 2.1000, -61.4000, 'state'),
+    (69400, 69899, 'AM', 'Amazonas (estado)', -4.2000, -64.6000, 'state'),
+    (69900, 69999, 'AC', 'Acre (estado)', -9.0000, -70.5000, 'state'),
+    (70000, 72799, 'DF', 'Brasília', -15.7939, -47.8828, 'state'),
+    (72800, 72999, 'GO', 'Goiás (estado)', -15.9000, -49.9000, 'state'),
+    (73000, 73699, 'DF', 'Brasília', -15.7939, -47.8828, 'state'),
+    (74000, 74899, 'GO', 'Goiânia', -16.6869, -49.2648, 'city'),
+    (73700, 76799, 'GO', 'Goiás (estado)', -15.9000, -49.9000, 'state'),
+    (76800, 76999, 'RO', 'Rondônia (estado)', -10.9000, -62.8000, 'state'),
+    (77000, 77999, 'TO', 'Tocantins (estado)', -10.2000, -48.3000, 'state'),
+    (78000, 78099, 'MT', 'Cuiabá', -15.6014, -56.0979, 'city'),
+    (78000, 78899, 'MT', 'Mato Grosso (estado)', -12.7000, -55.9000, 'state'),
+    (79000, 79129, 'MS', 'Campo Grande', -20.4697, -54.6201, 'city'),
+    (79000, 79999, 'MS', 'Mato Grosso do Sul (estado)', -20.6000, -54.5000, 'state'),
+    (80000, 82999, 'PR', 'Curitiba', -25.4284, -49.2733, 'city'),
+    (80000, 87999, 'PR', 'Paraná (estado)', -24.6000, -51.6000, 'state'),
+    (88000, 88099, 'SC', 'Florianópolis', -27.5954, -48.5480, 'city'),
+    (88000, 89999, 'SC', 'Santa Catarina (estado)', -27.3000, -50.4000, 'state'),
+    (90000, 91999, 'RS', 'Porto Alegre', -30.0346, -51.2177, 'city'),
+    (90000, 99999, 'RS', 'Rio Grande do Sul (estado)', -29.8000, -53.3000, 'state'),
+)
+
+
+def postal_code_centroid_sql(column):
+    """Subconsulta com a coluna da faixa mais estreita que contém users.postal_code (8 dígitos)"""
+    return f'''(
+        SELECT c.{column} FROM postal_code_centroids c
+        WHERE length(users.postal_code) = 8
+          AND CAST(substr(users.postal_code, 1, 5) AS INTEGER) BETWEEN c.cep_start AND c.cep_end
+        ORDER BY c.cep_end - c.cep_start
+        LIMIT 1
+    )'''
+
+
+def geocode_users_sql(where):
+    """Comandos que recalculam latitude, longitude e geo_cell dos usuários que satisfazem where"""
+    return f'''
+        UPDATE users SET
+            latitude = {postal_code_centroid_sql('latitude')},
+            longitude = {postal_code_centroid_sql('longitude')}
+        WHERE {where};
+        UPDATE users SET geo_cell = CASE
+            WHEN latitude IS NULL OR longitude IS NULL THEN NULL
+            ELSE CAST((latitude + 90) / {GEO_CELL_DEGREES} AS INTEGER) * {GEO_CELLS_PER_ROW}
+                 + CAST((longitude + 180) / {GEO_CELL_DEGREES} AS INTEGER)
+        END
+        WHERE {where};
+    '''
+
+
+def geocode_users(cursor, where):
+    """Executa geocode_users_sql(where)"""
+    for statement in geocode_users_sql(where).split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def replace_postal_code_centroids(cursor, rows):
+    """Substitui o conteúdo de postal_code_centroids pelas faixas informadas"""
+    cursor.execute('DELETE FROM postal_code_centroids')
+    cursor.executemany(
+        '''
+        INSERT INTO postal_code_centroids
+            (cep_start, cep_end, state, place, latitude, longitude, precision)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''',
+        rows
+    )
+
+
+@migration(12, 'coordenadas aproximadas pelo CEP e grade geográfica (geo_cell)')
+def _geo_cells(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS postal_code_centroids (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cep_start INTEGER NOT NULL,
+            cep_end INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            place TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            precision TEXT NOT NULL
+        )
+    ''')
+
+    cursor.execute('PRAGMA table_info(users)')
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for column, definition in (('latitude', 'REAL'), ('longitude', 'REAL'), ('geo_cell', 'INTEGER')):
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN {column} {definition}')
+
+    # Busca por raio: faixas de geo_cell por tipo, com as coordenadas no próprio índice
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_geo
+        ON users(user_type, geo_cell, latitude, longitude)
+    ''')
+
+    # CEP gravado ou alterado: coordenadas recalculadas na mesma transação
+    for name, timing in (
+        ('trg_users_insert_geo', 'AFTER INSERT ON users'),
+        ('trg_users_postal_code_geo', 'AFTER UPDATE OF postal_code ON users'),
+    ):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {timing}
+            BEGIN
+                {geocode_users_sql('id = NEW.id')}
+            END
+        ''')
+
+    replace_postal_code_centroids(cursor, POSTAL_CODE_CENTROIDS)
+    geocode_users(cursor, 'postal_code IS NOT NULL')
+
+
+@migration(13, 'deck desatualizado só para quem tem o usuário alterado no deck')
+def _narrow_discover_deck_stale(cursor):
+    # Antes, qualquer tag alterada marcava todos os decks do tipo oposto, e cada
+    # recálculo muda a versão do deck (reinicia os cursores de paginação).
+    # Agora só o deck do próprio usuário e os decks em que ele já está (busca
+    # por idx_discover_queue_candidate); quem ainda não está num deck entra
+    # na próxima recarga dele
+    for table in ('teacher_skills', 'student_interests'):
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            name = f'trg_{table}_{event.lower()}_discover_deck'
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'''
+                CREATE TRIGGER {name}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE discover_deck_state SET stale = 1
+                    WHERE stale = 0 AND (
+                        user_id = {row}.user_id
+                        OR user_id IN (SELECT user_id FROM discover_queue WHERE candidate_id = {row}.user_id)
+                    );
+                END
+            ''')
@@ -0,0 +1,64 @@
+"""
+Busca Textual de Perfis (SQLite FTS5)
+Salvar como: backend/profile_search.py
+
+profile_search é uma tabela virtual FTS5 com um documento por usuário
+(rowid = users.id): nome, bio, credenciais, habilidades (nome e descrição)
+e interesses (nome e descrição). Triggers (migração 11) refazem o documento
+do usuário quando users, teacher_skills ou student_interests mudam, então a
+busca é uma consulta ao índice invertido em vez de LIKE sobre as tabelas.
+
+O tokenizer ignora acentos e maiúsculas ("violao" encontra "Violão") e o
+índice de prefixos atende buscas parciais ("pyt" encontra "Python").
+Em SQLite sem FTS5 a migração não cria a tabela e a busca fica indisponível.
+"""
+
+import re
+
+# Peso de cada coluna do documento no BM25, na ordem da migração 11
+# (name, bio, credentials, skills, interests): nome e tags pesam mais
+SEARCH_COLUMN_WEIGHTS = (10.0, 1.0, 2.0, 5.0, 5.0)
+
+# Termos considerados por busca
+MAX_QUERY_TERMS = 8
+
+
+def match_expression(text):
+    """
+    Expressão MATCH para o texto digitado: cada palavra vira um prefixo entre
+    aspas (a sintaxe do FTS5 não chega ao usuário) e todas precisam aparecer.
+    None se não houver palavras.
+    """
+    terms = re.findall(r'\w+', text or '')[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+# Página de resultados: menor BM25 = mais relevante; desempate e cursor por id
+SEARCH_SQL = f'''
+    SELECT id, name, bio, user_type, photo_url, rank
+    FROM (
+        SELECT u.id, u.name, u.bio, u.user_type, u.photo_url,
+               bm25(profile_search, {', '.join(str(weight) for weight in SEARCH_COLUMN_WEIGHTS)}) AS rank
+        FROM profile_search
+        JOIN users u ON u.id = profile_search.rowid
+        WHERE profile_search MATCH ? AND u.user_type = ?
+    )
+    WHERE (rank, id) > (?, ?)
+    ORDER BY rank, id
+    LIMIT ?
+'''
+
+
+def search_available(cursor):
+    """A tabela profile_search existe (SQLite com FTS5)"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'profile_search'")
+    return cursor.fetchone() is not None
+
+
+def search_profiles(cursor, expression, user_type, limit, after=None):
+    """Perfis do tipo informado que casam com a expressão, a partir de after=(rank, id)"""
+    after_rank, after_id = after if after is not None else (float('-inf'), 0)
+    cursor.execute(SEARCH_SQL, (expression, user_type, after_rank, after_id, limit))
+    return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,161 @@
+"""
+Cache de Respostas por Usuário (LRU + TTL)
+Salvar como: backend/response_cache.py
+
+Guarda o corpo das respostas de perfil, matches e estatísticas por
+(rota, usuário, query string). Cada entrada leva a versão com que foi
+calculada (o ETag de backend/conditional.py, derivado de user_versions):
+se a versão atual do usuário for outra, a entrada é descartada. Assim um
+processo não serve dados antigos mesmo quando a escrita aconteceu em outro
+worker; as invalidações explícitas das rotas de escrita liberam a memória
+e evitam esperar pelo TTL.
+
+Requisições simultâneas para a mesma chave e versão calculam a resposta
+uma única vez (single-flight): as demais esperam o resultado da primeira.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import backend.database as database
+
+MAX_ENTRIES = 5000
+TTL_SECONDS = 60
+
+# Tempo máximo que uma requisição espera pelo cálculo de outra
+WAIT_TIMEOUT_S = 10
+
+
+class ResponseCache:
+    """Chave (rota, usuário dono, query string) -> (versão, expira_em, valor)"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._path = None
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._inflight = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'stale': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def _check_database(self):
+        # Banco trocado (ex.: testes): nada do cache vale mais
+        if self._path != database.DATABASE_PATH:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._inflight.clear()
+            self._path = database.DATABASE_PATH
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[1]]
+
+    def _store(self, key, version, value):
+        self._remove(key)
+        self._entries[key] = (version, time.monotonic() + self.ttl_seconds, value)
+        self._keys_by_user.setdefault(key[1], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def get_or_compute(self, key, version, compute, store_if=None):
+        """
+        Valor em cache para key na versão informada, ou compute() (uma vez por
+        chave e versão, mesmo com requisições simultâneas). key[1] é o usuário
+        dono da entrada, usado por invalidate_users(). store_if(valor) decide
+        se o resultado pode ser guardado.
+        """
+        with self._lock:
+            self._check_database()
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_version, expires_at, value = entry
+                if cached_version == version and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                self._stats['stale' if cached_version != version else 'expired'] += 1
+                self._remove(key)
+
+            flight = self._inflight.get(key)
+            if flight is not None and flight[0] == version:
+                self._stats['coalesced'] += 1
+                future = flight[1]
+                leader = False
+            else:
+                self._stats['misses'] += 1
+                future = Future()
+                self._inflight[key] = (version, future)
+                leader = True
+
+        if not leader:
+            try:
+                return future.result(timeout=WAIT_TIMEOUT_S)
+            except FutureTimeoutError:
+                return compute()
+
+        try:
+            value = compute()
+        except BaseException as exc:
+            with self._lock:
+                if self._inflight.get(key, (None, None))[1] is future:
+                    del self._inflight[key]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            # Invalidada durante o cálculo: entrega o valor, mas não guarda
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+                if store_if is None or store_if(value):
+                    self._store(key, version, value)
+        future.set_result(value)
+        return value
+
+    def invalidate_users(self, *user_ids):
+        """Descarta as entradas dos usuários (chamado após escritas que os afetam)"""
+        with self._lock:
+            self._check_database()
+            for user_id in set(user_ids):
+                for key in list(self._keys_by_user.get(user_id, ())):
+                    self._remove(key)
+                    self._stats['invalidations'] += 1
+                for key in [key for key in self._inflight if key[1] == user_id]:
+                    del self._inflight[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._inflight.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['users'] = len(self._keys_by_user)
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def get_response_cache_stats():
+    """Métricas do cache de respostas"""
+    return response_cache.stats()
@@ -11,7 +11,9 @@ import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from backend.database import get_db_connection
+from backend.database import get_read_connection, get_write_connection
+from backend.tag_index import tag_index
+from backend.tags import tag_id_for
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -69,7 +71,7 @@ def register():
     if user_type not in ['student', 'teacher']:
         return jsonify({'error': 'Tipo de usuário deve ser "student" ou "teacher"'}), 400
     
-    conn = get_db_connection()
+    conn = get_write_connection()
     cursor = conn.cursor()
     
     try:
@@ -104,14 +106,15 @@ def register():
                 if not skill.get('name'):
                     continue
                 cursor.execute(
-                    '''INSERT INTO teacher_skills (user_id, skill_name, skill_description, skill_level, requires_evaluation)
-                       VALUES (?, ?, ?, ?, ?)''',
+                    '''INSERT INTO teacher_skills (user_id, skill_name, skill_description, skill_level, requires_evaluation, tag_id)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
                     (
                         user_id,
                         skill['name'],
                         skill.get('description', ''),
                         skill.get('level'),
-                        1 if skill.get('requires_evaluation') else 0
+                        1 if skill.get('requires_evaluation') else 0,
+                        tag_id_for(cursor, skill['name'])
                     )
                 )
                 print(f"  ✅ Habilidade adicionada: {skill['name']}")
@@ -122,20 +125,22 @@ def register():
                 if not interest.get('name'):
                     continue
                 cursor.execute(
-                    '''INSERT INTO student_interests (user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation)
-                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    '''INSERT INTO student_interests (user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation, tag_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
                     (
                         user_id,
                         interest['name'],
                         interest.get('difficulty', 'beginner'),
                         interest.get('description', ''),
                         interest.get('desired_level'),
-                        1 if interest.get('requires_evaluation') else 0
+                        1 if interest.get('requires_evaluation') else 0,
+                        tag_id_for(cursor, interest['name'])
                     )
                 )
                 print(f"  ✅ Interesse adicionado: {interest['name']}")
         
         conn.commit()
+        tag_index.reload_user(cursor, user_id)
         
         token = create_access_token(identity=str(user_id), expires_delta=timedelta(days=7))
         
@@ -165,7 +170,7 @@ def login():
     if not all(k in data for k in ['email', 'password']):
         return jsonify({'error': 'Email e senha são obrigatórios'}), 400
     
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
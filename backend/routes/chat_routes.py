@@ -12,10 +12,164 @@ import os
 # Adicionar o diretório pai ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.database import get_db_connection
+from backend.conditional import conditional_get
+from backend.database import get_read_connection, get_write_connection
+from backend.events import event_hub
+from backend.migrations import MESSAGE_PREVIEW_LENGTH
+from backend.response_cache import response_cache
+from backend.write_queue import write_queue
 
 chat_bp = Blueprint('chat', __name__)
 
+DEFAULT_MESSAGES_PAGE_SIZE = 50
+MAX_MESSAGES_PAGE_SIZE = 200
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+
+def _insert_message(cursor, match_id, sender_id, message_text):
+    """
+    Operação da fila de escrita: grava a mensagem se o remetente faz parte
+    de um match ativo. Retorna um dict com message_id, recipient_id e o total
+    de não lidas do destinatário, ou None se o match for inválido.
+    """
+    cursor.execute(
+        '''
+        SELECT id, user1_id, user2_id FROM matches
+        WHERE id = ? AND (user1_id = ? OR user2_id = ?) AND is_active = 1
+        ''',
+        (match_id, sender_id, sender_id)
+    )
+    match = cursor.fetchone()
+    if not match:
+        return None
+    recipient_id = match['user2_id'] if match['user1_id'] == sender_id else match['user1_id']
+
+    cursor.execute(
+        '''
+        INSERT INTO messages (match_id, sender_id, message_text)
+        VALUES (?, ?, ?)
+        ''',
+        (match_id, sender_id, message_text)
+    )
+    message_id = cursor.lastrowid
+
+    # Atualizar o estado da conversa dos dois participantes na mesma transação
+    cursor.execute(
+        '''
+        UPDATE conversation_state SET
+            last_message_id = ?,
+            last_message_preview = substr(?, 1, ?),
+            last_sender_id = ?,
+            last_sent_at = (SELECT sent_at FROM messages WHERE id = ?),
+            activity_at = (SELECT sent_at FROM messages WHERE id = ?),
+            unread_count = unread_count + (user_id != ?)
+        WHERE match_id = ?
+        ''',
+        (message_id, message_text, MESSAGE_PREVIEW_LENGTH, sender_id,
+         message_id, message_id, sender_id, match_id)
+    )
+
+    return {
+        'message_id': message_id,
+        'recipient_id': recipient_id,
+        'recipient_unread_count': _total_unread(cursor, recipient_id)
+    }
+
+
+def _total_unread(cursor, user_id):
+    cursor.execute(
+        'SELECT COALESCE(SUM(unread_count), 0) FROM conversation_state WHERE user_id = ?',
+        (user_id,)
+    )
+    return cursor.fetchone()[0]
+
+
+def _is_participant(cursor, match_id, user_id):
+    # Só participantes do match têm linha em conversation_state
+    cursor.execute(
+        'SELECT 1 FROM conversation_state WHERE match_id = ? AND user_id = ?',
+        (match_id, user_id)
+    )
+    return cursor.fetchone() is not None
+
+
+def _mark_read(cursor, match_id, user_id):
+    """
+    Marca como lidas as mensagens recebidas pelo usuário no match e zera o contador.
+    Retorna o novo total de não lidas do usuário, ou None se nada mudou.
+    """
+    if not _is_participant(cursor, match_id, user_id):
+        return None
+
+    cursor.execute(
+        '''
+        UPDATE messages
+        SET is_read = 1
+        WHERE match_id = ? AND sender_id != ? AND is_read = 0
+        ''',
+        (match_id, user_id)
+    )
+    cursor.execute(
+        '''
+        UPDATE conversation_state
+        SET unread_count = 0
+        WHERE match_id = ? AND user_id = ? AND unread_count != 0
+        ''',
+        (match_id, user_id)
+    )
+    if cursor.rowcount == 0:
+        return None
+    return _total_unread(cursor, user_id)
+
+
+def _publish_unread(user_id, unread_count):
+    if unread_count is not None:
+        event_hub.publish(user_id, 'unread', {'unread_count': unread_count})
+
+
+def deliver_message(sender_id, match_id, message_text):
+    """
+    Grava a mensagem (match ativo do qual o remetente participa) e avisa as
+    conexões abertas dos dois participantes. Usado pela rota HTTP e pelo
+    gateway WebSocket. Retorna o resultado de _insert_message ou None.
+    """
+    result = write_queue.execute(_insert_message, match_id, sender_id, message_text)
+    if result is None:
+        return None
+
+    event = {
+        'match_id': match_id,
+        'message_id': result['message_id'],
+        'sender_id': sender_id,
+        'message_text': message_text
+    }
+    response_cache.invalidate_users(sender_id, result['recipient_id'])
+    event_hub.publish(result['recipient_id'], 'message', event)
+    event_hub.publish(sender_id, 'message', event)
+    _publish_unread(result['recipient_id'], result['recipient_unread_count'])
+    return result
+
+
+def mark_conversation_read(match_id, user_id):
+    """
+    Marca o match como lido pelo usuário e publica o novo total de não lidas
+    (se mudou). Retorna o total de não lidas do usuário, ou None se ele não
+    participa do match.
+    """
+    conn = get_write_connection()
+    try:
+        cursor = conn.cursor()
+        if not _is_participant(cursor, match_id, user_id):
+            return None
+        unread_count = _mark_read(cursor, match_id, user_id)
+        conn.commit()
+        if unread_count is None:
+            return _total_unread(cursor, user_id)
+    finally:
+        conn.close()
+    _publish_unread(user_id, unread_count)
+    return unread_count
+
 
 @chat_bp.route('/send', methods=['POST'])
 @jwt_required()
@@ -39,105 +193,132 @@ def send_message():
     if not message_text:
         return jsonify({'error': 'Mensagem não pode estar vazia'}), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Verificar se o match existe e o usuário faz parte dele
-        cursor.execute(
-            '''
-            SELECT id FROM matches 
-            WHERE id = ? AND (user1_id = ? OR user2_id = ?) AND is_active = 1
-            ''',
-            (data['match_id'], current_user_id, current_user_id)
-        )
-        
-        match = cursor.fetchone()
-        if not match:
+        result = deliver_message(current_user_id, data['match_id'], message_text)
+        if result is None:
             return jsonify({'error': 'Match não encontrado ou inválido'}), 404
-        
-        # Inserir mensagem
-        cursor.execute(
-            '''
-            INSERT INTO messages (match_id, sender_id, message_text)
-            VALUES (?, ?, ?)
-            ''',
-            (data['match_id'], current_user_id, message_text)
-        )
-        
-        message_id = cursor.lastrowid
-        conn.commit()
-        
+
         return jsonify({
             'message': 'Mensagem enviada com sucesso',
-            'message_id': message_id
+            'message_id': result['message_id']
         }), 201
-        
+
     except Exception as e:
-        conn.rollback()
         print(f"Erro ao enviar mensagem: {e}")
         return jsonify({'error': 'Erro ao enviar mensagem'}), 500
-        
-    finally:
-        conn.close()
 
 
 @chat_bp.route('/messages/<int:match_id>', methods=['GET'])
 @jwt_required()
 def get_messages(match_id):
     """
-    Retorna todas as mensagens de um chat
+    Retorna mensagens de um chat, paginadas por id (keyset)
+
+    Query params (opcionais):
+    - after_id: apenas mensagens mais novas que este id (polling incremental)
+    - before_id: página de mensagens mais antigas que este id
+    - limit: tamanho da página (padrão 50, máximo 200)
+
+    Sem parâmetros, retorna as mensagens mais recentes. A resposta traz
+    'cursor' com os ids para a próxima consulta em cada direção.
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = request.args.get('limit', DEFAULT_MESSAGES_PAGE_SIZE, type=int)
+    if after_id is not None and before_id is not None:
+        return jsonify({'error': 'Use after_id ou before_id, não ambos'}), 400
+    limit = max(1, min(limit, MAX_MESSAGES_PAGE_SIZE))
+
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
-        # Verificar se o usuário faz parte do match
+        # Verificar se o usuário faz parte do match (e já trazer nomes e não lidas)
         cursor.execute(
             '''
-            SELECT id FROM matches 
-            WHERE id = ? AND (user1_id = ? OR user2_id = ?)
+            SELECT m.user1_id, m.user2_id, u1.name as user1_name, u2.name as user2_name,
+                   cs.unread_count
+            FROM matches m
+            JOIN users u1 ON u1.id = m.user1_id
+            JOIN users u2 ON u2.id = m.user2_id
+            LEFT JOIN conversation_state cs ON cs.match_id = m.id AND cs.user_id = ?
+            WHERE m.id = ? AND (m.user1_id = ? OR m.user2_id = ?)
             ''',
-            (match_id, current_user_id, current_user_id)
+            (current_user_id, match_id, current_user_id, current_user_id)
         )
         
         match = cursor.fetchone()
         if not match:
             return jsonify({'error': 'Match não encontrado'}), 404
-        
-        # Buscar mensagens
-        cursor.execute(
-            '''
-            SELECT 
-                m.id,
-                m.sender_id,
-                m.message_text,
-                m.sent_at,
-                m.is_read,
-                u.name as sender_name
-            FROM messages m
-            JOIN users u ON m.sender_id = u.id
-            WHERE m.match_id = ?
-            ORDER BY m.sent_at ASC
-            ''',
-            (match_id,)
-        )
-        
-        messages = [dict(row) for row in cursor.fetchall()]
-        
-        # Marcar mensagens como lidas
-        cursor.execute(
-            '''
-            UPDATE messages 
-            SET is_read = 1 
-            WHERE match_id = ? AND sender_id != ? AND is_read = 0
-            ''',
-            (match_id, current_user_id)
-        )
-        conn.commit()
-        
-        return jsonify({'messages': messages}), 200
+
+        sender_names = {
+            match['user1_id']: match['user1_name'],
+            match['user2_id']: match['user2_name']
+        }
+
+        # Buscar uma mensagem a mais para saber se a página continua.
+        # idx_messages_match(match_id) guarda o rowid no final da chave, então
+        # já serve a ordem (match_id, id) nas duas direções.
+        columns = 'id, sender_id, message_text, sent_at, is_read'
+        if after_id is not None:
+            cursor.execute(
+                f'''
+                SELECT {columns} FROM messages
+                WHERE match_id = ? AND id > ?
+                ORDER BY id ASC
+                LIMIT ?
+                ''',
+                (match_id, after_id, limit + 1)
+            )
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            # Mais recentes, ou a página imediatamente anterior a before_id
+            upper_bound = before_id if before_id is not None else SQLITE_MAX_INTEGER
+            cursor.execute(
+                f'''
+                SELECT {columns} FROM messages
+                WHERE match_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+                ''',
+                (match_id, upper_bound, limit + 1)
+            )
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+            rows = list(reversed(rows[:limit]))
+
+        messages = []
+        for row in rows:
+            message = dict(row)
+            message['sender_name'] = sender_names.get(row['sender_id'])
+            messages.append(message)
+
+        # Marcar mensagens como lidas apenas se houver alguma pendente
+        # (mutação vai pela faixa de escrita)
+        if match['unread_count']:
+            mark_conversation_read(match_id, current_user_id)
+
+        if messages:
+            newest_id = messages[-1]['id']
+            oldest_id = messages[0]['id']
+        else:
+            newest_id = after_id
+            oldest_id = None
+
+        return jsonify({
+            'messages': messages,
+            'cursor': {
+                # Próximo polling: ?after_id=<after_id>
+                'after_id': newest_id,
+                # Página anterior: ?before_id=<before_id> (None quando não há mais)
+                'before_id': oldest_id if after_id is None and has_more else None
+            },
+            'has_more': has_more
+        }), 200
         
     except Exception as e:
         print(f"Erro ao buscar mensagens: {e}")
@@ -154,71 +335,30 @@ def get_conversations():
     Retorna lista de conversas com a última mensagem de cada
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
-        query = '''
-            SELECT 
-                m.id as match_id,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.id
-                    ELSE u1.id
-                END as other_user_id,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.name
-                    ELSE u1.name
-                END as other_user_name,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.photo_url
-                    ELSE u1.photo_url
-                END as other_user_photo,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.user_type
-                    ELSE u1.user_type
-                END as other_user_type,
-                (
-                    SELECT message_text 
-                    FROM messages 
-                    WHERE match_id = m.id 
-                    ORDER BY sent_at DESC 
-                    LIMIT 1
-                ) as last_message,
-                (
-                    SELECT sent_at 
-                    FROM messages 
-                    WHERE match_id = m.id 
-                    ORDER BY sent_at DESC 
-                    LIMIT 1
-                ) as last_message_time,
-                (
-                    SELECT COUNT(*) 
-                    FROM messages 
-                    WHERE match_id = m.id 
-                    AND sender_id != ? 
-                    AND is_read = 0
-                ) as unread_count
-            FROM matches m
-            JOIN users u1 ON m.user1_id = u1.id
-            JOIN users u2 ON m.user2_id = u2.id
-            WHERE m.is_active = 1 
-            AND (m.user1_id = ? OR m.user2_id = ?)
-            ORDER BY COALESCE(
-                (
-                    SELECT sent_at 
-                    FROM messages 
-                    WHERE match_id = m.id 
-                    ORDER BY sent_at DESC 
-                    LIMIT 1
-                ),
-                m.matched_at
-            ) DESC
-        '''
-        
-        cursor.execute(query, (
-            current_user_id, current_user_id, current_user_id,
-            current_user_id, current_user_id, current_user_id, current_user_id
-        ))
+        # Uma varredura no índice (user_id, activity_at) de conversation_state
+        cursor.execute(
+            '''
+            SELECT
+                cs.match_id,
+                u.id as other_user_id,
+                u.name as other_user_name,
+                u.photo_url as other_user_photo,
+                u.user_type as other_user_type,
+                cs.last_message_preview as last_message,
+                cs.last_sent_at as last_message_time,
+                cs.unread_count
+            FROM conversation_state cs
+            JOIN matches m ON m.id = cs.match_id
+            JOIN users u ON u.id = cs.other_user_id
+            WHERE cs.user_id = ? AND m.is_active = 1
+            ORDER BY cs.activity_at DESC, cs.match_id DESC
+            ''',
+            (current_user_id,)
+        )
         
         conversations = [dict(row) for row in cursor.fetchall()]
         
@@ -234,25 +374,23 @@ def get_conversations():
 
 @chat_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
+@conditional_get('unread_count', activity=True)
 def get_unread_count():
     """
     Retorna o total de mensagens não lidas
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
         cursor.execute(
             '''
-            SELECT COUNT(*) as unread_count
-            FROM messages msg
-            JOIN matches m ON msg.match_id = m.id
-            WHERE (m.user1_id = ? OR m.user2_id = ?)
-            AND msg.sender_id != ?
-            AND msg.is_read = 0
+            SELECT COALESCE(SUM(unread_count), 0) as unread_count
+            FROM conversation_state
+            WHERE user_id = ?
             ''',
-            (current_user_id, current_user_id, current_user_id)
+            (current_user_id,)
         )
         
         result = cursor.fetchone()
@@ -275,19 +413,13 @@ def mark_messages_read(match_id):
     Marca todas as mensagens de um match como lidas
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+    conn = get_write_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            '''
-            UPDATE messages 
-            SET is_read = 1 
-            WHERE match_id = ? AND sender_id != ? AND is_read = 0
-            ''',
-            (match_id, current_user_id)
-        )
+        unread_count = _mark_read(cursor, match_id, current_user_id)
         conn.commit()
+        _publish_unread(current_user_id, unread_count)
         
         return jsonify({'message': 'Mensagens marcadas como lidas'}), 200
         
@@ -3,126 +3,309 @@ Rotas de Descoberta - Swipe e Match
 Salvar como: backend/routes/discover_routes.py
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from itsdangerous import BadSignature, URLSafeSerializer
+import json
+import sqlite3
 import sys
 import os
 
 # Adicionar o diretório pai ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.database import get_db_connection
+from backend.conditional import conditional_get
+from backend.database import get_read_connection
+from backend.discover_deck import (
+    REFILL_THRESHOLD, deck_refiller, deck_status, opposite_type, rank_nearby, read_deck, refill_deck
+)
+from backend.events import event_hub
+from backend.geo import LOCATION_PRECISION_SQL, distance_precision, haversine_km, users_within
+from backend.loaders import BatchLoader, placeholders
+from backend.profile_search import match_expression, search_available, search_profiles
+from backend.response_cache import response_cache
+from backend.swipe_cache import swipe_cache
+from backend.write_queue import write_queue
 
 discover_bp = Blueprint('discover', __name__)
 
+# Perfis por página (o cliente pede a próxima quando restam poucos cards)
+DEFAULT_PROFILES_PAGE_SIZE = 10
+MAX_PROFILES_PAGE_SIZE = 50
+
+# Perfis seguintes devolvidos só com id e foto, para o cliente pré-carregar as imagens
+MAX_PREFETCH = 10
+
+# Swipes aceitos por chamada de /swipe/batch
+MAX_BATCH_SWIPES = 100
+
+# Matches por página quando o cliente pagina a lista
+MAX_MATCHES_PAGE_SIZE = 100
+
+# Maior raio aceito na busca por proximidade (radius_km). Com os centroides
+# padrão (um ponto por capital ou estado) raios pequenos não filtram nada útil:
+# ver o docstring de get_profiles
+MAX_RADIUS_KM = 300
+
+# Tipo, coordenadas e precisão da localização do usuário que faz a busca
+USER_LOCATION_SQL = f'''
+    SELECT user_type, latitude, longitude, {LOCATION_PRECISION_SQL} AS location_precision
+    FROM users WHERE id = ?
+'''
+
+
+def _encode_cursor(kind, user_id, *values):
+    """Token opaco (assinado) com a posição da última página entregue ao usuário"""
+    serializer = URLSafeSerializer(current_app.config['SECRET_KEY'], salt=f'discover-{kind}')
+    return serializer.dumps({'u': user_id, 'p': list(values)})
+
+
+def _decode_cursor(kind, token, user_id, types):
+    """Valores do cursor (com os tipos esperados), ou None se for inválido ou de outro usuário"""
+    serializer = URLSafeSerializer(current_app.config['SECRET_KEY'], salt=f'discover-{kind}')
+    try:
+        data = serializer.loads(token)
+    except BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('u') != user_id:
+        return None
+    values = data.get('p')
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    if not all(type(value) is expected for value, expected in zip(values, types)):
+        return None
+    return tuple(values)
+
+
+def _attach_profile_details(cursor, profiles):
+    """Habilidades/interesses e resumo das avaliações de todos os perfis, carregados de uma vez"""
+    loader = BatchLoader(cursor)
+    profile_ids = [p['id'] for p in profiles]
+    skills_by_user = loader.skills([p['id'] for p in profiles if p['user_type'] == 'teacher'])
+    interests_by_user = loader.interests([p['id'] for p in profiles if p['user_type'] != 'teacher'])
+    ratings_by_user = loader.rating_summaries(profile_ids)
+
+    for profile in profiles:
+        if profile['user_type'] == 'teacher':
+            profile['skills'] = skills_by_user[profile['id']]
+        else:
+            profile['interests'] = interests_by_user[profile['id']]
+
+        # média de avaliações do usuário
+        summary = ratings_by_user[profile['id']]
+        average = None
+        if summary['average'] is not None:
+            average = round(float(summary['average']), 2)
+
+        profile['rating_summary'] = {
+            'average': average,
+            'count': summary['count']
+        }
+
+
+def _attach_distances(cursor, user, profiles):
+    """
+    distance_km de cada perfil até o usuário (aproximada, pelo CEP) e a
+    distance_precision dela (ver backend/geo.py), ou None se algum não tem CEP
+    """
+    locations = {}
+    profile_ids = [p['id'] for p in profiles]
+    if user['latitude'] is not None and profile_ids:
+        cursor.execute(
+            f'''
+            SELECT id, latitude, longitude, {LOCATION_PRECISION_SQL} FROM users
+            WHERE latitude IS NOT NULL AND id IN ({placeholders(profile_ids)})
+            ''',
+            profile_ids
+        )
+        locations = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+    for profile in profiles:
+        location = locations.get(profile['id'])
+        profile['distance_km'] = None
+        profile['distance_precision'] = None
+        if location is not None:
+            latitude, longitude, precision = location
+            profile['distance_km'] = round(haversine_km(user['latitude'], user['longitude'], latitude, longitude), 1)
+            profile['distance_precision'] = distance_precision(user['location_precision'], precision)
+
+
+def _nearby_profiles(cursor, current_user_id, user, radius_km, limit, prefetch, after, token):
+    """
+    Página de perfis do tipo oposto até radius_km do usuário (ver backend/geo.py),
+    por pontuação, distância e id. after = (raio, pontuação, distância, id) do
+    último perfil entregue.
+    """
+    if user['latitude'] is None:
+        return jsonify({'error': 'Cadastre um CEP válido no perfil para buscar por distância'}), 400
+
+    distances = users_within(
+        cursor, opposite_type(user['user_type']), user['latitude'], user['longitude'], radius_km
+    )
+    ranked = rank_nearby(cursor, current_user_id, user['user_type'], distances)
+    if after is not None:
+        last_key = (-after[1], after[2], after[3])
+        ranked = [item for item in ranked if (-item[1], item[2], item[0]) > last_key]
+
+    page = ranked[:limit + prefetch]
+    page_ids = [candidate_id for candidate_id, _, _ in page]
+    rows = {}
+    if page_ids:
+        cursor.execute(
+            f'''
+            SELECT id, name, bio, user_type, photo_url, {LOCATION_PRECISION_SQL} AS location_precision
+            FROM users
+            WHERE id IN ({placeholders(page_ids)})
+            ''',
+            page_ids
+        )
+        rows = {row['id']: dict(row) for row in cursor.fetchall()}
+
+    profiles = []
+    for candidate_id, score, distance in page[:limit]:
+        if candidate_id in rows:
+            profile = rows[candidate_id]
+            profile['match_score'] = round(score, 2)
+            profile['distance_km'] = round(distance, 1)
+            profile['distance_precision'] = distance_precision(
+                user['location_precision'], profile.pop('location_precision')
+            )
+            profiles.append(profile)
+    _attach_profile_details(cursor, profiles)
+
+    next_cursor = token
+    if page[:limit]:
+        candidate_id, score, distance = page[:limit][-1]
+        next_cursor = _encode_cursor('nearby', current_user_id, radius_km, float(score), distance, candidate_id)
+
+    response = {
+        'profiles': profiles,
+        'next_cursor': next_cursor,
+        'has_more': len(ranked) > limit,
+        'reset': False,
+        'radius_km': radius_km,
+        # O raio é medido a partir do centroide do CEP do usuário ('city' ou 'state')
+        'location_precision': user['location_precision']
+    }
+    if prefetch:
+        response['prefetch'] = [
+            {'id': candidate_id, 'photo_url': rows[candidate_id]['photo_url']}
+            for candidate_id, _, _ in page[limit:] if candidate_id in rows
+        ]
+    return jsonify(response), 200
+
 
 @discover_bp.route('/profiles', methods=['GET'])
 @jwt_required()
 def get_profiles():
     """
-    Retorna perfis disponíveis para swipe
+    Retorna os próximos perfis do deck de descoberta do usuário
     
-    Retorna usuários que:
-    - Não são o próprio usuário
-    - Ainda não receberam swipe do usuário atual
-    - São do tipo oposto (teacher <-> student)
+    O deck (discover_queue) contém usuários do tipo oposto
+    (teacher <-> student) que ainda não receberam swipe do usuário atual,
+    já ordenados por relevância (tags em comum). Ver backend/discover_deck.py.
+
+    Query params (opcionais):
+    - limit: perfis por página (padrão 10, máximo 50)
+    - cursor: 'next_cursor' da página anterior
+    - prefetch: quantos perfis seguintes devolver só com id e foto (máximo 10)
+    - radius_km: só perfis até essa distância (máximo 300), ordenados por
+      pontuação e distância; exige CEP no perfil do usuário
+
+    Resolução da localização: com os dados padrão (POSTAL_CODE_CENTROIDS da
+    migração 12) cada CEP vira um único ponto por capital ou, fora das
+    capitais, por estado. Todos os usuários de uma capital ficam a 0 km uns
+    dos outros e todos os do interior de um estado ficam no mesmo ponto.
+    Um radius_km pequeno (ex.: 5 ou 20) não significa "no meu bairro" nem
+    "na minha cidade": devolve a capital inteira, ou o estado inteiro, ou
+    nada. Só raios da ordem da distância entre capitais (centenas de km)
+    distinguem alguma coisa. A resposta traz location_precision e cada
+    perfil traz distance_precision para o cliente exibir isso. Uma base
+    por município pode ser carregada com flask load-postal-centroids.
+
+    A ordem é estável enquanto o deck não for recalculado; se foi (tags
+    mudaram), o cursor antigo recomeça do início e a resposta traz 'reset'.
+    Cada perfil traz distance_km, aproximada pelo CEP (None sem CEP), e
+    distance_precision: 'city' (entre centros de cidade) ou 'state' (algum
+    dos CEPs só localizado no estado; a distância é uma ordem de grandeza).
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+
+    limit = request.args.get('limit', DEFAULT_PROFILES_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PROFILES_PAGE_SIZE))
+    prefetch = request.args.get('prefetch', 0, type=int)
+    prefetch = max(0, min(prefetch, MAX_PREFETCH))
+
+    radius_km = None
+    if 'radius_km' in request.args:
+        radius_km = request.args.get('radius_km', type=float)
+        if radius_km is None or not 0 < radius_km <= MAX_RADIUS_KM:
+            return jsonify({'error': f'radius_km deve ser maior que 0 e no máximo {MAX_RADIUS_KM}'}), 400
+
+    after = None
+    token = request.args.get('cursor')
+    if token:
+        if radius_km is None:
+            # (versão do deck, última posição entregue)
+            after = _decode_cursor('profiles', token, current_user_id, (int, int))
+        else:
+            # (raio, pontuação, distância e id do último perfil entregue)
+            after = _decode_cursor('nearby', token, current_user_id, (float, float, float, int))
+            if after is not None and after[0] != radius_km:
+                after = None
+        if after is None:
+            return jsonify({'error': 'Cursor inválido'}), 400
+
+    conn = get_read_connection()
     cursor = conn.cursor()
-    print(f'corrent_user_id {current_user_id}')
+    
     try:
-        # Buscar tipo do usuário atual
-        cursor.execute('SELECT user_type FROM users WHERE id = ?', (current_user_id,))
-        user_data = cursor.fetchone()
-        
-        if not user_data:
+        cursor.execute(USER_LOCATION_SQL, (current_user_id,))
+        user = cursor.fetchone()
+        if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        current_user_type = user_data['user_type']
-        
-        # Tipo oposto para matching
-        opposite_type = 'teacher' if current_user_type == 'student' else 'student'
-        
-        # Buscar perfis disponíveis (limite maior para podermos ordenar por relevância)
-        query = '''
-            SELECT u.id, u.name, u.bio, u.user_type, u.photo_url
-            FROM users u
-            WHERE u.id != ?
-            AND u.user_type = ?
-            AND u.id NOT IN (
-                SELECT to_user_id FROM swipes WHERE from_user_id = ?
-            )
-            ORDER BY RANDOM()
-            LIMIT 50
-        '''
 
-        cursor.execute(query, (current_user_id, opposite_type, current_user_id))
-        profiles = [dict(row) for row in cursor.fetchall()]
+        if radius_km is not None:
+            return _nearby_profiles(cursor, current_user_id, user, radius_km, limit, prefetch, after, token)
 
-        # Se o usuário atual for student, carregar seus interesses para usar como parâmetro de match
-        current_user_interests = []
-        if current_user_type == 'student':
-            cursor.execute('SELECT interest_name FROM student_interests WHERE user_id = ?', (current_user_id,))
-            current_user_interests = [r['interest_name'].lower() for r in cursor.fetchall()]
-
-        # Adicionar habilidades/interesses de cada perfil e calcular score simples por interseção de tags
-        for profile in profiles:
-            profile['match_score'] = 0
-            if profile['user_type'] == 'teacher':
-                cursor.execute(
-                    'SELECT skill_name, skill_description, skill_level, requires_evaluation FROM teacher_skills WHERE user_id = ?',
-                    (profile['id'],)
-                )
-                skills = [dict(s) for s in cursor.fetchall()]
-                profile['skills'] = skills
-
-                # calcular score simples quando o student tem interesse coincidente com skill_name
-                if current_user_interests:
-                    for s in skills:
-                        if s.get('skill_name') and s['skill_name'].lower() in current_user_interests:
-                            profile['match_score'] += 1
-            else:
-                cursor.execute(
-                    'SELECT interest_name, difficulty_level, description, desired_level, requires_evaluation FROM student_interests WHERE user_id = ?',
-                    (profile['id'],)
-                )
-                profile['interests'] = [dict(i) for i in cursor.fetchall()]
-
-                # se current user for teacher, podemos também providenciar score baseando-se em interesses do aluno
-                if current_user_type == 'teacher' and current_user_interests:
-                    # para caso inverso (teacher procurando student), checar alinhamento
-                    for i in profile['interests']:
-                        if i.get('interest_name') and i['interest_name'].lower() in current_user_interests:
-                            profile['match_score'] += 1
-
-            # carregar média de avaliações do usuário
-            cursor.execute(
-                '''
-                SELECT AVG(rating) AS avg_rating, COUNT(*) AS total_ratings
-                FROM ratings
-                WHERE rated_id = ?
-                ''',
-                (profile['id'],)
-            )
-            rating_row = cursor.fetchone()
+        # Primeira visita: montar o deck agora; depois, só recargas em segundo plano
+        status = deck_status(cursor, current_user_id)
+        if status is None:
+            refill_deck(current_user_id, rebuild=True)
+            status = deck_status(cursor, current_user_id)
+        elif status['stale'] or (status['remaining'] < REFILL_THRESHOLD and not status['exhausted']):
+            deck_refiller.schedule(current_user_id)
 
-            average = None
-            count = 0
-            if rating_row:
-                count = rating_row['total_ratings'] or 0
-                if rating_row['avg_rating'] is not None:
-                    average = round(float(rating_row['avg_rating']), 2)
+        # Cursor de uma versão anterior do deck: as posições mudaram, recomeçar
+        reset = after is not None and after[0] != status['version']
+        after_position = after[1] if after is not None and not reset else -1
 
-            profile['rating_summary'] = {
-                'average': average,
-                'count': count
-            }
+        rows = read_deck(cursor, current_user_id, limit + prefetch + 1, after_position)
+        profiles = rows[:limit]
+        upcoming = rows[limit:limit + prefetch]
+        has_more = len(rows) > limit
+        if profiles:
+            next_cursor = _encode_cursor('profiles', current_user_id, status['version'], profiles[-1]['position'])
+        else:
+            # Fim do deck por enquanto: o mesmo cursor serve para buscar o que for adicionado
+            next_cursor = _encode_cursor('profiles', current_user_id, status['version'], after_position)
+        for profile in profiles:
+            del profile['position']
 
-        # Ordenar por match_score decrescente para apresentar candidatos mais relevantes primeiro
-        profiles.sort(key=lambda p: p.get('match_score', 0), reverse=True)
+        for profile in profiles:
+            profile['match_score'] = round(profile['match_score'], 2)
+        _attach_profile_details(cursor, profiles)
+        _attach_distances(cursor, user, profiles)
 
-        return jsonify({'profiles': profiles}), 200
+        response = {
+            'profiles': profiles,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'reset': reset
+        }
+        if prefetch:
+            response['prefetch'] = [{'id': p['id'], 'photo_url': p['photo_url']} for p in upcoming]
+        return jsonify(response), 200
         
     except Exception as e:
         print(f"Erro ao buscar perfis: {e}")
@@ -132,6 +315,145 @@ def get_profiles():
         conn.close()
 
 
+@discover_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_profiles_route():
+    """
+    Busca perfis do tipo oposto por palavra-chave (nome, bio, credenciais,
+    habilidades e interesses), ordenados por relevância (BM25).
+    Ver backend/profile_search.py.
+
+    Query params:
+    - q: termos da busca; cada palavra vale como prefixo ("pyt" -> Python)
+      e todas precisam aparecer
+    - limit: perfis por página (padrão 10, máximo 50)
+    - cursor: 'next_cursor' da página anterior (da mesma busca)
+    """
+    current_user_id = int(get_jwt_identity())
+
+    text = request.args.get('q', '').strip()
+    expression = match_expression(text)
+    if expression is None:
+        return jsonify({'error': 'Informe o termo de busca (q)'}), 400
+
+    limit = request.args.get('limit', DEFAULT_PROFILES_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PROFILES_PAGE_SIZE))
+
+    after = None
+    token = request.args.get('cursor')
+    if token:
+        # (busca, relevância e id do último perfil entregue)
+        decoded = _decode_cursor('search', token, current_user_id, (str, float, int))
+        if decoded is None or decoded[0] != text:
+            return jsonify({'error': 'Cursor inválido'}), 400
+        after = decoded[1:]
+
+    conn = get_read_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(USER_LOCATION_SQL, (current_user_id,))
+        user = cursor.fetchone()
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+
+        if not search_available(cursor):
+            return jsonify({'error': 'Busca indisponível neste servidor'}), 503
+
+        rows = search_profiles(cursor, expression, opposite_type(user['user_type']), limit + 1, after)
+        profiles = rows[:limit]
+        has_more = len(rows) > limit
+        next_cursor = None
+        if has_more:
+            last = profiles[-1]
+            next_cursor = _encode_cursor('search', current_user_id, text, float(last['rank']), last['id'])
+
+        for profile in profiles:
+            del profile['rank']
+        _attach_profile_details(cursor, profiles)
+        _attach_distances(cursor, user, profiles)
+
+        return jsonify({
+            'profiles': profiles,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }), 200
+
+    except Exception as e:
+        print(f"Erro na busca de perfis: {e}")
+        return jsonify({'error': 'Erro na busca de perfis'}), 500
+
+    finally:
+        conn.close()
+
+
+def _parse_swipe(data):
+    """(to_user_id, swipe_type) de um swipe do corpo da requisição, ou (None, mensagem de erro)"""
+    if not isinstance(data, dict) or not all(k in data for k in ['to_user_id', 'swipe_type']):
+        return None, 'to_user_id e swipe_type são obrigatórios'
+
+    if data['swipe_type'] not in ['like', 'skip']:
+        return None, 'swipe_type deve ser "like" ou "skip"'
+
+    try:
+        return (int(data['to_user_id']), data['swipe_type']), None
+    except (TypeError, ValueError):
+        return None, 'to_user_id inválido'
+
+
+def _watch_created_matches(cursor):
+    """
+    Liga, na conexão de escrita, o registro dos matches inseridos (tabela e
+    trigger TEMP, só desta conexão) e descarta o que ficou de escritas anteriores.
+
+    Com isso a operação sabe quais matches o trigger trg_swipes_match criou
+    no próprio INSERT do swipe, sem consultar matches em seguida: um match
+    que já existia (ex.: criado por outra rota) não é reportado como novo.
+    """
+    cursor.execute(
+        'CREATE TEMP TABLE IF NOT EXISTS created_matches '
+        '(id INTEGER PRIMARY KEY, user1_id INTEGER, user2_id INTEGER)'
+    )
+    cursor.execute(
+        '''
+        CREATE TEMP TRIGGER IF NOT EXISTS trg_matches_created
+        AFTER INSERT ON main.matches
+        BEGIN
+            INSERT INTO created_matches (id, user1_id, user2_id)
+            VALUES (NEW.id, NEW.user1_id, NEW.user2_id);
+        END
+        '''
+    )
+    cursor.execute('DELETE FROM created_matches')
+
+
+def _created_matches(cursor, current_user_id):
+    """{outro usuário: match_id} dos matches criados desde _watch_created_matches"""
+    cursor.execute('DELETE FROM created_matches RETURNING id, user1_id, user2_id')
+    match_ids = {}
+    for row in cursor.fetchall():
+        other = row['user2_id'] if row['user1_id'] == current_user_id else row['user1_id']
+        match_ids[other] = row['id']
+    return match_ids
+
+
+def _insert_swipe(cursor, current_user_id, to_user_id, swipe_type):
+    """
+    Operação da fila de escrita: registra o swipe (o like mútuo vira match
+    pelo trigger trg_swipes_match). Retorna o id do match quando o swipe
+    gerou um match, senão None.
+    """
+    _watch_created_matches(cursor)
+    cursor.execute(
+        '''
+        INSERT INTO swipes (from_user_id, to_user_id, swipe_type)
+        VALUES (?, ?, ?)
+        ''',
+        (current_user_id, to_user_id, swipe_type)
+    )
+    return _created_matches(cursor, current_user_id).get(to_user_id)
+
+
 @discover_bp.route('/swipe', methods=['POST'])
 @jwt_required()
 def swipe():
@@ -151,199 +473,181 @@ def swipe():
     }
     """
     current_user_id = int(get_jwt_identity())
-    data = request.get_json()
-    
-    if not all(k in data for k in ['to_user_id', 'swipe_type']):
-        return jsonify({'error': 'to_user_id e swipe_type são obrigatórios'}), 400
-    
-    if data['swipe_type'] not in ['like', 'skip']:
-        return jsonify({'error': 'swipe_type deve ser "like" ou "skip"'}), 400
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
+    parsed, error = _parse_swipe(request.get_json())
+    if error:
+        return jsonify({'error': error}), 400
+    to_user_id, swipe_type = parsed
+    if to_user_id == current_user_id:
+        return jsonify({'error': 'Não é possível avaliar o próprio perfil'}), 400
     
     try:
-        # Registrar swipe
-        cursor.execute(
-            '''
-            INSERT INTO swipes (from_user_id, to_user_id, swipe_type)
-            VALUES (?, ?, ?)
-            ''',
-            (current_user_id, data['to_user_id'], data['swipe_type'])
+        match_id = write_queue.execute(
+            _insert_swipe, current_user_id, to_user_id, swipe_type
         )
-        
-        is_match = False
-        
-        # Se foi "like", verificar se há match
-        if data['swipe_type'] == 'like':
-            cursor.execute(
-                '''
-                SELECT id FROM swipes
-                WHERE from_user_id = ? AND to_user_id = ? AND swipe_type = 'like'
-                ''',
-                (data['to_user_id'], current_user_id)
-            )
-            
-            mutual_like = cursor.fetchone()
-            
-            if mutual_like:
-                # Criar match (garantir ordem consistente dos IDs)
-                user1_id = min(current_user_id, data['to_user_id'])
-                user2_id = max(current_user_id, data['to_user_id'])
-                
-                cursor.execute(
-                    '''
-                    INSERT OR IGNORE INTO matches (user1_id, user2_id)
-                    VALUES (?, ?)
-                    ''',
-                    (user1_id, user2_id)
-                )
-                
-                is_match = True
-        
-        conn.commit()
-        
+
+        # O swipe consumiu um candidato do deck; completar em segundo plano se preciso
+        swipe_cache.add(current_user_id, to_user_id)
+        deck_refiller.schedule(current_user_id)
+        response_cache.invalidate_users(current_user_id, to_user_id)
+
+        if match_id is not None:
+            event_hub.publish(current_user_id, 'match', {
+                'match_id': match_id, 'other_user_id': to_user_id
+            })
+            event_hub.publish(to_user_id, 'match', {
+                'match_id': match_id, 'other_user_id': current_user_id
+            })
+
         return jsonify({
             'message': 'Swipe registrado com sucesso',
-            'match': is_match
+            'match': match_id is not None
         }), 200
-        
+
+    except sqlite3.IntegrityError:
+        # Chave estrangeira (usuário inexistente) ou swipe repetido (UNIQUE)
+        return jsonify({'error': 'Usuário inexistente ou já avaliado'}), 400
+
     except Exception as e:
-        conn.rollback()
         print(f"Erro ao registrar swipe: {e}")
         return jsonify({'error': 'Erro ao registrar swipe'}), 500
-        
-    finally:
-        conn.close()
 
 
 @discover_bp.route('/matches', methods=['GET'])
 @jwt_required()
+@conditional_get('matches', activity=True, cache=True)
 def get_matches():
     """
     Retorna lista de matches do usuário com informações detalhadas
+
+    Query params (opcionais):
+    - limit: matches por página (máximo 100); sem ele, todos os matches
+    - cursor: 'next_cursor' da página anterior
+
+    Os matches vêm do mais recente para o mais antigo, em uma única consulta
+    (conversation_state traz não lidas e a última mensagem).
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_MATCHES_PAGE_SIZE))
+
+    after = None
+    token = request.args.get('cursor')
+    if token:
+        # (matched_at, match_id) do último match entregue
+        after = _decode_cursor('matches', token, current_user_id, (str, int))
+        if after is None:
+            return jsonify({'error': 'Cursor inválido'}), 400
+
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
-        # Buscar informações básicas dos matches
-        query = '''
-            SELECT 
-                m.id as match_id,
-                m.matched_at,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.id
-                    ELSE u1.id
-                END as other_user_id,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.name
-                    ELSE u1.name
-                END as other_user_name,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.photo_url
-                    ELSE u1.photo_url
-                END as other_user_photo,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.user_type
-                    ELSE u1.user_type
-                END as other_user_type,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.bio
-                    ELSE u1.bio
-                END as other_user_bio,
-                CASE 
-                    WHEN m.user1_id = ? THEN u2.location
-                    ELSE u1.location
-                END as other_user_location
-            FROM matches m
-            JOIN users u1 ON m.user1_id = u1.id
-            JOIN users u2 ON m.user2_id = u2.id
-            WHERE m.is_active = 1 
-            AND (m.user1_id = ? OR m.user2_id = ?)
-            ORDER BY m.matched_at DESC
+        # Um lado do OR por vez: user1_id usa idx_matches_users e user2_id, idx_matches_user2
+        after_filter = 'WHERE (matched_at, match_id) < (?, ?)' if after else ''
+        query = f'''
+            WITH mine AS (
+                SELECT id AS match_id, matched_at, user2_id AS other_user_id
+                FROM matches WHERE user1_id = ? AND is_active = 1
+                UNION ALL
+                SELECT id, matched_at, user1_id
+                FROM matches WHERE user2_id = ? AND is_active = 1
+            ),
+            page AS (
+                SELECT * FROM mine
+                {after_filter}
+                ORDER BY matched_at DESC, match_id DESC
+                LIMIT ?
+            ),
+            -- Até 5 tags do outro usuário: habilidades de professores, interesses dos demais
+            tags AS (
+                SELECT user_id, name, level,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id) AS tag_position
+                FROM (
+                    SELECT s.user_id, s.id, s.skill_name AS name, s.skill_level AS level
+                    FROM teacher_skills s
+                    JOIN users u ON u.id = s.user_id AND u.user_type = 'teacher'
+                    WHERE s.user_id IN (SELECT other_user_id FROM page)
+                    UNION ALL
+                    SELECT i.user_id, i.id, i.interest_name, i.desired_level
+                    FROM student_interests i
+                    JOIN users u ON u.id = i.user_id AND u.user_type != 'teacher'
+                    WHERE i.user_id IN (SELECT other_user_id FROM page)
+                )
+            )
+            SELECT
+                p.match_id,
+                p.matched_at,
+                u.id AS other_user_id,
+                u.name AS other_user_name,
+                u.photo_url AS other_user_photo,
+                u.user_type AS other_user_type,
+                u.bio AS other_user_bio,
+                u.location AS other_user_location,
+                COALESCE(cs.unread_count, 0) AS unread_count,
+                last.message_text AS last_message_text,
+                last.sent_at AS last_message_sent_at,
+                last.sender_id AS last_message_sender_id,
+                my_rating.rating AS my_rating,
+                received_rating.rating AS received_rating,
+                (
+                    SELECT json_group_array(json_object('name', t.name, 'level', t.level))
+                    FROM (
+                        SELECT name, level FROM tags
+                        WHERE user_id = p.other_user_id AND tag_position <= 5
+                        ORDER BY tag_position
+                    ) t
+                ) AS tags
+            FROM page p
+            JOIN users u ON u.id = p.other_user_id
+            LEFT JOIN conversation_state cs ON cs.match_id = p.match_id AND cs.user_id = ?
+            LEFT JOIN messages last ON last.id = cs.last_message_id
+            LEFT JOIN ratings my_rating ON my_rating.match_id = p.match_id AND my_rating.rater_id = ?
+            LEFT JOIN ratings received_rating
+                ON received_rating.match_id = p.match_id AND received_rating.rated_id = ?
+            ORDER BY p.matched_at DESC, p.match_id DESC
         '''
-        
-        cursor.execute(query, (
-            current_user_id, current_user_id, current_user_id,
-            current_user_id, current_user_id, current_user_id,
-            current_user_id, current_user_id
-        ))
-        
-        matches = [dict(row) for row in cursor.fetchall()]
-        
-        # Para cada match, buscar tags/habilidades e mensagens não lidas
-        for match in matches:
-            other_user_id = match['other_user_id']
-            other_user_type = match['other_user_type']
-            
-            # Buscar tags do outro usuário
-            if other_user_type == 'teacher':
-                cursor.execute('''
-                    SELECT skill_name, skill_level
-                    FROM teacher_skills
-                    WHERE user_id = ?
-                    LIMIT 5
-                ''', (other_user_id,))
-                match['tags'] = [{'name': row['skill_name'], 'level': row['skill_level']} 
-                               for row in cursor.fetchall()]
-            else:
-                cursor.execute('''
-                    SELECT interest_name, desired_level
-                    FROM student_interests
-                    WHERE user_id = ?
-                    LIMIT 5
-                ''', (other_user_id,))
-                match['tags'] = [{'name': row['interest_name'], 'level': row['desired_level']} 
-                               for row in cursor.fetchall()]
-            
-            # Contar mensagens não lidas
-            # O receiver é o usuário atual, então filtramos por mensagens onde ele NÃO é o sender
-            cursor.execute('''
-                SELECT COUNT(*) as unread_count
-                FROM messages
-                WHERE match_id = ? AND sender_id != ? AND is_read = 0
-            ''', (match['match_id'], current_user_id))
-            
-            unread_row = cursor.fetchone()
-            match['unread_count'] = unread_row['unread_count'] if unread_row else 0
-            
-            # Buscar última mensagem
-            cursor.execute('''
-                SELECT message_text, sent_at, sender_id
-                FROM messages
-                WHERE match_id = ?
-                ORDER BY sent_at DESC
-                LIMIT 1
-            ''', (match['match_id'],))
-            
-            last_msg = cursor.fetchone()
-            if last_msg:
+
+        params = [current_user_id, current_user_id]
+        if after:
+            params.extend(after)
+        # Uma linha a mais indica se há próxima página (LIMIT -1: sem limite)
+        params.append(limit + 1 if limit is not None else -1)
+        params.extend([current_user_id, current_user_id, current_user_id])
+        cursor.execute(query, params)
+
+        rows = cursor.fetchall()
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+
+        matches = []
+        for row in rows:
+            match = {key: row[key] for key in (
+                'match_id', 'matched_at', 'other_user_id', 'other_user_name', 'other_user_photo',
+                'other_user_type', 'other_user_bio', 'other_user_location', 'unread_count',
+                'my_rating', 'received_rating'
+            )}
+            match['tags'] = json.loads(row['tags'])
+            if row['last_message_sender_id'] is not None:
                 match['last_message'] = {
-                    'content': last_msg['message_text'],
-                    'sent_at': last_msg['sent_at'],
-                    'is_mine': last_msg['sender_id'] == current_user_id
+                    'content': row['last_message_text'],
+                    'sent_at': row['last_message_sent_at'],
+                    'is_mine': row['last_message_sender_id'] == current_user_id
                 }
             else:
                 match['last_message'] = None
+            matches.append(match)
 
-            # Avaliações relacionadas ao match
-            cursor.execute(
-                'SELECT rating FROM ratings WHERE match_id = ? AND rater_id = ?',
-                (match['match_id'], current_user_id)
+        next_cursor = None
+        if has_more:
+            next_cursor = _encode_cursor(
+                'matches', current_user_id, matches[-1]['matched_at'], matches[-1]['match_id']
             )
-            my_rating_row = cursor.fetchone()
-            match['my_rating'] = my_rating_row['rating'] if my_rating_row else None
 
-            cursor.execute(
-                'SELECT rating FROM ratings WHERE match_id = ? AND rated_id = ? AND rater_id = ?',
-                (match['match_id'], current_user_id, other_user_id)
-            )
-            received_row = cursor.fetchone()
-            match['received_rating'] = received_row['rating'] if received_row else None
-        
-        return jsonify({'matches': matches}), 200
+        return jsonify({'matches': matches, 'next_cursor': next_cursor, 'has_more': has_more}), 200
         
     except Exception as e:
         import traceback
@@ -357,12 +661,13 @@ def get_matches():
 
 @discover_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@conditional_get('stats', activity=True, cache=True)
 def get_stats():
     """
     Retorna estatísticas do usuário
     """
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
@@ -404,4 +709,130 @@ def get_stats():
         return jsonify({'error': 'Erro ao buscar estatísticas'}), 500
         
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def _insert_swipes(cursor, current_user_id, swipes):
+    """
+    Operação da fila de escrita: registra uma lista de swipes (os matches dos
+    likes mútuos são criados pelo trigger trg_swipes_match).
+
+    Cada item de swipes é (to_user_id, swipe_type). Retorna o status de cada
+    swipe, na ordem ('created', 'duplicate' ou 'invalid') e {to_user_id: match_id}
+    dos matches criados.
+    """
+    target_ids = sorted({to_user_id for to_user_id, _ in swipes})
+
+    cursor.execute(f'SELECT id FROM users WHERE id IN ({placeholders(target_ids)})', target_ids)
+    existing_users = {row['id'] for row in cursor.fetchall()}
+    cursor.execute(
+        f'''
+        SELECT to_user_id FROM swipes
+        WHERE from_user_id = ? AND to_user_id IN ({placeholders(target_ids)})
+        ''',
+        [current_user_id] + target_ids
+    )
+    already_swiped = {row['to_user_id'] for row in cursor.fetchall()}
+
+    # Na ordem recebida: o primeiro swipe para cada usuário vale, os repetidos são ignorados
+    statuses = []
+    new_swipes = []
+    for to_user_id, swipe_type in swipes:
+        if to_user_id == current_user_id or to_user_id not in existing_users:
+            statuses.append('invalid')
+        elif to_user_id in already_swiped:
+            statuses.append('duplicate')
+        else:
+            already_swiped.add(to_user_id)
+            new_swipes.append((current_user_id, to_user_id, swipe_type))
+            statuses.append('created')
+
+    _watch_created_matches(cursor)
+    cursor.executemany(
+        'INSERT INTO swipes (from_user_id, to_user_id, swipe_type) VALUES (?, ?, ?)',
+        new_swipes
+    )
+
+    # Os matches dos likes mútuos foram criados pelo trigger durante o executemany
+    return statuses, _created_matches(cursor, current_user_id)
+
+
+@discover_bp.route('/swipe/batch', methods=['POST'])
+@jwt_required()
+def swipe_batch():
+    """
+    Registra vários swipes em uma transação (fila offline ou swipes rápidos)
+    
+    Body esperado:
+    {
+        "swipes": [
+            {"to_user_id": 123, "swipe_type": "like"},
+            {"to_user_id": 456, "swipe_type": "skip"}
+        ]
+    }
+    
+    Retorna o resultado de cada swipe, na mesma ordem:
+    {
+        "results": [
+            {"to_user_id": 123, "swipe_type": "like", "status": "created", "match": true, "match_id": 7},
+            ...
+        ],
+        "match_ids": [7]
+    }
+
+    status: 'created', 'duplicate' (já havia swipe para o usuário) ou
+    'invalid' (usuário inexistente ou o próprio usuário).
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    items = data.get('swipes') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'swipes deve ser uma lista não vazia'}), 400
+    if len(items) > MAX_BATCH_SWIPES:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_SWIPES} swipes por requisição'}), 400
+
+    swipes = []
+    for index, item in enumerate(items):
+        parsed, error = _parse_swipe(item)
+        if error:
+            return jsonify({'error': f'swipes[{index}]: {error}'}), 400
+        swipes.append(parsed)
+
+    try:
+        statuses, match_ids = write_queue.execute(_insert_swipes, current_user_id, swipes)
+
+        results = []
+        for (to_user_id, swipe_type), status in zip(swipes, statuses):
+            match_id = match_ids.get(to_user_id) if status == 'created' else None
+            results.append({
+                'to_user_id': to_user_id,
+                'swipe_type': swipe_type,
+                'status': status,
+                'match': match_id is not None,
+                'match_id': match_id
+            })
+            if status == 'created':
+                swipe_cache.add(current_user_id, to_user_id)
+
+        deck_refiller.schedule(current_user_id)
+        response_cache.invalidate_users(
+            current_user_id, *[r['to_user_id'] for r in results if r['status'] == 'created']
+        )
+
+        for other_user_id, match_id in match_ids.items():
+            event_hub.publish(current_user_id, 'match', {
+                'match_id': match_id, 'other_user_id': other_user_id
+            })
+            event_hub.publish(other_user_id, 'match', {
+                'match_id': match_id, 'other_user_id': current_user_id
+            })
+
+        return jsonify({
+            'results': results,
+            'match_ids': sorted(match_ids.values())
+        }), 200
+
+    except Exception as e:
+        print(f"Erro ao registrar swipes em lote: {e}")
+        return jsonify({'error': 'Erro ao registrar swipes'}), 500
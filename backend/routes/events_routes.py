@@ -0,0 +1,121 @@
+"""
+Rotas de Eventos em Tempo Real - Server-Sent Events
+Salvar como: backend/routes/events_routes.py
+"""
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.events import event_hub
+
+events_bp = Blueprint('events', __name__)
+
+# Comentário enviado quando não há eventos, para manter a conexão (e proxies) vivos
+HEARTBEAT_INTERVAL_S = 15
+
+# Sugestão de espera para o EventSource reconectar após queda
+RETRY_MS = 3000
+
+# Validade do token do stream: só precisa durar até o EventSource conectar
+STREAM_TOKEN_MAX_AGE_S = 60
+STREAM_TOKEN_SALT = 'events-stream'
+
+
+def format_sse(event_type, data, event_id=None):
+    """Serializa um evento no formato text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _stream_serializer():
+    # Assinado com SECRET_KEY (não é um JWT): não serve em nenhuma outra rota
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=STREAM_TOKEN_SALT)
+
+
+def user_from_stream_token(token):
+    """id do usuário de um token de POST /api/events/token, ou None se inválido/expirado"""
+    if not token:
+        return None
+    try:
+        return _stream_serializer().loads(token, max_age=STREAM_TOKEN_MAX_AGE_S)
+    except BadSignature:
+        return None
+
+
+@events_bp.route('/token', methods=['POST'])
+@jwt_required()
+def stream_token():
+    """
+    Token de curta duração para abrir /api/events/stream ou /api/chat/ws
+
+    O EventSource e o WebSocket do navegador não enviam headers, então essas
+    conexões recebem o token na query string. Para o JWT de login não ir
+    parar em logs de acesso, de proxy ou no histórico, o cliente troca o JWT
+    (no header) por este token, que só abre essas conexões e expira em
+    STREAM_TOKEN_MAX_AGE_S.
+    """
+    current_user_id = int(get_jwt_identity())
+    return jsonify({
+        'token': _stream_serializer().dumps(current_user_id),
+        'expires_in': STREAM_TOKEN_MAX_AGE_S
+    }), 200
+
+
+@events_bp.route('/stream', methods=['GET'])
+def stream():
+    """
+    Stream SSE com os eventos do usuário autenticado
+
+    Autenticação: /api/events/stream?token=<token de POST /api/events/token>.
+    A validade só é conferida ao conectar; ao reconectar depois de expirado,
+    o cliente pede um token novo.
+
+    Eventos:
+    - message: nova mensagem em um match {match_id, message_id, sender_id, message_text}
+    - match: novo match {match_id, other_user_id}
+    - unread: total de mensagens não lidas mudou {unread_count}
+    - rating: o usuário recebeu/teve atualizada uma avaliação {match_id, rating}
+    - resync: eventos foram descartados, o cliente deve recarregar os dados
+    """
+    current_user_id = user_from_stream_token(request.args.get('token'))
+    if current_user_id is None:
+        return jsonify({'error': 'Token do stream inválido ou expirado'}), 401
+
+    def generate():
+        # Inscrição só quando o corpo começa a ser enviado: uma resposta que
+        # nunca é iterada (cliente caiu antes, middleware descartou) não
+        # deixa inscrição acumulando eventos, porque o finally só roda aqui
+        subscription = event_hub.subscribe(current_user_id)
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            yield format_sse('ready', {'user_id': current_user_id})
+            while True:
+                event = subscription.get(timeout=HEARTBEAT_INTERVAL_S)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield format_sse('resync', {})
+                if event is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield format_sse(event['type'], event['data'], event['id'])
+        finally:
+            # Cliente desconectou (GeneratorExit) ou o servidor está encerrando
+            event_hub.unsubscribe(subscription)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -9,7 +9,12 @@ import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from backend.database import get_db_connection
+from backend.conditional import conditional_get
+from backend.database import get_read_connection, get_write_connection
+from backend.loaders import BatchLoader
+from backend.response_cache import response_cache
+from backend.tag_index import tag_index
+from backend.tags import tag_id_for
 
 profile_bp = Blueprint('profile', __name__)
 
@@ -75,7 +80,7 @@ def complete_profile():
     if data['user_type'] not in ['student', 'teacher']:
         return jsonify({'error': 'Tipo deve ser "student" ou "teacher"'}), 400
     
-    conn = get_db_connection()
+    conn = get_write_connection()
     cursor = conn.cursor()
     
     try:
@@ -128,15 +133,16 @@ def complete_profile():
 
                 cursor.execute(
                     '''
-                    INSERT INTO teacher_skills (user_id, skill_name, skill_description, skill_level, requires_evaluation)
-                    VALUES (?, ?, ?, ?, ?)
+                    INSERT INTO teacher_skills (user_id, skill_name, skill_description, skill_level, requires_evaluation, tag_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
                     ''',
                     (
                         current_user_id,
                         skill['name'],
                         skill.get('description', ''),
                         skill.get('level'),
-                        1 if skill.get('requires_evaluation') else 0
+                        1 if skill.get('requires_evaluation') else 0,
+                        tag_id_for(cursor, skill['name'])
                     )
                 )
                 print(f"✅ Habilidade adicionada: {skill['name']}")
@@ -153,8 +159,8 @@ def complete_profile():
                 cursor.execute(
                     '''
                     INSERT INTO student_interests 
-                    (user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation) 
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation, tag_id) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                     ''',
                     (
                         current_user_id,
@@ -162,12 +168,15 @@ def complete_profile():
                         interest.get('difficulty', 'beginner'),
                         interest.get('description', ''),
                         interest.get('desired_level'),
-                        1 if interest.get('requires_evaluation') else 0
+                        1 if interest.get('requires_evaluation') else 0,
+                        tag_id_for(cursor, interest['name'])
                     )
                 )
                 print(f"✅ Interesse adicionado: {interest['name']}")
         
         conn.commit()
+        tag_index.reload_user(cursor, current_user_id)
+        response_cache.invalidate_users(current_user_id)
         print("✅ Perfil completado com sucesso!")
         
         return jsonify({
@@ -186,10 +195,11 @@ def complete_profile():
 
 @profile_bp.route('/me', methods=['GET'])
 @jwt_required()
+@conditional_get('profile_me', profile_of='self', cache=True)
 def get_my_profile():
     """Retorna o perfil completo do usuário autenticado"""
     current_user_id = int(get_jwt_identity())
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
@@ -208,21 +218,15 @@ def get_my_profile():
         
         profile = dict(user)
         
+        loader = BatchLoader(cursor)
+
         # Se for professor, buscar habilidades
         if profile['user_type'] == 'teacher':
-            cursor.execute(
-                'SELECT skill_name, skill_description, skill_level, requires_evaluation FROM teacher_skills WHERE user_id = ?',
-                (current_user_id,)
-            )
-            profile['skills'] = [dict(s) for s in cursor.fetchall()]
+            profile['skills'] = loader.skills([current_user_id])[current_user_id]
         
         # Se for aluno, buscar interesses
         elif profile['user_type'] == 'student':
-            cursor.execute(
-                'SELECT interest_name, difficulty_level, description, desired_level, requires_evaluation FROM student_interests WHERE user_id = ?',
-                (current_user_id,)
-            )
-            profile['interests'] = [dict(i) for i in cursor.fetchall()]
+            profile['interests'] = loader.interests([current_user_id])[current_user_id]
         
         return jsonify(profile), 200
         
@@ -241,7 +245,7 @@ def update_profile():
     current_user_id = int(get_jwt_identity())
     data = request.get_json()
     
-    conn = get_db_connection()
+    conn = get_write_connection()
     cursor = conn.cursor()
     
     try:
@@ -301,14 +305,15 @@ def update_profile():
                 if not skill.get('name'):
                     continue
                 cursor.execute(
-                    '''INSERT INTO teacher_skills (user_id, skill_name, skill_description, skill_level, requires_evaluation)
-                       VALUES (?, ?, ?, ?, ?)''',
+                    '''INSERT INTO teacher_skills (user_id, skill_name, skill_description, skill_level, requires_evaluation, tag_id)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
                     (
                         current_user_id,
                         skill['name'],
                         skill.get('description', ''),
                         skill.get('level'),
-                        1 if skill.get('requires_evaluation') else 0
+                        1 if skill.get('requires_evaluation') else 0,
+                        tag_id_for(cursor, skill['name'])
                     )
                 )
                 print(f"  ✅ Skill adicionada: {skill['name']}")
@@ -324,20 +329,24 @@ def update_profile():
                 if not interest.get('name'):
                     continue
                 cursor.execute(
-                    '''INSERT INTO student_interests (user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation)
-                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    '''INSERT INTO student_interests (user_id, interest_name, difficulty_level, description, desired_level, requires_evaluation, tag_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
                     (
                         current_user_id,
                         interest['name'],
                         interest.get('difficulty', 'beginner'),
                         interest.get('description', ''),
                         interest.get('desired_level'),
-                        1 if interest.get('requires_evaluation') else 0
+                        1 if interest.get('requires_evaluation') else 0,
+                        tag_id_for(cursor, interest['name'])
                     )
                 )
                 print(f"  ✅ Interest adicionado: {interest['name']}")
         
         conn.commit()
+        if 'skills' in data or 'interests' in data:
+            tag_index.reload_user(cursor, current_user_id)
+        response_cache.invalidate_users(current_user_id)
         
         return jsonify({'message': 'Perfil atualizado com sucesso'}), 200
         
@@ -354,9 +363,10 @@ def update_profile():
 
 @profile_bp.route('/<int:user_id>', methods=['GET'])
 @jwt_required()
+@conditional_get('profile', profile_of='user_id', cache=True)
 def get_user_profile(user_id):
     """Retorna o perfil público de outro usuário"""
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     try:
@@ -376,33 +386,19 @@ def get_user_profile(user_id):
         
         profile = dict(user)
         
+        loader = BatchLoader(cursor)
+
         # Buscar habilidades/interesses conforme tipo
         if profile['user_type'] == 'teacher':
-            cursor.execute(
-                'SELECT skill_name, skill_description, skill_level, requires_evaluation FROM teacher_skills WHERE user_id = ?',
-                (user_id,)
-            )
-            profile['skills'] = [dict(s) for s in cursor.fetchall()]
+            profile['skills'] = loader.skills([user_id])[user_id]
         elif profile['user_type'] == 'student':
-            cursor.execute(
-                'SELECT interest_name, difficulty_level, description, desired_level, requires_evaluation FROM student_interests WHERE user_id = ?',
-                (user_id,)
-            )
-            profile['interests'] = [dict(i) for i in cursor.fetchall()]
+            profile['interests'] = loader.interests([user_id])[user_id]
         
         # Buscar média de avaliações
-        cursor.execute(
-            '''
-            SELECT AVG(rating) as avg_rating, COUNT(*) as total_ratings
-            FROM ratings
-            WHERE rated_id = ?
-            ''',
-            (user_id,)
-        )
-        rating_data = cursor.fetchone()
-        if rating_data and rating_data['avg_rating']:
-            profile['avg_rating'] = round(rating_data['avg_rating'], 1)
-            profile['total_ratings'] = rating_data['total_ratings']
+        rating_data = loader.rating_summaries([user_id])[user_id]
+        if rating_data['average']:
+            profile['avg_rating'] = round(rating_data['average'], 1)
+            profile['total_ratings'] = rating_data['count']
         else:
             profile['avg_rating'] = None
             profile['total_ratings'] = 0
@@ -10,7 +10,10 @@ import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from backend.database import get_db_connection
+from backend.database import get_read_connection, get_write_connection
+from backend.events import event_hub
+from backend.loaders import BatchLoader
+from backend.response_cache import response_cache
 
 ratings_bp = Blueprint('ratings', __name__)
 
@@ -60,7 +63,7 @@ def submit_rating():
     if rating < 1 or rating > 5:
         return jsonify({'error': 'rating deve estar entre 1 e 5'}), 400
 
-    conn = get_db_connection()
+    conn = get_write_connection()
     cursor = conn.cursor()
 
     try:
@@ -89,6 +92,9 @@ def submit_rating():
         )
 
         conn.commit()
+        response_cache.invalidate_users(current_user_id, rated_id)
+
+        event_hub.publish(rated_id, 'rating', {'match_id': match_id, 'rating': rating})
 
         return jsonify({
             'message': 'Avaliação registrada com sucesso',
@@ -112,7 +118,7 @@ def get_match_rating(match_id):
     """Retorna a avaliação feita e recebida pelo usuário em um match"""
     current_user_id = int(get_jwt_identity())
 
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
 
     try:
@@ -134,25 +140,10 @@ def get_match_rating(match_id):
         )
         other_user = cursor.fetchone()
 
-        cursor.execute(
-            '''
-            SELECT rating, comment, created_at
-            FROM ratings
-            WHERE match_id = ? AND rater_id = ? AND rated_id = ?
-            ''',
-            (match_id, current_user_id, other_user_id)
-        )
-        your_rating = _format_rating_row(cursor.fetchone())
-
-        cursor.execute(
-            '''
-            SELECT rating, comment, created_at
-            FROM ratings
-            WHERE match_id = ? AND rated_id = ? AND rater_id = ?
-            ''',
-            (match_id, current_user_id, other_user_id)
-        )
-        received_rating = _format_rating_row(cursor.fetchone())
+        # Avaliação feita e recebida em uma única consulta
+        match_ratings = BatchLoader(cursor).match_ratings([match_id], current_user_id)[match_id]
+        your_rating = _format_rating_row(match_ratings['mine'])
+        received_rating = _format_rating_row(match_ratings['received'])
 
         return jsonify({
             'match_id': match_id,
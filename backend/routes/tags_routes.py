@@ -0,0 +1,38 @@
+"""
+Rotas de Tags - Autocompletar
+Salvar como: backend/routes/tags_routes.py
+"""
+
+from flask import Blueprint, request, jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.tag_index import normalize_tag, tag_index
+
+tags_bp = Blueprint('tags', __name__)
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+
+
+@tags_bp.route('/suggest', methods=['GET'])
+def suggest_tags():
+    """
+    Sugere tags já existentes para o que o usuário está digitando
+
+    Público (usado também no cadastro, antes do login). Responde a partir do
+    índice de tags em memória (backend/tag_index.py), sem consultar o banco.
+
+    Query params:
+    - prefix: início do nome da tag (acentos e maiúsculas são ignorados)
+    - limit: máximo de sugestões (padrão 8, máximo 20)
+    """
+    prefix = request.args.get('prefix', '')
+    if not normalize_tag(prefix):
+        return jsonify({'error': 'Informe o início do nome da tag (prefix)'}), 400
+
+    limit = request.args.get('limit', DEFAULT_SUGGESTIONS, type=int)
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+    return jsonify({'suggestions': tag_index.suggest(prefix, limit)}), 200
@@ -0,0 +1,86 @@
+"""
+Cache LRU dos Perfis já Avaliados por Usuário
+Salvar como: backend/swipe_cache.py
+
+Para cada usuário ativo guarda um RoaringBitmap com os to_user_id dos
+seus swipes, carregado do banco no primeiro acesso e atualizado pela
+rota de swipe. O motor de descoberta filtra candidatos com
+"candidate_id in swiped" em memória, sem NOT IN/NOT EXISTS sobre swipes.
+
+Cada processo tem a sua cópia. Um bitmap desatualizado (swipe feito em
+outro worker) não chega a colocar o perfil no deck: a gravação do deck
+confere swipes no banco.
+"""
+
+import threading
+from collections import OrderedDict
+
+import backend.database as database
+from backend.bitmap import RoaringBitmap
+
+# Usuários mantidos em memória; os menos usados recentemente saem primeiro
+MAX_CACHED_USERS = 10000
+
+
+class SwipeCache:
+    """user_id -> RoaringBitmap dos ids que o usuário já avaliou"""
+
+    def __init__(self, max_users=MAX_CACHED_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._path = None
+        self._bitmaps = OrderedDict()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def _check_database(self):
+        # Banco trocado (ex.: testes): nada do cache vale mais
+        if self._path != database.DATABASE_PATH:
+            self._bitmaps.clear()
+            self._path = database.DATABASE_PATH
+
+    def get(self, cursor, user_id):
+        """Bitmap dos perfis já avaliados pelo usuário (carrega do banco se preciso)"""
+        with self._lock:
+            self._check_database()
+            bitmap = self._bitmaps.get(user_id)
+            if bitmap is not None:
+                self._bitmaps.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return bitmap
+
+            # Carregado com o lock: um add() concorrente espera e é aplicado depois
+            self._stats['misses'] += 1
+            cursor.execute('SELECT to_user_id FROM swipes WHERE from_user_id = ?', (user_id,))
+            bitmap = RoaringBitmap(row[0] for row in cursor.fetchall())
+            self._bitmaps[user_id] = bitmap
+            if len(self._bitmaps) > self.max_users:
+                self._bitmaps.popitem(last=False)
+                self._stats['evictions'] += 1
+            return bitmap
+
+    def add(self, user_id, to_user_id):
+        """Registra um swipe já gravado; usuários fora do cache são carregados depois"""
+        with self._lock:
+            self._check_database()
+            bitmap = self._bitmaps.get(user_id)
+            if bitmap is not None:
+                bitmap.add(to_user_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_users'] = len(self._bitmaps)
+            stats['bytes'] = sum(bitmap.size_in_bytes() for bitmap in self._bitmaps.values())
+        return stats
+
+
+swipe_cache = SwipeCache()
+
+
+def get_swipe_cache_stats():
+    """Métricas do cache de swipes"""
+    return swipe_cache.stats()
@@ -0,0 +1,243 @@
+"""
+Índice Invertido de Tags em Memória
+Salvar como: backend/tag_index.py
+
+tag_id -> lista ordenada (array de inteiros) dos usuários que a têm,
+separada por tipo: habilidades dos professores e interesses dos alunos.
+Pontuar um usuário contra toda a população do tipo oposto é percorrer as
+listas das tags dele, sem ler teacher_skills/student_interests nem
+comparar strings candidato a candidato. Os ids vêm do dicionário de tags
+(backend/tags.py); linhas ainda sem tag_id ficam fora do índice.
+
+O índice é carregado do banco no primeiro uso e atualizado pelas rotas
+que gravam tags (register, complete_profile, update_profile). Cada
+processo tem a sua cópia: em deploy com vários workers, escritas feitas
+por outro worker só aparecem aqui após reload().
+
+O mesmo índice atende o autocompletar de tags (suggest): um array
+ordenado de nomes (formas canônicas e apelidos), buscado por bisect, e o
+uso de cada tag é o tamanho das suas listas invertidas, sem consultar o banco.
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+import backend.database as database
+from backend.tags import normalize_tag  # noqa: F401 (reexportado)
+
+# Tabela de tags de cada tipo de usuário
+TAG_SOURCES = {
+    'teacher': 'teacher_skills',
+    'student': 'student_interests'
+}
+
+
+class TagIndex:
+    """Listas invertidas tag_id -> ids, por tipo de usuário"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._path = None
+        self._postings = {'teacher': {}, 'student': {}}
+        # user_id -> (user_type, array ordenado de tag_ids); permite remover as entradas antigas
+        self._user_tags = {}
+        # Forma canônica <-> tag_id (inclui os apelidos), para consultas por nome
+        self._tag_ids = {}
+        self._tag_names = {}
+        # Grafia exibida de cada tag e (nome, tag_id) ordenados para o autocompletar
+        self._display_names = {}
+        self._sorted_names = []
+        self._loaded_at = None
+        self._load_ms = 0.0
+
+    def ensure_loaded(self):
+        # Recarrega também quando o caminho do banco muda (ex.: testes)
+        if self._path == database.DATABASE_PATH:
+            return
+        conn = database.get_read_connection()
+        try:
+            self.reload(conn.cursor())
+        finally:
+            conn.close()
+
+    def reload(self, cursor):
+        """Reconstrói o índice inteiro a partir das tabelas de tags"""
+        started = time.perf_counter()
+        cursor.execute('SELECT id, canonical, display_name FROM tags')
+        rows = cursor.fetchall()
+        tag_names = {row[0]: row[1] for row in rows}
+        display_names = {row[0]: row[2] for row in rows}
+        tag_ids = {name: tag_id for tag_id, name in tag_names.items()}
+        cursor.execute('SELECT alias, tag_id FROM tag_aliases')
+        tag_ids.update((row[0], row[1]) for row in cursor.fetchall())
+
+        tags_by_user = {}
+        for user_type, table in TAG_SOURCES.items():
+            cursor.execute(
+                f'''
+                SELECT t.user_id, t.tag_id
+                FROM {table} t
+                JOIN users u ON u.id = t.user_id
+                WHERE u.user_type = ? AND t.tag_id IS NOT NULL
+                ''',
+                (user_type,)
+            )
+            for user_id, tag_id in cursor.fetchall():
+                tags_by_user.setdefault(user_id, (user_type, set()))[1].add(tag_id)
+
+        postings = {'teacher': {}, 'student': {}}
+        for user_id in sorted(tags_by_user):
+            user_type, tags = tags_by_user[user_id]
+            for tag_id in tags:
+                postings[user_type].setdefault(tag_id, array('l')).append(user_id)
+
+        with self._lock:
+            self._postings = postings
+            self._user_tags = {
+                user_id: (user_type, array('l', sorted(tags)))
+                for user_id, (user_type, tags) in tags_by_user.items()
+            }
+            self._tag_ids = tag_ids
+            self._tag_names = tag_names
+            self._display_names = display_names
+            self._sorted_names = sorted(tag_ids.items())
+            self._path = database.DATABASE_PATH
+            self._loaded_at = time.time()
+            self._load_ms = (time.perf_counter() - started) * 1000
+
+    def reload_user(self, cursor, user_id):
+        """Relê o tipo e as tags de um usuário (chamar após o commit da rota)"""
+        with self._lock:
+            self.ensure_loaded()
+            cursor.execute('SELECT user_type FROM users WHERE id = ?', (user_id,))
+            user = cursor.fetchone()
+            tags = set()
+            user_type = user['user_type'] if user else None
+            if user_type in TAG_SOURCES:
+                cursor.execute(
+                    f'''
+                    SELECT g.id, g.canonical, g.display_name
+                    FROM {TAG_SOURCES[user_type]} t
+                    JOIN tags g ON g.id = t.tag_id
+                    WHERE t.user_id = ?
+                    ''',
+                    (user_id,)
+                )
+                for tag_id, canonical, display_name in cursor.fetchall():
+                    if tag_id not in self._tag_names:
+                        # Tag criada agora por esta gravação
+                        self._tag_names[tag_id] = canonical
+                        self._display_names[tag_id] = display_name
+                        if canonical not in self._tag_ids:
+                            self._tag_ids[canonical] = tag_id
+                            insort(self._sorted_names, (canonical, tag_id))
+                    tags.add(tag_id)
+            self._set_user_tags(user_id, user_type, tags)
+
+    def _set_user_tags(self, user_id, user_type, tags):
+        previous_type, previous_tags = self._user_tags.pop(user_id, (None, ()))
+        for tag in previous_tags:
+            ids = self._postings[previous_type].get(tag)
+            if ids is None:
+                continue
+            position = bisect_left(ids, user_id)
+            if position < len(ids) and ids[position] == user_id:
+                del ids[position]
+            if not ids:
+                del self._postings[previous_type][tag]
+
+        if not tags or user_type not in self._postings:
+            return
+        for tag in tags:
+            insort(self._postings[user_type].setdefault(tag, array('l')), user_id)
+        self._user_tags[user_id] = (user_type, array('l', sorted(tags)))
+
+    def tags_of(self, user_id):
+        """Formas canônicas das tags do usuário"""
+        with self._lock:
+            self.ensure_loaded()
+            tags = self._user_tags.get(user_id, (None, ()))[1]
+            return frozenset(self._tag_names[tag_id] for tag_id in tags)
+
+    def users_with(self, tag, user_type):
+        """Ids (ordenados) dos usuários do tipo com a tag (nome ou apelido)"""
+        with self._lock:
+            self.ensure_loaded()
+            tag_id = self._tag_ids.get(normalize_tag(tag))
+            return list(self._postings[user_type].get(tag_id, ()))
+
+    def score(self, user_id, candidate_type):
+        """
+        Tags em comum entre o usuário e cada candidato do tipo informado.
+        Retorna {candidate_id: quantidade}; quem não tem nenhuma tag em comum fica de fora.
+        """
+        with self._lock:
+            self.ensure_loaded()
+            tags = self._user_tags.get(user_id, (None, ()))[1]
+            postings = self._postings[candidate_type]
+            scores = Counter()
+            for tag in tags:
+                scores.update(postings.get(tag, ()))
+        return scores
+
+    def _usage(self, tag_id):
+        return {user_type: len(postings.get(tag_id, ())) for user_type, postings in self._postings.items()}
+
+    def suggest(self, prefix, limit):
+        """
+        Até limit tags cujo nome (ou apelido) começa com o prefixo, das mais
+        usadas para as menos usadas: [{tag_id, name, teachers, students, usage}]
+        """
+        prefix = normalize_tag(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            self.ensure_loaded()
+            names = self._sorted_names
+            best = {}
+            position = bisect_left(names, (prefix,))
+            while position < len(names) and names[position][0].startswith(prefix):
+                tag_id = names[position][1]
+                if tag_id not in best:
+                    usage = self._usage(tag_id)
+                    best[tag_id] = (sum(usage.values()), usage)
+                position += 1
+
+            top = heapq.nsmallest(
+                limit, best.items(),
+                key=lambda item: (-item[1][0], self._tag_names[item[0]])
+            )
+            return [
+                {
+                    'tag_id': tag_id,
+                    'name': self._display_names.get(tag_id) or self._tag_names[tag_id],
+                    'teachers': usage['teacher'],
+                    'students': usage['student'],
+                    'usage': total
+                }
+                for tag_id, (total, usage) in top
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._path is not None,
+                'users': len(self._user_tags),
+                'tags': {user_type: len(p) for user_type, p in self._postings.items()},
+                'dictionary': len(self._tag_names),
+                'postings': sum(len(ids) for p in self._postings.values() for ids in p.values()),
+                'loaded_at': self._loaded_at,
+                'load_ms': round(self._load_ms, 3)
+            }
+
+
+tag_index = TagIndex()
+
+
+def get_tag_index_stats():
+    """Métricas do índice de tags"""
+    return tag_index.stats()
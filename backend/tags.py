@@ -0,0 +1,75 @@
+"""
+Dicionário de Tags (forma canônica e ids inteiros)
+Salvar como: backend/tags.py
+
+teacher_skills.skill_name e student_interests.interest_name continuam
+guardando o texto digitado ("Python", "python ", "Violão"); a coluna
+tag_id aponta para a tabela tags, com uma linha por forma canônica
+(sem acentos, sem diferenciar maiúsculas, espaços normalizados).
+tag_aliases leva formas alternativas ("js") para a tag principal
+("javascript"; os apelidos iniciais são criados pela migração 9). A
+comparação de tags vira comparação de inteiros.
+
+tag_id é preenchido na gravação (register, complete_profile,
+update_profile) e, para as linhas antigas, pela migração 9 ou por
+    flask --app backend.app backfill-tag-ids
+"""
+
+import unicodedata
+
+# Tabela e coluna com o texto de cada tabela de tags
+TAG_TABLES = (
+    ('teacher_skills', 'skill_name'),
+    ('student_interests', 'interest_name')
+)
+
+
+def normalize_tag(name):
+    """Forma canônica: sem acentos, sem espaços extras e sem diferenciar maiúsculas"""
+    decomposed = unicodedata.normalize('NFKD', str(name))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.split()).casefold()
+
+
+def tag_id_for(cursor, name):
+    """Id da tag (criando-a se preciso), ou None para nomes vazios"""
+    canonical = normalize_tag(name)
+    if not canonical:
+        return None
+
+    cursor.execute(
+        '''
+        SELECT tag_id FROM tag_aliases WHERE alias = ?
+        UNION ALL
+        SELECT id FROM tags WHERE canonical = ?
+        LIMIT 1
+        ''',
+        (canonical, canonical)
+    )
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+
+    cursor.execute(
+        'INSERT INTO tags (canonical, display_name) VALUES (?, ?)',
+        (canonical, ' '.join(str(name).split()))
+    )
+    return cursor.lastrowid
+
+
+def backfill_tag_ids(cursor):
+    """Preenche tag_id das linhas que ainda não têm. Retorna quantas foram atualizadas"""
+    updated = 0
+    for table, column in TAG_TABLES:
+        cursor.execute(f'SELECT id, {column} FROM {table} WHERE tag_id IS NULL')
+        rows = cursor.fetchall()
+        ids_by_name = {}
+        params = []
+        for row_id, name in rows:
+            if name not in ids_by_name:
+                ids_by_name[name] = tag_id_for(cursor, name)
+            if ids_by_name[name] is not None:
+                params.append((ids_by_name[name], row_id))
+        cursor.executemany(f'UPDATE {table} SET tag_id = ? WHERE id = ?', params)
+        updated += len(params)
+    return updated
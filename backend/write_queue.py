@@ -0,0 +1,193 @@
+"""
+Fila de Escrita com Commit em Grupo
+Salvar como: backend/write_queue.py
+
+Swipes e mensagens chegam em rajadas. Em vez de cada requisição abrir
+sua própria transação (um commit por swipe), as operações são enfileiradas
+e uma thread escritora aplica várias delas em uma única transação.
+Cada chamador continua recebendo o seu próprio resultado (ex.: message_id).
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from backend.database import get_write_connection
+
+# Janela de agrupamento e tamanho máximo do lote
+MAX_BATCH_SIZE = 128
+MAX_BATCH_DELAY_MS = 2
+
+# Reenvio do lote inteiro quando o SQLite responde SQLITE_BUSY/LOCKED
+MAX_RETRIES = 5
+RETRY_BACKOFF_MS = 10
+
+# Tempo máximo que uma requisição espera pelo resultado da sua escrita
+RESULT_TIMEOUT_S = 10
+
+
+def _is_busy_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class WriteQueue:
+    """
+    Agrupa operações de escrita em transações compartilhadas.
+
+    Uma operação é uma função operation(cursor, *args) que executa seus
+    INSERT/UPDATE no cursor recebido e retorna o resultado para o chamador.
+    Ela não deve chamar commit(): cada item roda dentro de um SAVEPOINT,
+    então a falha de um item desfaz só aquele item e o restante do lote
+    segue para o commit.
+    """
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_batch_delay_ms=MAX_BATCH_DELAY_MS,
+                 max_retries=MAX_RETRIES, retry_backoff_ms=RETRY_BACKOFF_MS):
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay_ms / 1000
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'items': 0,
+            'failed_items': 0,
+            'busy_retries': 0,
+            'batch_size_max': 0,
+            'queue_latency_ms_total': 0.0,
+            'queue_latency_ms_max': 0.0
+        }
+
+    def submit(self, operation, *args):
+        """Enfileira uma operação e retorna um Future com o seu resultado"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((operation, args, future, time.perf_counter()))
+        return future
+
+    def execute(self, operation, *args):
+        """Enfileira uma operação e aguarda o resultado (ou a exceção) dela"""
+        return self.submit(operation, *args).result(timeout=RESULT_TIMEOUT_S)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        items = stats['items']
+        stats['pending'] = self._queue.qsize()
+        stats['batch_size_avg'] = round(items / batches, 2) if batches else 0
+        stats['queue_latency_ms_avg'] = round(stats['queue_latency_ms_total'] / items, 3) if items else 0
+        stats['queue_latency_ms_total'] = round(stats['queue_latency_ms_total'], 3)
+        stats['queue_latency_ms_max'] = round(stats['queue_latency_ms_max'], 3)
+        return stats
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_batch_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        results = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                results = self._apply(batch)
+                break
+            except sqlite3.OperationalError as exc:
+                error = exc
+                if not _is_busy_error(exc) or attempt == self.max_retries:
+                    break
+                with self._stats_lock:
+                    self._stats['busy_retries'] += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+            except Exception as exc:
+                error = exc
+                break
+
+        if results is None:
+            print(f"❌ Erro ao gravar lote da fila de escrita: {error}")
+            results = [(False, error)] * len(batch)
+
+        committed_at = time.perf_counter()
+        failed = 0
+        latency_total = 0.0
+        latency_max = 0.0
+        for (operation, args, future, enqueued_at), (ok, value) in zip(batch, results):
+            latency = (committed_at - enqueued_at) * 1000
+            latency_total += latency
+            latency_max = max(latency_max, latency)
+            if ok:
+                future.set_result(value)
+            else:
+                failed += 1
+                future.set_exception(value)
+
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['items'] += len(batch)
+            self._stats['failed_items'] += failed
+            self._stats['batch_size_max'] = max(self._stats['batch_size_max'], len(batch))
+            self._stats['queue_latency_ms_total'] += latency_total
+            self._stats['queue_latency_ms_max'] = max(self._stats['queue_latency_ms_max'], latency_max)
+
+    def _apply(self, batch):
+        conn = get_write_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            results = []
+            for operation, args, future, enqueued_at in batch:
+                cursor.execute('SAVEPOINT write_item')
+                try:
+                    value = operation(cursor, *args)
+                except sqlite3.OperationalError as exc:
+                    if _is_busy_error(exc):
+                        raise
+                    cursor.execute('ROLLBACK TO write_item')
+                    results.append((False, exc))
+                except Exception as exc:
+                    cursor.execute('ROLLBACK TO write_item')
+                    results.append((False, exc))
+                else:
+                    results.append((True, value))
+                cursor.execute('RELEASE write_item')
+            conn.commit()
+            return results
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+write_queue = WriteQueue()
+
+
+def get_write_queue_stats():
+    """Métricas da fila de escrita (tamanho dos lotes, latência na fila)"""
+    return write_queue.stats()
@@ -0,0 +1,51 @@
+// Autocompletar com tags já usadas na plataforma (evita grafias diferentes da mesma tag)
+// Usado por login.html e profile_edit.html
+const SUGGEST_DELAY_MS = 150;
+
+function attachTagSuggestions(inputId, tagsApi) {
+    const input = document.getElementById(inputId);
+    const list = document.createElement('datalist');
+    list.id = `${inputId}-suggestions`;
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.after(list);
+
+    let timer = null;
+    let pending = null;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        // Resposta de um prefixo anterior não pode sobrescrever a do atual
+        if (pending) {
+            pending.abort();
+            pending = null;
+        }
+        const prefix = input.value.trim();
+        if (!prefix) {
+            list.innerHTML = '';
+            return;
+        }
+        timer = setTimeout(async () => {
+            const request = new AbortController();
+            pending = request;
+            try {
+                const response = await fetch(`${tagsApi}/suggest?prefix=${encodeURIComponent(prefix)}`, {
+                    signal: request.signal
+                });
+                if (!response.ok) return;
+                const data = await response.json();
+                if (request.signal.aborted || input.value.trim() !== prefix) return;
+                list.innerHTML = '';
+                data.suggestions.forEach(suggestion => {
+                    const option = document.createElement('option');
+                    option.value = suggestion.name;
+                    list.appendChild(option);
+                });
+            } catch (error) {
+                if (error.name === 'AbortError') return;
+                console.error('Erro ao buscar sugestões de tags:', error);
+            } finally {
+                if (pending === request) pending = null;
+            }
+        }, SUGGEST_DELAY_MS);
+    });
+}
@@ -31,7 +31,10 @@ def test_db():
     
     yield db_path
     
-    # Limpar
+    # Limpar (recargas de deck em segundo plano terminam antes de fechar o banco)
+    from backend.discover_deck import deck_refiller
+    deck_refiller.flush()
+    db_module.close_all_connections()
     os.close(db_fd)
     os.unlink(db_path)
     db_module.DATABASE_PATH = original_path
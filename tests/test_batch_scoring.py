@@ -0,0 +1,161 @@
+"""
+Testes para backend/batch_scoring.py (requer numpy e scipy)
+"""
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+from backend.batch_scoring import recompute_recommendations  # noqa: E402
+from backend.database import get_read_connection  # noqa: E402
+from backend.discover_deck import deck_refiller, rank_candidates  # noqa: E402
+
+
+@pytest.fixture
+def scoring_users(create_user):
+    """Um aluno e três professores com afinidades e níveis diferentes"""
+    student = create_user(
+        name='Student', email='student@example.com', user_type='student',
+        interests=[{'name': 'Python'}, {'name': 'SQL'}]
+    )
+    teachers = [
+        create_user(name=name, email=f'{name.lower()}@example.com', user_type='teacher', skills=skills)
+        for name, skills in (
+            ('Basic', [{'name': 'python', 'level': 'beginner'}]),
+            ('Expert', [{'name': 'Python', 'level': 'advanced'}, {'name': 'sql', 'level': 'advanced'}]),
+            ('Other', [{'name': 'Violão', 'level': 'advanced'}]),
+        )
+    ]
+    return student, teachers
+
+
+def _deck(db_connection, user_id):
+    rows = db_connection.execute(
+        'SELECT candidate_id, score FROM discover_queue WHERE user_id = ? ORDER BY position',
+        (user_id,)
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def test_recompute_writes_ranked_top_k(scoring_users, db_connection):
+    """Testa se o job grava o top-K por usuário com a pontuação do caminho online"""
+    student, (basic, expert, other) = scoring_users
+
+    report = recompute_recommendations(top_k=5)
+
+    assert report['students'] == 1 and report['teachers'] == 3
+    assert report['decks_written'] == 3
+    deck = _deck(db_connection, student['user_id'])
+    assert [candidate_id for candidate_id, _ in deck] == [expert['user_id'], basic['user_id']]
+    assert deck[0][1] == 2
+    # O professor também recebe o aluno no próprio deck (acima do nível desejado: 1.0 por tag)
+    assert _deck(db_connection, expert['user_id']) == [(student['user_id'], 2)]
+    assert _deck(db_connection, other['user_id']) == []
+
+
+def test_recompute_skips_swiped_pairs(client, scoring_users, db_connection, runner):
+    """Testa se pares que já tiveram swipe ficam fora, também pelo comando da CLI"""
+    student, (basic, expert, _) = scoring_users
+    client.post('/api/discover/swipe', json={'to_user_id': expert['user_id'], 'swipe_type': 'skip'},
+                headers={'Authorization': f"Bearer {student['token']}"})
+    # A recarga agendada pelo swipe não pode completar o deck depois do job
+    deck_refiller.flush()
+    # Deck desatualizado: o job precisa regravá-lo (um deck igual ao calculado seria mantido)
+    db_connection.execute('UPDATE discover_deck_state SET stale = 1 WHERE user_id = ?', (student['user_id'],))
+    db_connection.commit()
+
+    result = runner.invoke(args=['recompute-recommendations', '--top-k', '1'])
+
+    assert result.exit_code == 0
+    assert [c for c, _ in _deck(db_connection, student['user_id'])] == [basic['user_id']]
+
+
+def test_recompute_matches_online_ranking(client, create_user, db_connection):
+    """Testa se o job e o caminho online (rank_candidates) montam o mesmo deck"""
+    def student(name, interests):
+        return create_user(name=name, email=f'{name.lower()}@example.com', user_type='student',
+                           interests=interests)
+
+    def teacher(name, skills):
+        return create_user(name=name, email=f'{name.lower()}@example.com', user_type='teacher',
+                           skills=skills)
+
+    users = [
+        student('Ana', [{'name': 'Python', 'desired_level': 'advanced'}, {'name': 'SQL'}]),
+        student('Bia', [{'name': 'python', 'difficulty': 'beginner', 'requires_evaluation': True}]),
+        student('Caio', [{'name': 'SQL', 'desired_level': 'expert'}, {'name': 'Java'}]),
+        teacher('Davi', [{'name': 'Python', 'level': 'beginner'}, {'name': ' python', 'level': 'expert'}]),
+        teacher('Eva', [{'name': 'SQL', 'level': 'intermediate'}, {'name': 'Java', 'level': 'advanced'}]),
+        teacher('Fabio', [{'name': 'Python', 'level': 'advanced', 'requires_evaluation': True}]),
+        teacher('Gil', [{'name': 'Java'}]),
+    ]
+    # Avaliação desempata candidatos com a mesma pontuação
+    db_connection.execute(
+        'INSERT INTO user_rating_stats (user_id, rating_sum, rating_count) VALUES (?, 5, 1)',
+        (users[5]['user_id'],)
+    )
+    db_connection.commit()
+
+    recompute_recommendations(top_k=10)
+
+    conn = get_read_connection()
+    try:
+        for user in users:
+            user_type = 'student' if user in users[:3] else 'teacher'
+            online = [
+                (candidate_id, pytest.approx(score))
+                for candidate_id, score in rank_candidates(conn.cursor(), user['user_id'], user_type, 10,
+                                                           exclude_queued=False)
+                if score > 0
+            ]
+            assert _deck(db_connection, user['user_id']) == online, user['user_id']
+    finally:
+        conn.close()
+
+
+def test_recompute_marks_decks_without_candidates_stale(client, scoring_users, db_connection):
+    """Testa se quem não tem candidato pontuado não fica com o deck antigo"""
+    _, (_, _, other) = scoring_users
+    response = client.get('/api/discover/profiles', headers={'Authorization': f"Bearer {other['token']}"})
+    assert response.status_code == 200
+    deck_refiller.flush()
+
+    report = recompute_recommendations(top_k=5)
+
+    assert report['decks_marked_stale'] == 1
+    assert db_connection.execute(
+        'SELECT stale FROM discover_deck_state WHERE user_id = ?', (other['user_id'],)
+    ).fetchone()[0] == 1
+
+
+def _deck_version(db_connection, user_id):
+    return db_connection.execute(
+        'SELECT version FROM discover_deck_state WHERE user_id = ?', (user_id,)
+    ).fetchone()[0]
+
+
+def test_recompute_keeps_version_of_unchanged_decks(client, scoring_users, db_connection):
+    """Testa se só os decks que mudaram ganham versão nova (cursores dos demais continuam valendo)"""
+    student, (basic, expert, _) = scoring_users
+    recompute_recommendations(top_k=5)
+    versions = {user['user_id']: _deck_version(db_connection, user['user_id']) for user in (student, expert)}
+
+    report = recompute_recommendations(top_k=5)
+
+    assert report['decks_written'] == 3
+    assert report['decks_changed'] == 0
+    assert {user_id: _deck_version(db_connection, user_id) for user_id in versions} == versions
+
+    response = client.put('/api/profile/update', json={'skills': [{'name': 'Violão', 'level': 'advanced'}]},
+                          headers={'Authorization': f"Bearer {basic['token']}"})
+    assert response.status_code == 200
+    deck_refiller.flush()
+    student_version = _deck_version(db_connection, student['user_id'])
+
+    report = recompute_recommendations(top_k=5)
+
+    # Só o deck do aluno perdeu o professor Basic
+    assert _deck(db_connection, student['user_id']) == [(expert['user_id'], 2)]
+    assert _deck_version(db_connection, student['user_id']) == student_version + 1
+    assert _deck_version(db_connection, expert['user_id']) == versions[expert['user_id']]
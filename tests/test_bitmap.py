@@ -0,0 +1,57 @@
+"""
+Testes para backend/bitmap.py e backend/swipe_cache.py
+"""
+
+from backend.bitmap import ArrayContainer, BitmapContainer, RoaringBitmap, RunContainer
+from backend.swipe_cache import SwipeCache
+
+
+def test_roaring_bitmap_membership_across_containers():
+    """Testa inserção, pertinência e iteração nos três tipos de contêiner"""
+    sparse_ids = [3, 70000, 70005]
+    run_ids = list(range(200000, 210000))
+    dense_ids = list(range(300000, 320000, 3))
+    bitmap = RoaringBitmap(sparse_ids + run_ids + dense_ids)
+
+    containers = {type(c) for c in bitmap._containers.values()}
+    assert containers == {ArrayContainer, RunContainer, BitmapContainer}
+    assert len(bitmap) == len(sparse_ids) + len(run_ids) + len(dense_ids)
+    assert 70005 in bitmap and 209999 in bitmap and 300003 in bitmap
+    assert 4 not in bitmap and 210000 not in bitmap and 300004 not in bitmap
+    assert list(bitmap) == sorted(sparse_ids + run_ids + dense_ids)
+    # arrays (2 bytes por id) + um único intervalo para 10 mil ids consecutivos + bitmap de 8 KB
+    assert bitmap.size_in_bytes() == 2 * len(sparse_ids) + 4 + 8192
+
+
+def test_roaring_bitmap_add_converts_containers():
+    """Testa se um array que cresce vira bitmap e se inserir em um run preserva os valores"""
+    bitmap = RoaringBitmap()
+    for value in range(0, 10000, 2):
+        bitmap.add(value)
+    assert isinstance(bitmap._containers[0], BitmapContainer)
+    assert len(bitmap) == 5000
+
+    runs = RoaringBitmap(range(100, 200))
+    runs.add(500)
+    assert 150 in runs and 500 in runs and len(runs) == 101
+
+
+def test_swipe_cache_lru_and_updates(test_db, db_connection):
+    """Testa carga sob demanda, atualização por add() e despejo do menos usado"""
+    cursor = db_connection.cursor()
+    cursor.executemany(
+        'INSERT INTO users (id, name, email, password_hash, user_type) VALUES (?, ?, ?, ?, ?)',
+        [(i, f'U{i}', f'u{i}@test.com', 'hash', 'student' if i < 3 else 'teacher') for i in range(1, 6)]
+    )
+    cursor.execute("INSERT INTO swipes (from_user_id, to_user_id, swipe_type) VALUES (1, 3, 'like')")
+    db_connection.commit()
+    cache = SwipeCache(max_users=1)
+
+    assert 3 in cache.get(cursor, 1)
+    cache.add(1, 4)
+    assert 4 in cache.get(cursor, 1)
+    cache.get(cursor, 2)
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 2, 1)
+    assert stats['cached_users'] == 1
@@ -0,0 +1,105 @@
+"""
+Testes para backend/routes/chat_routes.py
+"""
+
+import pytest
+
+
+@pytest.fixture
+def chat_pair(client, create_teacher, create_student, create_match):
+    """Professor e aluno com um match entre eles"""
+    teacher = create_teacher()
+    student = create_student()
+    match_id = create_match(teacher['user_id'], student['user_id'])
+    teacher_headers = {'Authorization': f"Bearer {teacher['token']}"}
+    student_headers = {'Authorization': f"Bearer {student['token']}"}
+    return match_id, teacher_headers, student_headers
+
+
+def test_conversation_state_tracks_messages_and_reads(client, chat_pair):
+    """Testa se a lista de conversas e o contador global acompanham envio e leitura"""
+    match_id, teacher_headers, student_headers = chat_pair
+
+    for text in ('Olá!', 'Tudo bem?'):
+        response = client.post('/api/chat/send', json={'match_id': match_id, 'message_text': text},
+                               headers=student_headers)
+        assert response.status_code == 201
+
+    conversations = client.get('/api/chat/conversations', headers=teacher_headers).get_json()['conversations']
+    assert len(conversations) == 1
+    assert conversations[0]['last_message'] == 'Tudo bem?'
+    assert conversations[0]['unread_count'] == 2
+    assert client.get('/api/chat/unread-count', headers=teacher_headers).get_json()['unread_count'] == 2
+    assert client.get('/api/chat/unread-count', headers=student_headers).get_json()['unread_count'] == 0
+
+    response = client.post(f'/api/chat/mark-read/{match_id}', json={}, headers=teacher_headers)
+    assert response.status_code == 200
+    assert client.get('/api/chat/unread-count', headers=teacher_headers).get_json()['unread_count'] == 0
+
+
+def test_send_message_rejects_non_member(client, chat_pair, create_user):
+    """Testa se quem não participa do match não consegue enviar mensagens"""
+    match_id, _, _ = chat_pair
+    outsider = create_user(name='Outsider', email='outsider@example.com')
+
+    response = client.post('/api/chat/send', json={'match_id': match_id, 'message_text': 'Oi'},
+                           headers={'Authorization': f"Bearer {outsider['token']}"})
+
+    assert response.status_code == 404
+
+
+def test_get_messages_keyset_pagination(client, chat_pair):
+    """Testa after_id/before_id/limit e o cursor retornado"""
+    match_id, teacher_headers, student_headers = chat_pair
+    for i in range(5):
+        client.post('/api/chat/send', json={'match_id': match_id, 'message_text': f'msg {i}'},
+                    headers=student_headers)
+
+    latest = client.get(f'/api/chat/messages/{match_id}?limit=2', headers=teacher_headers).get_json()
+    assert [m['message_text'] for m in latest['messages']] == ['msg 3', 'msg 4']
+    assert latest['has_more'] is True
+    assert latest['messages'][0]['sender_name'] == 'Student User'
+
+    older = client.get(f"/api/chat/messages/{match_id}?before_id={latest['cursor']['before_id']}&limit=2",
+                       headers=teacher_headers).get_json()
+    assert [m['message_text'] for m in older['messages']] == ['msg 1', 'msg 2']
+
+    client.post('/api/chat/send', json={'match_id': match_id, 'message_text': 'nova'},
+                headers=student_headers)
+    newer = client.get(f"/api/chat/messages/{match_id}?after_id={latest['cursor']['after_id']}",
+                       headers=teacher_headers).get_json()
+    assert [m['message_text'] for m in newer['messages']] == ['nova']
+
+    idle = client.get(f"/api/chat/messages/{match_id}?after_id={newer['cursor']['after_id']}",
+                      headers=teacher_headers).get_json()
+    assert idle['messages'] == []
+    assert idle['cursor']['after_id'] == newer['cursor']['after_id']
+
+
+def test_get_messages_cursors_reach_whole_history(client, chat_pair):
+    """Testa o caminho do cliente: before_id até o início e after_id enquanto has_more"""
+    match_id, teacher_headers, student_headers = chat_pair
+    for i in range(7):
+        client.post('/api/chat/send', json={'match_id': match_id, 'message_text': f'msg {i}'},
+                    headers=student_headers)
+
+    page = client.get(f'/api/chat/messages/{match_id}?limit=3', headers=teacher_headers).get_json()
+    history = [m['message_text'] for m in page['messages']]
+    newest_id = page['cursor']['after_id']
+    while page['cursor']['before_id'] is not None:
+        page = client.get(f"/api/chat/messages/{match_id}?before_id={page['cursor']['before_id']}&limit=3",
+                          headers=teacher_headers).get_json()
+        history = [m['message_text'] for m in page['messages']] + history
+    assert history == [f'msg {i}' for i in range(7)]
+
+    # Rajada maior que a página: has_more manda buscar de novo a partir do cursor
+    for i in range(5):
+        client.post('/api/chat/send', json={'match_id': match_id, 'message_text': f'nova {i}'},
+                    headers=student_headers)
+    burst, has_more = [], True
+    while has_more:
+        page = client.get(f'/api/chat/messages/{match_id}?after_id={newest_id}&limit=2',
+                          headers=teacher_headers).get_json()
+        burst += [m['message_text'] for m in page['messages']]
+        newest_id, has_more = page['cursor']['after_id'], page['has_more']
+    assert burst == [f'nova {i}' for i in range(5)]
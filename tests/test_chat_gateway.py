@@ -0,0 +1,206 @@
+"""
+Testes para backend/chat_gateway.py
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from backend.chat_gateway import ChatGateway, chat_gateway
+from backend.events import event_hub
+
+
+def _frame(**fields):
+    return json.dumps(fields)
+
+
+def test_gateway_send_fans_out_to_other_participant(client, create_teacher, create_student, create_match):
+    """Testa se um frame send grava a mensagem e chega ao socket do outro participante"""
+    teacher = create_teacher()
+    student = create_student()
+    match_id = create_match(teacher['user_id'], student['user_id'])
+    gateway = ChatGateway()
+    student_socket = gateway.connect(student['user_id'])
+    teacher_socket = gateway.connect(teacher['user_id'])
+
+    try:
+        reply = gateway.handle_frame(student_socket, _frame(
+            type='send', match_id=match_id, message_text=' Olá! ', client_id='c1'
+        ))
+        assert reply['type'] == 'ack'
+        assert reply['client_id'] == 'c1'
+
+        pushed = gateway.next_frame(teacher_socket, timeout=1)
+        assert pushed['type'] == 'message'
+        assert pushed['data']['message_id'] == reply['message_id']
+        assert pushed['data']['message_text'] == 'Olá!'
+        assert gateway.next_frame(teacher_socket, timeout=1)['data'] == {'unread_count': 1}
+
+        gateway.handle_frame(teacher_socket, _frame(type='ack', event_id=pushed['event_id']))
+        reply = gateway.handle_frame(teacher_socket, _frame(type='read', match_id=match_id, client_id='c2'))
+        assert reply == {'type': 'ack', 'client_id': 'c2', 'match_id': match_id}
+        assert gateway.next_frame(teacher_socket, timeout=1)['data'] == {'unread_count': 0}
+
+        stats = gateway.stats()
+        assert stats['connections'] == 2
+        assert stats['frames_in'] == 3
+        assert stats['acks'] == 1
+    finally:
+        gateway.disconnect(student_socket)
+        gateway.disconnect(teacher_socket)
+
+    assert gateway.stats()['connections'] == 0
+
+
+def test_gateway_rejects_invalid_frames(client, create_teacher, create_student, create_user, create_match):
+    """Testa frames malformados e envio por quem não participa do match"""
+    teacher = create_teacher()
+    student = create_student()
+    outsider = create_user(name='Outsider', email='outsider@example.com')
+    match_id = create_match(teacher['user_id'], student['user_id'])
+    gateway = ChatGateway()
+    outsider_socket = gateway.connect(outsider['user_id'])
+
+    try:
+        assert gateway.handle_frame(outsider_socket, 'not json')['type'] == 'error'
+        assert gateway.handle_frame(outsider_socket, _frame(type='typing', match_id=match_id))['type'] == 'error'
+        assert gateway.handle_frame(outsider_socket, _frame(type='send', match_id='1'))['type'] == 'error'
+
+        reply = gateway.handle_frame(outsider_socket, _frame(
+            type='send', match_id=match_id, message_text='Oi', client_id='c1'
+        ))
+        assert reply == {'type': 'error', 'client_id': 'c1', 'error': 'Match não encontrado ou inválido'}
+        reply = gateway.handle_frame(outsider_socket, _frame(type='read', match_id=match_id, client_id='c2'))
+        assert reply == {'type': 'error', 'client_id': 'c2', 'error': 'Match não encontrado'}
+        assert gateway.stats()['frame_errors'] == 5
+    finally:
+        gateway.disconnect(outsider_socket)
+
+
+def test_gateway_limits_connections():
+    """Testa se o gateway recusa sockets acima do limite por processo"""
+    gateway = ChatGateway(max_connections=1)
+    first = gateway.connect(1)
+    assert gateway.connect(2) is None
+    gateway.disconnect(first)
+    assert gateway.connect(2) is not None
+    assert gateway.stats()['connections_rejected'] == 1
+
+
+@pytest.fixture
+def ws_server(app):
+    """Servidor asyncio do WebSocket (como em python backend/app.py), em porta livre"""
+    pytest.importorskip('websockets')
+    from websockets.exceptions import ConnectionClosed
+    from websockets.sync.client import connect as ws_connect
+    from backend.chat_ws_server import ChatWebSocketServer
+
+    server = ChatWebSocketServer(app, host='127.0.0.1', port=0)
+    port = server.start()
+    sockets = []
+
+    def connect(query='', headers=None):
+        ws = ws_connect(f'ws://127.0.0.1:{port}/api/chat/ws{query}', additional_headers=headers)
+        sockets.append(ws)
+        return ws
+
+    connect.port = port
+    yield connect, ConnectionClosed
+    for ws in sockets:
+        ws.close()
+    server.stop()
+
+
+def _stream_token(client, user):
+    return client.post('/api/events/token', json={},
+                       headers={'Authorization': f"Bearer {user['token']}"}).get_json()['token']
+
+
+def _receive(ws):
+    frame = json.loads(ws.recv(timeout=5))
+    while frame['type'] == 'ping':
+        frame = json.loads(ws.recv(timeout=5))
+    return frame
+
+
+def test_ws_route_exchanges_frames(client, ws_server, create_teacher, create_student, create_user, create_match):
+    """Testa a rota: token do stream, envio, entrega ao outro socket e read fora do match"""
+    connect, _ = ws_server
+    teacher = create_teacher()
+    student = create_student()
+    outsider = create_user(name='Outsider', email='outsider@example.com')
+    match_id = create_match(teacher['user_id'], student['user_id'])
+
+    student_ws = connect(f'?token={_stream_token(client, student)}')
+    # O JWT de login também vale, mas só no header
+    teacher_ws = connect(headers={'Authorization': f"Bearer {teacher['token']}"})
+    outsider_ws = connect(f'?token={_stream_token(client, outsider)}')
+
+    student_ws.send(_frame(type='send', match_id=match_id, message_text='Oi', client_id='c1'))
+    ack = _receive(student_ws)
+    assert ack['type'] == 'ack' and ack['client_id'] == 'c1'
+
+    pushed = _receive(teacher_ws)
+    assert pushed['type'] == 'message'
+    assert pushed['data']['message_id'] == ack['message_id']
+
+    outsider_ws.send(_frame(type='read', match_id=match_id, client_id='c2'))
+    assert _receive(outsider_ws) == {'type': 'error', 'client_id': 'c2', 'error': 'Match não encontrado'}
+
+
+def test_ws_route_rejects_login_jwt_in_query_and_extra_sockets(client, ws_server, create_user, monkeypatch):
+    """Testa se a rota fecha o socket com o JWT de login na URL e acima do limite de sockets"""
+    connect, connection_closed = ws_server
+    user = create_user(name='User', email='user@example.com')
+    stats = chat_gateway.stats()
+
+    ws = connect(f"?jwt={user['token']}")
+    with pytest.raises(connection_closed):
+        ws.recv(timeout=5)
+    assert chat_gateway.stats()['connections_opened'] == stats['connections_opened']
+
+    monkeypatch.setattr(chat_gateway, 'max_connections', 0)
+    ws = connect(f'?token={_stream_token(client, user)}')
+    with pytest.raises(connection_closed):
+        ws.recv(timeout=5)
+    assert chat_gateway.stats()['connections_rejected'] == stats['connections_rejected'] + 1
+
+
+def test_ws_server_holds_many_idle_sockets_without_threads(client, ws_server, create_user):
+    """Testa se mil sockets ociosos cabem no event loop sem uma thread por socket e ainda recebem eventos"""
+    connect, _ = ws_server
+    from websockets.asyncio.client import connect as ws_connect
+    user = create_user(name='User', email='user@example.com')
+    token = _stream_token(client, user)
+    url = f'ws://127.0.0.1:{connect.port}/api/chat/ws?token={token}'
+    total = 1000
+    threads_before = threading.active_count()
+    stats = chat_gateway.stats()
+
+    async def scenario():
+        sockets = []
+        try:
+            for start in range(0, total, 100):
+                sockets += await asyncio.gather(*(ws_connect(url) for _ in range(start, min(start + 100, total))))
+            # A conexão é registrada depois do handshake, na autenticação em segundo plano
+            for _ in range(100):
+                if chat_gateway.stats()['connections'] - stats['connections'] == total:
+                    break
+                await asyncio.sleep(0.05)
+            opened = chat_gateway.stats()['connections'] - stats['connections']
+            threads = threading.active_count()
+
+            event_hub.publish(user['user_id'], 'match', {'match_id': 1})
+            frames = await asyncio.gather(*(ws.recv() for ws in sockets[::100]))
+            return opened, threads, [json.loads(frame) for frame in frames]
+        finally:
+            await asyncio.gather(*(ws.close() for ws in sockets))
+
+    opened, threads, frames = asyncio.run(scenario())
+
+    assert opened == total
+    # Só o pool fixo de frames, nunca uma thread por socket
+    assert threads - threads_before <= 8
+    assert all(frame['type'] == 'match' and frame['data'] == {'match_id': 1} for frame in frames)
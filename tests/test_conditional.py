@@ -0,0 +1,58 @@
+"""
+Testes para as respostas condicionais (ETag / 304) de backend/conditional.py
+"""
+
+
+def _get(client, url, headers, etag=None):
+    if etag:
+        headers = dict(headers, **{'If-None-Match': etag})
+    return client.get(url, headers=headers)
+
+
+def test_profile_me_not_modified_until_update(client, create_teacher):
+    """Testa se /profile/me responde 304 com o mesmo ETag e muda após atualizar o perfil"""
+    teacher = create_teacher()
+    headers = {'Authorization': f"Bearer {teacher['token']}"}
+
+    first = _get(client, '/api/profile/me', headers)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and 'no-cache' in first.headers['Cache-Control']
+
+    cached = _get(client, '/api/profile/me', headers, etag)
+    assert cached.status_code == 304 and cached.headers['ETag'] == etag
+
+    client.put('/api/profile/update', json={'bio': 'Nova bio'}, headers=headers)
+    updated = _get(client, '/api/profile/me', headers, etag)
+    assert updated.status_code == 200
+    assert updated.get_json()['bio'] == 'Nova bio'
+    assert updated.headers['ETag'] != etag
+
+
+def test_activity_versions_follow_messages_and_partner_profile(client, create_teacher, create_student,
+                                                               create_match):
+    """Testa se matches/unread-count mudam com mensagens e com o perfil de quem deu match"""
+    teacher = create_teacher()
+    student = create_student()
+    match_id = create_match(teacher['user_id'], student['user_id'])
+    student_headers = {'Authorization': f"Bearer {student['token']}"}
+    teacher_headers = {'Authorization': f"Bearer {teacher['token']}"}
+
+    etags = {url: _get(client, url, student_headers).headers['ETag']
+             for url in ('/api/discover/matches', '/api/chat/unread-count', '/api/discover/stats')}
+    for url, etag in etags.items():
+        assert _get(client, url, student_headers, etag).status_code == 304
+
+    client.post('/api/chat/send', json={'match_id': match_id, 'message_text': 'Olá'}, headers=teacher_headers)
+    unread = _get(client, '/api/chat/unread-count', student_headers, etags['/api/chat/unread-count'])
+    assert unread.status_code == 200 and unread.get_json()['unread_count'] == 1
+
+    matches_etag = _get(client, '/api/discover/matches', student_headers).headers['ETag']
+    client.put('/api/profile/update', json={'name': 'Prof. Renomeado'}, headers=teacher_headers)
+    matches = _get(client, '/api/discover/matches', student_headers, matches_etag)
+    assert matches.status_code == 200
+    assert matches.get_json()['matches'][0]['other_user_name'] == 'Prof. Renomeado'
+
+    # Perfil de outro usuário: o ETag acompanha o perfil dele
+    profile_etag = _get(client, f"/api/profile/{teacher['user_id']}", student_headers).headers['ETag']
+    assert _get(client, f"/api/profile/{teacher['user_id']}", student_headers, profile_etag).status_code == 304
+    assert _get(client, '/api/profile/9999', student_headers).status_code == 404
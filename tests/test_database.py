@@ -2,10 +2,13 @@
 Testes para backend/database.py
 """
 
+import ast
+import pathlib
 import pytest
 import sqlite3
 import os
 import tempfile
+from backend import migrations
 from backend.database import get_db_connection, init_database, reset_database
 
 
@@ -334,3 +337,289 @@ def test_cascade_delete_on_user(db_connection):
     # Verificar que skill foi deletada em cascata
     cursor.execute("SELECT COUNT(*) FROM teacher_skills WHERE user_id = ?", (user_id,))
     assert cursor.fetchone()[0] == 0
+
+
+def test_pooled_connection_applies_pragmas(test_db):
+    """Testa se as conexões do pool saem configuradas (WAL, FKs, timeout)"""
+    conn = get_db_connection()
+    try:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] > 0
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    finally:
+        conn.close()
+
+
+def test_pool_reuses_connections(test_db):
+    """Testa se close() devolve a conexão de leitura ao pool em vez de fechá-la"""
+    from backend.database import get_read_connection, get_pool_stats
+
+    conn = get_read_connection()
+    conn.close()
+    before = get_pool_stats()['read']
+
+    conn = get_read_connection()
+    conn.close()
+    after = get_pool_stats()['read']
+
+    assert after['created'] == before['created']
+    assert after['reused'] == before['reused'] + 1
+    assert after['in_use'] == 0
+
+
+def test_read_connection_is_read_only(test_db):
+    """Testa se a faixa de leitura rejeita escritas"""
+    from backend.database import get_read_connection
+
+    conn = get_read_connection()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("""
+                INSERT INTO users (name, email, password_hash, user_type)
+                VALUES (?, ?, ?, ?)
+            """, ('User1', 'user1@test.com', 'hash', 'student'))
+    finally:
+        conn.close()
+
+
+def test_writer_lane_serializes_writers(test_db):
+    """Testa se só uma thread por vez segura a conexão de escrita"""
+    import threading
+    from backend.database import get_write_connection
+
+    conn = get_write_connection()
+    acquired = threading.Event()
+
+    def other_writer():
+        other = get_write_connection()
+        acquired.set()
+        other.close()
+
+    thread = threading.Thread(target=other_writer)
+    thread.start()
+    assert not acquired.wait(0.2)
+
+    conn.close()
+    assert acquired.wait(2)
+    thread.join()
+
+
+def test_pool_rolls_back_uncommitted_work(test_db):
+    """Testa se transações esquecidas abertas são desfeitas ao devolver a conexão"""
+    conn = get_db_connection()
+    conn.execute("""
+        INSERT INTO users (name, email, password_hash, user_type)
+        VALUES (?, ?, ?, ?)
+    """, ('User1', 'user1@test.com', 'hash', 'student'))
+    conn.close()
+
+    conn = get_db_connection()
+    try:
+        count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    finally:
+        conn.close()
+    assert count == 0
+
+
+def test_closed_pooled_connection_cannot_be_used(test_db):
+    """Testa se a conexão devolvida ao pool não pode mais ser usada pelo chamador"""
+    conn = get_db_connection()
+    conn.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+
+def test_init_database_records_schema_version(test_db):
+    """Testa se o banco fica marcado com a versão da última migração"""
+    from backend.migrations import latest_version
+
+    conn = sqlite3.connect(test_db)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+
+    assert version == latest_version()
+
+
+def test_init_database_is_noop_when_schema_is_current(test_db):
+    """Testa se migrações já aplicadas não rodam de novo"""
+    from backend.database import get_write_connection
+    from backend.migrations import migrate
+
+    conn = get_write_connection()
+    try:
+        assert migrate(conn) == []
+    finally:
+        conn.close()
+
+
+def test_migrations_upgrade_legacy_database(test_db):
+    """Testa se um banco antigo (sem versão e sem colunas de endereço) é atualizado"""
+    conn = sqlite3.connect(test_db)
+    conn.execute('DROP TABLE users')
+    conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            user_type TEXT NOT NULL
+        )
+    ''')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    conn.close()
+
+    init_database()
+
+    conn = sqlite3.connect(test_db)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    conn.close()
+    assert {'postal_code', 'address_city', 'address_state'}.issubset(columns)
+
+
+def test_reset_database_recreates_schema(test_db):
+    """Testa se reset_database apaga os dados e recria as tabelas"""
+    conn = sqlite3.connect(test_db)
+    conn.execute("""
+        INSERT INTO users (name, email, password_hash, user_type)
+        VALUES (?, ?, ?, ?)
+    """, ('User1', 'user1@test.com', 'hash', 'student'))
+    conn.commit()
+    conn.close()
+
+    reset_database()
+
+    conn = sqlite3.connect(test_db)
+    count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    conn.close()
+    assert count == 0
+
+
+def test_rating_stats_follow_rating_changes(db_connection):
+    """Testa se os triggers mantêm user_rating_stats em insert, upsert e delete"""
+    cursor = db_connection.cursor()
+    cursor.execute("""
+        INSERT INTO users (name, email, password_hash, user_type)
+        VALUES (?, ?, ?, ?)
+    """, ('User1', 'user1@test.com', 'hash', 'student'))
+    cursor.execute("""
+        INSERT INTO users (name, email, password_hash, user_type)
+        VALUES (?, ?, ?, ?)
+    """, ('User2', 'user2@test.com', 'hash', 'teacher'))
+    cursor.execute('INSERT INTO matches (user1_id, user2_id) VALUES (1, 2)')
+
+    upsert = """
+        INSERT INTO ratings (match_id, rater_id, rated_id, rating)
+        VALUES (1, 1, 2, ?)
+        ON CONFLICT(match_id, rater_id) DO UPDATE SET rating = excluded.rating
+    """
+
+    def stats():
+        cursor.execute(
+            'SELECT rating_sum, rating_count, stars_3, stars_5 FROM user_rating_stats WHERE user_id = 2'
+        )
+        return tuple(cursor.fetchone())
+
+    cursor.execute(upsert, (5,))
+    assert stats() == (5, 1, 0, 1)
+
+    cursor.execute(upsert, (3,))
+    assert stats() == (3, 1, 1, 0)
+
+    cursor.execute('DELETE FROM ratings')
+    assert stats() == (0, 0, 0, 0)
+
+
+def test_backfill_rating_stats_command(runner, db_connection):
+    """Testa se o comando de backfill reconstrói os agregados a partir de ratings"""
+    cursor = db_connection.cursor()
+    cursor.execute("""
+        INSERT INTO users (name, email, password_hash, user_type)
+        VALUES (?, ?, ?, ?)
+    """, ('User1', 'user1@test.com', 'hash', 'student'))
+    cursor.execute("""
+        INSERT INTO users (name, email, password_hash, user_type)
+        VALUES (?, ?, ?, ?)
+    """, ('User2', 'user2@test.com', 'hash', 'teacher'))
+    cursor.execute('INSERT INTO matches (user1_id, user2_id) VALUES (1, 2)')
+    cursor.execute('INSERT INTO ratings (match_id, rater_id, rated_id, rating) VALUES (1, 1, 2, 4)')
+    cursor.execute('DELETE FROM user_rating_stats')
+    db_connection.commit()
+
+    result = runner.invoke(args=['backfill-rating-stats'])
+
+    assert result.exit_code == 0
+    cursor.execute('SELECT rating_sum, rating_count FROM user_rating_stats WHERE user_id = 2')
+    assert tuple(cursor.fetchone()) == (4, 1)
+
+
+def test_app_connections_enforce_foreign_keys(client, create_student, create_teacher, test_db):
+    """Testa se as conexões do app aplicam as chaves estrangeiras (FK e ON DELETE CASCADE)"""
+    student = create_student()
+    teacher = create_teacher()
+    headers = {'Authorization': f"Bearer {student['token']}"}
+
+    response = client.post('/api/discover/swipe', json={'to_user_id': 999999, 'swipe_type': 'like'}, headers=headers)
+    assert response.status_code == 400
+
+    conn = get_db_connection()
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM swipes WHERE to_user_id = 999999').fetchone()[0] == 0
+        conn.execute('DELETE FROM users WHERE id = ?', (teacher['user_id'],))
+        conn.commit()
+        assert conn.execute(
+            'SELECT COUNT(*) FROM teacher_skills WHERE user_id = ?', (teacher['user_id'],)
+        ).fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_metrics_require_token(app, client):
+    """Testa se /api/metrics fica desligada sem METRICS_TOKEN e exige o header"""
+    app.config['METRICS_TOKEN'] = None
+    assert client.get('/api/metrics').status_code == 404
+
+    app.config['METRICS_TOKEN'] = 'segredo'
+    assert client.get('/api/metrics').status_code == 403
+    assert client.get('/api/metrics', headers={'X-Metrics-Token': 'errado'}).status_code == 403
+    response = client.get('/api/metrics', headers={'X-Metrics-Token': 'segredo'})
+    assert response.status_code == 200
+    assert 'database' in response.get_json()
+
+
+def test_migrations_do_not_import_app_modules():
+    """Testa se as migrações não dependem do código atual do app (ficam fixas depois de publicadas)"""
+    tree = ast.parse(pathlib.Path(migrations.__file__).read_text(encoding='utf-8'))
+    imported = [
+        node.module if isinstance(node, ast.ImportFrom) else alias.name
+        for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))
+        for alias in node.names
+    ]
+    assert not [name for name in imported if name and name.startswith('backend')]
+
+
+def test_profile_search_migration_without_fts5(test_db):
+    """Testa se a migração da busca não impede a inicialização em SQLite sem FTS5"""
+    class NoFts5Cursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, sql, *args):
+            if 'USING fts5' in sql:
+                raise sqlite3.OperationalError('no such module: fts5')
+            return self._cursor.execute(sql, *args)
+
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+
+    conn = sqlite3.connect(test_db)
+    try:
+        conn.execute('DROP TABLE profile_search')
+        search_migration = next(fn for version, _, fn in migrations.MIGRATIONS if version == 11)
+        search_migration(NoFts5Cursor(conn.cursor()))
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'profile_search' not in tables
+    finally:
+        conn.close()
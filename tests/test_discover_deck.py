@@ -0,0 +1,197 @@
+"""
+Testes para backend/discover_deck.py e o deck de /api/discover/profiles
+"""
+
+import pytest
+
+import backend.discover_deck as discover_deck
+from backend.discover_deck import deck_refiller
+
+
+@pytest.fixture
+def deck_users(create_user):
+    """Aluno interessado em Python e SQL e professores com afinidades diferentes"""
+    def teacher(name, skills):
+        return create_user(
+            name=name, email=f'{name.lower()}@example.com', user_type='teacher',
+            skills=[{'name': skill, 'level': 'advanced'} for skill in skills]
+        )
+
+    student = create_user(
+        name='Student', email='student@example.com', user_type='student',
+        interests=[{'name': 'Python', 'difficulty': 'beginner'}, {'name': 'SQL', 'difficulty': 'beginner'}]
+    )
+    teachers = {
+        'both': teacher('Both', [' python', 'SQL']),
+        'one': teacher('One', ['Python', 'Java']),
+        'none': teacher('None', ['Violão'])
+    }
+    headers = {'Authorization': f"Bearer {student['token']}"}
+    return student, teachers, headers
+
+
+def _deck_ids(client, headers):
+    response = client.get('/api/discover/profiles', headers=headers)
+    assert response.status_code == 200
+    return [p['id'] for p in response.get_json()['profiles']]
+
+
+def test_deck_is_ranked_and_consumed_by_swipes(client, deck_users):
+    """Testa se o deck vem ordenado por tags em comum e perde o perfil que recebeu swipe"""
+    _, teachers, headers = deck_users
+
+    response = client.get('/api/discover/profiles', headers=headers)
+    profiles = response.get_json()['profiles']
+    assert [p['id'] for p in profiles] == [
+        teachers['both']['user_id'], teachers['one']['user_id'], teachers['none']['user_id']
+    ]
+    assert [p['match_score'] for p in profiles] == [2, 1, 0]
+    assert profiles[0]['skills'][0]['skill_name'] == ' python'
+
+    client.post('/api/discover/swipe', json={
+        'to_user_id': teachers['both']['user_id'], 'swipe_type': 'skip'
+    }, headers=headers)
+    deck_refiller.flush()
+
+    assert _deck_ids(client, headers) == [teachers['one']['user_id'], teachers['none']['user_id']]
+
+
+def test_deck_rebuilt_after_tag_change(client, deck_users, db_connection):
+    """Testa se mudar as tags de um candidato marca o deck como desatualizado e reordena"""
+    student, teachers, headers = deck_users
+    _deck_ids(client, headers)
+
+    response = client.put('/api/profile/update', json={
+        'skills': [{'name': 'sql'}, {'name': 'Python'}, {'name': 'Violão'}]
+    }, headers={'Authorization': f"Bearer {teachers['none']['token']}"})
+    assert response.status_code == 200
+    stale = db_connection.execute(
+        'SELECT stale FROM discover_deck_state WHERE user_id = ?', (student['user_id'],)
+    ).fetchone()[0]
+    assert stale == 1
+
+    # A visita seguinte ainda recebe o deck antigo e agenda o recálculo
+    _deck_ids(client, headers)
+    deck_refiller.flush()
+
+    ids = _deck_ids(client, headers)
+    assert ids.index(teachers['none']['user_id']) < ids.index(teachers['one']['user_id'])
+
+
+def test_tag_change_marks_only_decks_holding_the_user(client, deck_users, db_connection, monkeypatch):
+    """Testa se a mudança de tags só desatualiza o deck do usuário e os decks em que ele está"""
+    student, teachers, headers = deck_users
+    monkeypatch.setattr(discover_deck, 'DECK_SIZE', 2)
+    assert _deck_ids(client, headers) == [teachers['both']['user_id'], teachers['one']['user_id']]
+    teacher_headers = {'Authorization': f"Bearer {teachers['both']['token']}"}
+    _deck_ids(client, teacher_headers)
+    deck_refiller.flush()
+
+    def stale_decks():
+        return {row[0] for row in db_connection.execute('SELECT user_id FROM discover_deck_state WHERE stale = 1')}
+
+    def update_skills(teacher, skills):
+        response = client.put('/api/profile/update', json={'skills': skills},
+                              headers={'Authorization': f"Bearer {teacher['token']}"})
+        assert response.status_code == 200
+
+    # Fora do deck do aluno (DECK_SIZE = 2): nenhum deck muda
+    update_skills(teachers['none'], [{'name': 'Python'}])
+    assert stale_decks() == set()
+
+    update_skills(teachers['one'], [{'name': 'SQL'}])
+    assert stale_decks() == {student['user_id']}
+
+
+def test_deck_refills_below_threshold(client, deck_users, monkeypatch):
+    """Testa se o deck é completado com os próximos candidatos quando fica pequeno"""
+    _, teachers, headers = deck_users
+    monkeypatch.setattr(discover_deck, 'DECK_SIZE', 2)
+    monkeypatch.setattr(discover_deck, 'REFILL_THRESHOLD', 2)
+
+    assert _deck_ids(client, headers) == [teachers['both']['user_id'], teachers['one']['user_id']]
+
+    client.post('/api/discover/swipe', json={
+        'to_user_id': teachers['both']['user_id'], 'swipe_type': 'like'
+    }, headers=headers)
+    deck_refiller.flush()
+
+    assert _deck_ids(client, headers) == [teachers['one']['user_id'], teachers['none']['user_id']]
+    assert deck_refiller.stats()['candidates_added'] >= 1
+
+
+def test_profiles_paginated_with_cursor(client, deck_users):
+    """Testa se o cursor percorre o deck em páginas sem repetir perfis"""
+    _, teachers, headers = deck_users
+
+    first = client.get('/api/discover/profiles?limit=2&prefetch=1', headers=headers).get_json()
+    assert [p['id'] for p in first['profiles']] == [teachers['both']['user_id'], teachers['one']['user_id']]
+    assert first['has_more'] is True and first['reset'] is False
+    assert first['prefetch'] == [{'id': teachers['none']['user_id'], 'photo_url': None}]
+
+    second = client.get(
+        '/api/discover/profiles', query_string={'limit': 2, 'cursor': first['next_cursor']}, headers=headers
+    ).get_json()
+    assert [p['id'] for p in second['profiles']] == [teachers['none']['user_id']]
+    assert second['has_more'] is False and 'prefetch' not in second
+
+    response = client.get('/api/discover/profiles?cursor=invalido', headers=headers)
+    assert response.status_code == 400
+
+
+def test_profiles_cursor_resets_after_rebuild(client, deck_users):
+    """Testa se um cursor de um deck já recalculado recomeça do início"""
+    _, teachers, headers = deck_users
+    first = client.get('/api/discover/profiles?limit=1', headers=headers).get_json()
+
+    client.put('/api/profile/update', json={'skills': [{'name': 'Python'}, {'name': 'SQL'}]},
+               headers={'Authorization': f"Bearer {teachers['none']['token']}"})
+    client.get('/api/discover/profiles?limit=1', headers=headers)
+    deck_refiller.flush()
+
+    page = client.get(
+        '/api/discover/profiles', query_string={'limit': 3, 'cursor': first['next_cursor']}, headers=headers
+    ).get_json()
+    assert page['reset'] is True
+    assert len(page['profiles']) == 3
+
+
+def test_teacher_deck_weighs_levels_and_evaluation(client, create_user, db_connection):
+    """Testa se o deck do professor pondera o nível desejado pelo aluno e a exigência de avaliação"""
+    teacher = create_user(
+        name='Teacher', email='teacher@example.com', user_type='teacher',
+        skills=[{'name': 'Python', 'level': 'advanced'}, {'name': 'SQL', 'level': 'intermediate'}]
+    )
+
+    def student(name, interests):
+        return create_user(
+            name=name, email=f'{name.lower()}@example.com', user_type='student', interests=interests
+        )
+
+    students = {
+        # Python (1.0) + SQL dois níveis acima (0.25)
+        'both': student('Both', [
+            {'name': 'python', 'desired_level': 'intermediate'},
+            {'name': 'SQL', 'desired_level': 'expert'}
+        ]),
+        'fit': student('Fit', [{'name': 'Python', 'desired_level': 'advanced'}]),
+        'evaluation': student('Evaluation', [
+            {'name': 'Python', 'desired_level': 'beginner', 'requires_evaluation': True}
+        ]),
+        'above': student('Above', [{'name': 'Python', 'desired_level': 'expert'}]),
+        'none': student('None', [{'name': 'Violão', 'desired_level': 'beginner'}])
+    }
+
+    response = client.get('/api/discover/profiles', headers={'Authorization': f"Bearer {teacher['token']}"})
+    profiles = response.get_json()['profiles']
+    assert [p['id'] for p in profiles] == [
+        students[key]['user_id'] for key in ('both', 'fit', 'evaluation', 'above', 'none')
+    ]
+    assert [p['match_score'] for p in profiles] == [1.25, 1.0, 0.8, 0.5, 0]
+
+    plan = ' '.join(
+        row[3] for row in db_connection.execute(
+            'EXPLAIN QUERY PLAN ' + discover_deck.TEACHER_SCORES_SQL, (teacher['user_id'],)
+        )
+    )
+    assert 'COVERING INDEX idx_student_interests_tag_fit' in plan
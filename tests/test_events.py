@@ -0,0 +1,104 @@
+"""
+Testes para backend/events.py e backend/routes/events_routes.py
+"""
+
+import time
+
+from itsdangerous import TimestampSigner, URLSafeTimedSerializer
+from werkzeug.test import EnvironBuilder
+
+from backend.events import EventHub, event_hub
+from backend.routes.events_routes import STREAM_TOKEN_MAX_AGE_S, STREAM_TOKEN_SALT
+
+
+def test_event_hub_delivers_only_to_target_user():
+    """Testa se o evento chega apenas às conexões do usuário de destino"""
+    hub = EventHub()
+    first = hub.subscribe(1)
+    second = hub.subscribe(1)
+    other = hub.subscribe(2)
+
+    assert hub.publish(1, 'message', {'match_id': 10}) == 2
+
+    assert first.get(timeout=1)['data'] == {'match_id': 10}
+    assert second.get(timeout=1)['type'] == 'message'
+    assert other.get(timeout=0.01) is None
+
+
+def test_event_hub_bounded_queue_drops_oldest():
+    """Testa se a fila de uma conexão lenta descarta os eventos mais antigos"""
+    hub = EventHub(max_queue_size=2)
+    subscription = hub.subscribe(1)
+
+    for i in range(3):
+        hub.publish(1, 'unread', {'unread_count': i})
+
+    assert subscription.overflowed
+    assert subscription.get(timeout=1)['data']['unread_count'] == 1
+    assert subscription.get(timeout=1)['data']['unread_count'] == 2
+    assert hub.stats()['dropped'] == 1
+
+
+def test_event_stream_pushes_new_messages(client, create_teacher, create_student, create_match):
+    """Testa se o stream SSE do destinatário recebe a mensagem enviada"""
+    teacher = create_teacher()
+    student = create_student()
+    match_id = create_match(teacher['user_id'], student['user_id'])
+
+    token = client.post('/api/events/token', json={},
+                        headers={'Authorization': f"Bearer {teacher['token']}"}).get_json()['token']
+    response = client.get(f'/api/events/stream?token={token}')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() for chunk in response.response)
+
+    assert 'retry:' in next(chunks)
+    assert 'event: ready' in next(chunks)
+
+    client.post('/api/chat/send', json={'match_id': match_id, 'message_text': 'Oi!'},
+                headers={'Authorization': f"Bearer {student['token']}"})
+
+    assert 'event: message' in next(chunks)
+    assert 'event: unread' in next(chunks)
+
+    response.close()
+    assert not event_hub.is_connected(teacher['user_id'])
+
+
+def test_event_stream_requires_short_lived_stream_token(client, app, create_user, monkeypatch):
+    """Testa se o stream recusa o JWT de login e tokens de stream expirados ou adulterados"""
+    user = create_user(name='User', email='user@example.com')
+    headers = {'Authorization': f"Bearer {user['token']}"}
+
+    assert client.get('/api/events/stream').status_code == 401
+    assert client.get(f"/api/events/stream?jwt={user['token']}").status_code == 401
+    assert client.get(f"/api/events/stream?token={user['token']}").status_code == 401
+    assert client.post('/api/events/token', json={}).status_code == 401
+
+    data = client.post('/api/events/token', json={}, headers=headers).get_json()
+    assert data['expires_in'] == STREAM_TOKEN_MAX_AGE_S
+    # O token do stream não autentica as demais rotas
+    assert client.get('/api/chat/conversations',
+                      headers={'Authorization': f"Bearer {data['token']}"}).status_code == 422
+
+    # Token emitido há mais que a validade
+    monkeypatch.setattr(TimestampSigner, 'get_timestamp',
+                        lambda self: int(time.time()) - STREAM_TOKEN_MAX_AGE_S - 1)
+    expired = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=STREAM_TOKEN_SALT).dumps(user['user_id'])
+    monkeypatch.undo()
+    assert client.get(f'/api/events/stream?token={expired}').status_code == 401
+    assert client.get(f"/api/events/stream?token={data['token']}x").status_code == 401
+
+
+def test_event_stream_not_iterated_leaves_no_subscription(app, client, create_user):
+    """Testa se um stream descartado antes do primeiro chunk não deixa inscrição no hub"""
+    user = create_user(name='User', email='user@example.com')
+    token = client.post('/api/events/token', json={},
+                        headers={'Authorization': f"Bearer {user['token']}"}).get_json()['token']
+
+    # Direto pelo WSGI: o servidor fecha o corpo sem pedir nenhum chunk
+    environ = EnvironBuilder(path='/api/events/stream', query_string={'token': token}).get_environ()
+    body = app(environ, lambda status, headers, exc_info=None: None)
+    body.close()
+
+    assert not event_hub.is_connected(user['user_id'])
@@ -0,0 +1,126 @@
+"""
+Testes para backend/geo.py e o filtro radius_km de /api/discover/profiles
+"""
+
+import math
+
+from backend.geo import CELL_DEGREES, CELLS_PER_ROW, _row_col, cell_ranges, haversine_km
+
+
+def _set_postal_code(client, user, postal_code):
+    response = client.put('/api/profile/update', json={'postal_code': postal_code},
+                          headers={'Authorization': f"Bearer {user['token']}"})
+    assert response.status_code == 200
+
+
+def test_cell_ranges_cover_every_point_in_radius():
+    """Testa se as faixas de geo_cell cobrem todos os pontos dentro do raio"""
+    for lat, lon, radius_km in ((-23.55, -46.63, 50), (-3.1, -60.0, 300), (-30.0, -51.2, 5)):
+        ranges = cell_ranges(lat, lon, radius_km)
+        step = CELL_DEGREES / 4
+        reach = radius_km / 100
+        for i in range(-int(reach / step) - 1, int(reach / step) + 2):
+            for j in range(-int(reach / step) - 1, int(reach / step) + 2):
+                point = (lat + i * step, lon + j * step / math.cos(math.radians(lat)))
+                if haversine_km(lat, lon, *point) > radius_km:
+                    continue
+                row, col = _row_col(*point)
+                cell = row * CELLS_PER_ROW + col
+                assert any(low <= cell <= high for low, high in ranges), point
+
+
+def test_profiles_within_radius_with_distance(client, create_user, db_connection):
+    """Testa a geocodificação pelo CEP, o filtro por raio, a ordem por distância e a paginação"""
+    student = create_user(name='Student', email='student@example.com', user_type='student',
+                          interests=[{'name': 'Python'}])
+    teachers = {
+        name: create_user(name=name, email=f'{name.lower()}@example.com', user_type='teacher',
+                          skills=[{'name': 'Violão'}])
+        for name in ('Capital', 'Interior', 'Rio', 'Unknown')
+    }
+    _set_postal_code(client, student, '01310-100')
+    _set_postal_code(client, teachers['Capital'], '04538-132')
+    _set_postal_code(client, teachers['Interior'], '13010-000')
+    _set_postal_code(client, teachers['Rio'], '20040-020')
+
+    row = db_connection.execute(
+        'SELECT latitude, longitude, geo_cell FROM users WHERE id = ?', (teachers['Rio']['user_id'],)
+    ).fetchone()
+    assert (row[0], row[1]) == (-22.9068, -43.1729)
+    assert row[2] is not None
+    headers = {'Authorization': f"Bearer {student['token']}"}
+
+    data = client.get('/api/discover/profiles?radius_km=50', headers=headers).get_json()
+    assert [(p['id'], p['distance_km']) for p in data['profiles']] == [(teachers['Capital']['user_id'], 0.0)]
+    assert data['location_precision'] == 'city'
+    assert data['profiles'][0]['distance_precision'] == 'city'
+
+    first = client.get('/api/discover/profiles?radius_km=300&limit=1', headers=headers).get_json()
+    assert [p['id'] for p in first['profiles']] == [teachers['Capital']['user_id']]
+    assert first['has_more'] is True
+    second = client.get('/api/discover/profiles', query_string={
+        'radius_km': 300, 'limit': 5, 'cursor': first['next_cursor']
+    }, headers=headers).get_json()
+    assert [p['id'] for p in second['profiles']] == [teachers['Interior']['user_id']]
+    assert 200 < second['profiles'][0]['distance_km'] < 300
+    # CEP do interior só é localizado pelo centroide do estado
+    assert second['profiles'][0]['distance_precision'] == 'state'
+
+    # Sem raio: o deck de sempre, com a distância quando os dois têm CEP
+    profiles = client.get('/api/discover/profiles', headers=headers).get_json()['profiles']
+    distances = {p['id']: (p['distance_km'], p['distance_precision']) for p in profiles}
+    assert distances[teachers['Unknown']['user_id']] == (None, None)
+    assert 300 < distances[teachers['Rio']['user_id']][0] < 400
+    assert distances[teachers['Rio']['user_id']][1] == 'city'
+
+    assert client.get('/api/discover/profiles?radius_km=0', headers=headers).status_code == 400
+    unknown_headers = {'Authorization': f"Bearer {teachers['Unknown']['token']}"}
+    assert client.get('/api/discover/profiles?radius_km=10', headers=unknown_headers).status_code == 400
+
+
+def test_nearby_excludes_swipes_missing_from_cache(client, create_user, db_connection):
+    """Testa se um swipe gravado por outro processo (fora do swipe_cache) tira o perfil do raio"""
+    student = create_user(name='Student', email='student@example.com', user_type='student')
+    teacher = create_user(name='Teacher', email='teacher@example.com', user_type='teacher')
+    _set_postal_code(client, student, '01310-100')
+    _set_postal_code(client, teacher, '04538-132')
+    headers = {'Authorization': f"Bearer {student['token']}"}
+
+    # Carrega o bitmap de swipes do aluno no cache deste processo
+    data = client.get('/api/discover/profiles?radius_km=50', headers=headers).get_json()
+    assert [p['id'] for p in data['profiles']] == [teacher['user_id']]
+
+    db_connection.execute(
+        "INSERT INTO swipes (from_user_id, to_user_id, swipe_type) VALUES (?, ?, 'skip')",
+        (student['user_id'], teacher['user_id'])
+    )
+    db_connection.commit()
+
+    assert client.get('/api/discover/profiles?radius_km=50', headers=headers).get_json()['profiles'] == []
+
+
+def test_load_postal_centroids_command(client, create_user, db_connection, runner, tmp_path):
+    """Testa se a CLI carrega uma base de CEP mais fina de um CSV e, sem arquivo, volta às faixas da migração"""
+    teacher = create_user(name='Teacher', email='teacher@example.com', user_type='teacher')
+    _set_postal_code(client, teacher, '13010-000')
+
+    def location():
+        return tuple(db_connection.execute(
+            'SELECT latitude, longitude FROM users WHERE id = ?', (teacher['user_id'],)
+        ).fetchone())
+
+    assert location() == (-22.19, -48.79)
+
+    finer = tmp_path / 'cep.csv'
+    finer.write_text(
+        'cep_start,cep_end,state,place,latitude,longitude,precision\n'
+        '13000,13149,SP,Campinas,-22.9056,-47.0608,city\n',
+        encoding='utf-8'
+    )
+    result = runner.invoke(args=['load-postal-centroids', str(finer)])
+    assert result.exit_code == 0
+    assert location() == (-22.9056, -47.0608)
+
+    result = runner.invoke(args=['load-postal-centroids'])
+    assert result.exit_code == 0
+    assert location() == (-22.19, -48.79)
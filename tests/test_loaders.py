@@ -0,0 +1,87 @@
+"""
+Testes para backend/loaders.py
+"""
+
+import pytest
+
+from backend.loaders import BatchLoader
+
+
+def _insert_user(cursor, name, user_type):
+    cursor.execute(
+        'INSERT INTO users (name, email, password_hash, user_type) VALUES (?, ?, ?, ?)',
+        (name, f'{name.lower()}@test.com', 'hash', user_type)
+    )
+    return cursor.lastrowid
+
+
+@pytest.fixture
+def populated_db(db_connection):
+    """Professores com habilidades, um aluno e matches com avaliações"""
+    cursor = db_connection.cursor()
+    student_id = _insert_user(cursor, 'Student', 'student')
+    teacher_ids = [_insert_user(cursor, f'Teacher{i}', 'teacher') for i in range(5)]
+
+    for teacher_id in teacher_ids:
+        for skill in ('Python', 'Java'):
+            cursor.execute(
+                'INSERT INTO teacher_skills (user_id, skill_name) VALUES (?, ?)',
+                (teacher_id, skill)
+            )
+        cursor.execute(
+            'INSERT INTO matches (user1_id, user2_id) VALUES (?, ?)',
+            (student_id, teacher_id)
+        )
+        match_id = cursor.lastrowid
+        cursor.execute(
+            'INSERT INTO ratings (match_id, rater_id, rated_id, rating) VALUES (?, ?, ?, ?)',
+            (match_id, student_id, teacher_id, 4)
+        )
+
+    db_connection.commit()
+    return student_id, teacher_ids
+
+
+def test_loader_groups_skills_by_user(db_connection, populated_db):
+    """Testa se as habilidades voltam agrupadas por usuário, com lista vazia para quem não tem"""
+    student_id, teacher_ids = populated_db
+    loader = BatchLoader(db_connection.cursor())
+
+    skills = loader.skills(teacher_ids + [student_id])
+
+    assert [s['skill_name'] for s in skills[teacher_ids[0]]] == ['Python', 'Java']
+    assert skills[student_id] == []
+
+
+def test_loader_match_data(db_connection, populated_db):
+    """Testa as avaliações por match e o resumo de avaliações por usuário"""
+    student_id, teacher_ids = populated_db
+    cursor = db_connection.cursor()
+    cursor.execute('SELECT id FROM matches ORDER BY id')
+    match_ids = [row['id'] for row in cursor.fetchall()]
+    loader = BatchLoader(cursor)
+
+    ratings = loader.match_ratings(match_ids, student_id)
+    summaries = loader.rating_summaries(teacher_ids)
+
+    assert all(ratings[m]['mine']['rating'] == 4 for m in match_ids)
+    assert all(ratings[m]['received'] is None for m in match_ids)
+    assert summaries[teacher_ids[0]]['average'] == 4.0
+    assert summaries[teacher_ids[0]]['count'] == 1
+    assert summaries[teacher_ids[0]]['histogram']['4'] == 1
+
+
+def test_loader_query_count_is_constant(db_connection, populated_db):
+    """Testa se cada tipo de dado custa uma consulta, independente do número de ids"""
+    student_id, teacher_ids = populated_db
+    statements = []
+    db_connection.set_trace_callback(statements.append)
+
+    loader = BatchLoader(db_connection.cursor())
+    loader.skills(teacher_ids)
+    loader.rating_summaries(teacher_ids)
+    # Ids já carregados nesta requisição não voltam ao banco
+    loader.skills(teacher_ids[:2])
+
+    db_connection.set_trace_callback(None)
+    assert len(statements) == 2
@@ -0,0 +1,41 @@
+"""
+Testes para a lista de matches de /api/discover/matches
+"""
+
+
+def test_matches_paginated_with_cursor(client, create_user, create_match, db_connection):
+    """Testa se a lista pagina do match mais recente ao mais antigo, com os dois lados do par"""
+    student = create_user(name='Student', email='student@example.com', user_type='student',
+                          interests=[{'name': 'Python'}])
+    teachers = [
+        create_user(name=f'T{k}', email=f't{k}@example.com', user_type='teacher',
+                    skills=[{'name': f'skill{j}', 'level': 'advanced'} for j in range(k + 4)])
+        for k in range(3)
+    ]
+    match_ids = [create_match(student['user_id'], teacher['user_id']) for teacher in teachers]
+    headers = {'Authorization': f"Bearer {student['token']}"}
+    client.post('/api/chat/send', json={'match_id': match_ids[0], 'message_text': 'oi'}, headers=headers)
+
+    first = client.get('/api/discover/matches?limit=2', headers=headers).get_json()
+    assert [m['match_id'] for m in first['matches']] == [match_ids[2], match_ids[1]]
+    assert first['has_more'] is True
+    assert len(first['matches'][0]['tags']) == 5
+    assert first['matches'][0]['tags'][0] == {'name': 'skill0', 'level': 'advanced'}
+
+    second = client.get('/api/discover/matches', query_string={'limit': 2, 'cursor': first['next_cursor']},
+                        headers=headers).get_json()
+    assert [m['match_id'] for m in second['matches']] == [match_ids[0]]
+    assert second['has_more'] is False and second['next_cursor'] is None
+    assert second['matches'][0]['last_message']['is_mine'] is True
+
+    # Sem limit, todos os matches; o professor está no lado user2_id do par
+    teacher_view = client.get('/api/discover/matches',
+                              headers={'Authorization': f"Bearer {teachers[0]['token']}"}).get_json()
+    assert [m['other_user_id'] for m in teacher_view['matches']] == [student['user_id']]
+    assert teacher_view['matches'][0]['unread_count'] == 1
+
+    assert client.get('/api/discover/matches?cursor=x', headers=headers).status_code == 400
+    plan = ' '.join(row[3] for row in db_connection.execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM matches WHERE user2_id = ?', (1,)
+    ))
+    assert 'idx_matches_user2' in plan
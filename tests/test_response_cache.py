@@ -0,0 +1,86 @@
+"""
+Testes para backend/response_cache.py
+"""
+
+import threading
+import time
+
+from backend.response_cache import ResponseCache, response_cache
+
+
+def test_cache_versions_lru_and_ttl(test_db):
+    """Testa se a entrada vale só para a mesma versão, dentro do TTL e do limite de entradas"""
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    calls = []
+
+    def compute(value):
+        def _compute():
+            calls.append(value)
+            return value
+        return _compute
+
+    assert cache.get_or_compute(('me', 1, ''), 'v1', compute('a')) == 'a'
+    assert cache.get_or_compute(('me', 1, ''), 'v1', compute('b')) == 'a'
+    assert cache.get_or_compute(('me', 1, ''), 'v2', compute('c')) == 'c'
+    cache.get_or_compute(('me', 2, ''), 'v1', compute('d'))
+    cache.get_or_compute(('me', 3, ''), 'v1', compute('e'))
+    assert cache.get_or_compute(('me', 1, ''), 'v2', compute('f')) == 'f'
+
+    cache.invalidate_users(1)
+    assert cache.get_or_compute(('me', 1, ''), 'v2', compute('g')) == 'g'
+    assert cache.get_or_compute(('me', 9, ''), 'v1', compute(None), store_if=lambda v: v is not None) is None
+    assert ('me', 9, '') not in cache._entries
+
+    cache.ttl_seconds = 0
+    cache.get_or_compute(('stats', 4, ''), 'v1', compute('h'))
+    assert cache.get_or_compute(('stats', 4, ''), 'v1', compute('i')) == 'i'
+
+    stats = cache.stats()
+    assert calls == ['a', 'c', 'd', 'e', 'f', 'g', None, 'h', 'i']
+    assert stats['hits'] == 1 and stats['stale'] == 1 and stats['expired'] == 1
+    assert stats['evictions'] == 3 and stats['invalidations'] == 1
+
+
+def test_cache_single_flight(test_db):
+    """Testa se requisições simultâneas para a mesma chave calculam a resposta uma vez"""
+    cache = ResponseCache()
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return 'valor'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute(('k', 1, ''), 'v', slow)))
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute(('k', 1, ''), 'v', slow)))
+        for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert results == ['valor'] * 5
+    assert len(calls) == 1
+    assert cache.stats()['coalesced'] == 4
+
+
+def test_profile_served_from_cache_until_update(client, create_teacher):
+    """Testa se /profile/me vem do cache e é recalculado após update_profile"""
+    teacher = create_teacher()
+    headers = {'Authorization': f"Bearer {teacher['token']}"}
+
+    client.get('/api/profile/me', headers=headers)
+    before = response_cache.stats()
+    assert client.get('/api/profile/me', headers=headers).get_json()['id'] == teacher['user_id']
+    assert response_cache.stats()['hits'] == before['hits'] + 1
+
+    client.put('/api/profile/update', json={'bio': 'Atualizada'}, headers=headers)
+    assert response_cache.stats()['invalidations'] > before['invalidations']
+    assert client.get('/api/profile/me', headers=headers).get_json()['bio'] == 'Atualizada'
@@ -0,0 +1,85 @@
+"""
+Testes para a busca textual de perfis (/api/discover/search)
+"""
+
+import pytest
+
+
+@pytest.fixture
+def search_users(create_user):
+    """Aluno e professores com habilidades e bios diferentes"""
+    def teacher(name, skills, bio=''):
+        return create_user(
+            name=name, email=f'{name.lower()}@example.com', user_type='teacher', bio=bio,
+            skills=[{'name': skill, 'level': 'advanced'} for skill in skills]
+        )
+
+    student = create_user(
+        name='Python Student', email='student@example.com', user_type='student',
+        interests=[{'name': 'Python', 'difficulty': 'beginner'}]
+    )
+    teachers = {
+        'python': teacher('Ana', ['Python', 'SQL']),
+        'bio': teacher('Bruno', ['Java'], bio='Também ensino python para iniciantes'),
+        'guitar': teacher('Carla', ['Violão'])
+    }
+    headers = {'Authorization': f"Bearer {student['token']}"}
+    return student, teachers, headers
+
+
+def _search(client, headers, **params):
+    response = client.get('/api/discover/search', query_string=params, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_ranks_prefix_matches_of_opposite_type(client, search_users):
+    """Testa prefixo, acentos, filtro pelo tipo oposto, ordem por relevância e paginação"""
+    _, teachers, headers = search_users
+
+    data = _search(client, headers, q='pyt')
+    # O aluno "Python Student" não aparece; a habilidade pesa mais que a bio
+    assert [p['id'] for p in data['profiles']] == [
+        teachers['python']['user_id'], teachers['bio']['user_id']
+    ]
+    assert data['profiles'][0]['skills'][0]['skill_name'] == 'Python'
+
+    assert [p['id'] for p in _search(client, headers, q='violao')['profiles']] == [teachers['guitar']['user_id']]
+    assert _search(client, headers, q='python java')['profiles'][0]['id'] == teachers['bio']['user_id']
+
+    first = _search(client, headers, q='python', limit=1)
+    assert first['has_more'] is True
+    second = _search(client, headers, q='python', limit=1, cursor=first['next_cursor'])
+    assert [p['id'] for p in second['profiles']] == [teachers['bio']['user_id']]
+    assert second['has_more'] is False
+
+    response = client.get(
+        '/api/discover/search', query_string={'q': 'java', 'cursor': first['next_cursor']}, headers=headers
+    )
+    assert response.status_code == 400
+    assert client.get('/api/discover/search', query_string={'q': '"*'}, headers=headers).status_code == 400
+
+
+def test_search_index_follows_profile_updates(client, search_users):
+    """Testa se os triggers mantêm o índice em dia com bio e habilidades"""
+    _, teachers, headers = search_users
+    teacher_headers = {'Authorization': f"Bearer {teachers['guitar']['token']}"}
+
+    response = client.put('/api/profile/update', json={
+        'bio': 'Aulas de harmonia', 'skills': [{'name': 'Ukulele', 'level': 'beginner'}]
+    }, headers=teacher_headers)
+    assert response.status_code == 200
+
+    assert _search(client, headers, q='violao')['profiles'] == []
+    assert [p['id'] for p in _search(client, headers, q='ukul')['profiles']] == [teachers['guitar']['user_id']]
+    assert [p['id'] for p in _search(client, headers, q='harmonia')['profiles']] == [teachers['guitar']['user_id']]
+
+
+def test_search_unavailable_without_index(client, search_users, db_connection):
+    """Testa se a busca responde 503 quando o banco não tem a tabela FTS5"""
+    _, _, headers = search_users
+    db_connection.execute('DROP TABLE profile_search')
+    db_connection.commit()
+
+    response = client.get('/api/discover/search', query_string={'q': 'python'}, headers=headers)
+    assert response.status_code == 503
@@ -0,0 +1,115 @@
+"""
+Testes para os swipes de /api/discover (individual e em lote)
+"""
+
+
+def _headers(user):
+    return {'Authorization': f"Bearer {user['token']}"}
+
+
+def test_swipe_batch_creates_swipes_and_matches(client, create_student, create_teacher, create_user, db_connection):
+    """Testa se o lote registra os swipes na ordem e cria os matches dos likes mútuos"""
+    student = create_student()
+    teacher = create_teacher()
+    other = create_user(name='Other', email='other@example.com', user_type='teacher')
+    client.post('/api/discover/swipe', json={'to_user_id': student['user_id'], 'swipe_type': 'like'},
+                headers=_headers(teacher))
+    client.post('/api/discover/swipe', json={'to_user_id': student['user_id'], 'swipe_type': 'like'},
+                headers=_headers(other))
+
+    response = client.post('/api/discover/swipe/batch', json={'swipes': [
+        {'to_user_id': teacher['user_id'], 'swipe_type': 'like'},
+        {'to_user_id': other['user_id'], 'swipe_type': 'skip'},
+        {'to_user_id': teacher['user_id'], 'swipe_type': 'skip'},
+        {'to_user_id': 9999, 'swipe_type': 'like'},
+        {'to_user_id': student['user_id'], 'swipe_type': 'like'}
+    ]}, headers=_headers(student))
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [r['status'] for r in data['results']] == ['created', 'created', 'duplicate', 'invalid', 'invalid']
+    assert data['results'][0]['match'] is True
+    assert data['results'][1]['match'] is False
+    assert data['match_ids'] == [data['results'][0]['match_id']]
+
+    rows = db_connection.execute(
+        'SELECT to_user_id, swipe_type FROM swipes WHERE from_user_id = ? ORDER BY id', (student['user_id'],)
+    ).fetchall()
+    assert [tuple(row) for row in rows] == [(teacher['user_id'], 'like'), (other['user_id'], 'skip')]
+    assert db_connection.execute('SELECT COUNT(*) FROM matches').fetchone()[0] == 1
+
+    # Repetir o lote não grava nada de novo
+    again = client.post('/api/discover/swipe/batch', json={'swipes': [
+        {'to_user_id': teacher['user_id'], 'swipe_type': 'like'}
+    ]}, headers=_headers(student)).get_json()
+    assert again['results'][0]['status'] == 'duplicate' and again['match_ids'] == []
+
+
+def test_swipe_batch_validates_body(client, create_student):
+    """Testa se o lote rejeita corpo vazio, itens inválidos e lotes grandes demais"""
+    headers = _headers(create_student())
+
+    assert client.post('/api/discover/swipe/batch', json={}, headers=headers).status_code == 400
+    response = client.post('/api/discover/swipe/batch', json={'swipes': [
+        {'to_user_id': 2, 'swipe_type': 'like'}, {'to_user_id': 3, 'swipe_type': 'love'}
+    ]}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('swipes[1]')
+    too_many = [{'to_user_id': i, 'swipe_type': 'skip'} for i in range(101)]
+    assert client.post('/api/discover/swipe/batch', json={'swipes': too_many}, headers=headers).status_code == 400
+
+
+def test_mutual_like_creates_match_in_trigger(client, create_student, create_teacher, db_connection):
+    """Testa se o like mútuo vira match no próprio INSERT e se os likes recebidos usam o índice"""
+    student = create_student()
+    teacher = create_teacher()
+
+    first = client.post('/api/discover/swipe', json={'to_user_id': teacher['user_id'], 'swipe_type': 'like'},
+                        headers=_headers(student)).get_json()
+    assert first['match'] is False
+    second = client.post('/api/discover/swipe', json={'to_user_id': student['user_id'], 'swipe_type': 'like'},
+                         headers=_headers(teacher)).get_json()
+    assert second['match'] is True
+
+    matches = db_connection.execute('SELECT user1_id, user2_id FROM matches').fetchall()
+    assert [tuple(row) for row in matches] == [
+        (min(student['user_id'], teacher['user_id']), max(student['user_id'], teacher['user_id']))
+    ]
+
+    plan = ' '.join(row[3] for row in db_connection.execute(
+        "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM swipes WHERE to_user_id = ? AND swipe_type = 'like'", (1,)
+    ))
+    assert 'COVERING INDEX idx_swipes_to_type_from' in plan
+
+
+def test_swipe_rejects_own_profile(client, create_student, db_connection):
+    """Testa se o swipe individual recusa o próprio usuário (sem auto-match)"""
+    student = create_student()
+
+    response = client.post('/api/discover/swipe', json={'to_user_id': student['user_id'], 'swipe_type': 'like'},
+                           headers=_headers(student))
+
+    assert response.status_code == 400
+    assert db_connection.execute('SELECT COUNT(*) FROM swipes').fetchone()[0] == 0
+    assert db_connection.execute('SELECT COUNT(*) FROM matches').fetchone()[0] == 0
+
+
+def test_like_does_not_report_existing_match(client, create_student, create_teacher, create_user, create_match):
+    """Testa se um match que já existia (criado fora dos swipes) não é reportado como novo"""
+    student = create_student()
+    teacher = create_teacher()
+    other = create_user(name='Other', email='other@example.com', user_type='teacher')
+    create_match(student['user_id'], teacher['user_id'])
+    create_match(student['user_id'], other['user_id'])
+    for user in (teacher, other):
+        client.post('/api/discover/swipe', json={'to_user_id': student['user_id'], 'swipe_type': 'like'},
+                    headers=_headers(user))
+
+    single = client.post('/api/discover/swipe', json={'to_user_id': teacher['user_id'], 'swipe_type': 'like'},
+                         headers=_headers(student)).get_json()
+    batch = client.post('/api/discover/swipe/batch', json={'swipes': [
+        {'to_user_id': other['user_id'], 'swipe_type': 'like'}
+    ]}, headers=_headers(student)).get_json()
+
+    assert single['match'] is False
+    assert batch['results'][0]['status'] == 'created' and batch['match_ids'] == []
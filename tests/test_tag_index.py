@@ -0,0 +1,102 @@
+"""
+Testes para backend/tag_index.py
+"""
+
+from backend.tag_index import normalize_tag, tag_index
+
+
+def test_normalize_tag():
+    """Testa se espaços extras e maiúsculas não diferenciam tags"""
+    assert normalize_tag('  Machine   Learning ') == 'machine learning'
+    assert normalize_tag('PYTHON') == normalize_tag('python')
+
+
+def test_tag_index_tracks_profile_writes(client, create_user):
+    """Testa se register e update_profile mantêm as listas invertidas e a pontuação"""
+    student = create_user(
+        name='Student', email='student@example.com', user_type='student',
+        interests=[{'name': 'Python'}, {'name': 'SQL'}]
+    )
+    teacher = create_user(
+        name='Teacher', email='teacher@example.com', user_type='teacher',
+        skills=[{'name': 'python '}, {'name': 'Java'}]
+    )
+
+    assert tag_index.users_with('Python', 'teacher') == [teacher['user_id']]
+    assert tag_index.score(student['user_id'], 'teacher') == {teacher['user_id']: 1}
+
+    client.put('/api/profile/update', json={'skills': [{'name': 'SQL'}, {'name': 'Python'}]},
+               headers={'Authorization': f"Bearer {teacher['token']}"})
+
+    assert tag_index.users_with('java', 'teacher') == []
+    assert tag_index.tags_of(teacher['user_id']) == {'sql', 'python'}
+    assert tag_index.score(student['user_id'], 'teacher') == {teacher['user_id']: 2}
+    # O professor é pontuado contra os alunos pelas próprias habilidades
+    assert tag_index.score(teacher['user_id'], 'student') == {student['user_id']: 2}
+
+
+def test_tag_dictionary_ids_aliases_and_backfill(client, create_user, db_connection, runner):
+    """Testa se grafias, acentos e apelidos viram o mesmo tag_id, também no backfill"""
+    assert normalize_tag(' Violão ') == normalize_tag('VIOLAO') == 'violao'
+
+    student = create_user(
+        name='Student', email='student@example.com', user_type='student',
+        interests=[{'name': 'Violão'}, {'name': 'JS'}]
+    )
+    teacher = create_user(
+        name='Teacher', email='teacher@example.com', user_type='teacher',
+        skills=[{'name': 'violao'}, {'name': 'JavaScript'}]
+    )
+
+    rows = db_connection.execute('''
+        SELECT t.tag_id FROM teacher_skills t WHERE t.user_id = ?
+        UNION ALL
+        SELECT i.tag_id FROM student_interests i WHERE i.user_id = ?
+    ''', (teacher['user_id'], student['user_id'])).fetchall()
+    tag_ids = [row[0] for row in rows]
+    assert sorted(tag_ids[:2]) == sorted(tag_ids[2:])
+    assert tag_index.score(student['user_id'], 'teacher') == {teacher['user_id']: 2}
+    assert tag_index.users_with('js', 'teacher') == [teacher['user_id']]
+
+    # Linha gravada sem tag_id (ex.: importação antiga) é ligada pelo comando de backfill
+    db_connection.execute(
+        "INSERT INTO teacher_skills (user_id, skill_name) VALUES (?, 'Cálculo')", (teacher['user_id'],)
+    )
+    db_connection.commit()
+    result = runner.invoke(args=['backfill-tag-ids'])
+    assert result.exit_code == 0
+    canonical = db_connection.execute('''
+        SELECT g.canonical FROM teacher_skills t JOIN tags g ON g.id = t.tag_id
+        WHERE t.skill_name = 'Cálculo'
+    ''').fetchone()[0]
+    assert canonical == 'calculo'
+
+
+def test_suggest_tags_by_prefix_and_usage(client, create_user):
+    """Testa se /api/tags/suggest ordena pelo uso, resolve apelidos e acompanha tags novas"""
+    create_user(
+        name='Student', email='student@example.com', user_type='student',
+        interests=[{'name': 'Python'}, {'name': 'PyTorch'}]
+    )
+    teacher = create_user(
+        name='Teacher', email='teacher@example.com', user_type='teacher',
+        skills=[{'name': 'python'}, {'name': 'Violão'}]
+    )
+
+    response = client.get('/api/tags/suggest', query_string={'prefix': 'PY'})
+    assert response.status_code == 200
+    suggestions = response.get_json()['suggestions']
+    # "py" também é apelido de python, mas a tag aparece uma vez
+    assert [(s['name'].casefold(), s['teachers'], s['students']) for s in suggestions] == [
+        ('python', 1, 1), ('pytorch', 0, 1)
+    ]
+
+    assert [s['name'] for s in client.get('/api/tags/suggest?prefix=viol').get_json()['suggestions']] == ['Violão']
+    assert [s['name'] for s in client.get('/api/tags/suggest?prefix=js').get_json()['suggestions']] == ['javascript']
+
+    client.put('/api/profile/update', json={'skills': [{'name': 'Pygame'}]},
+               headers={'Authorization': f"Bearer {teacher['token']}"})
+    suggestions = client.get('/api/tags/suggest?prefix=py&limit=2').get_json()['suggestions']
+    assert [(s['name'].casefold(), s['usage']) for s in suggestions] == [('pygame', 1), ('python', 1)]
+
+    assert client.get('/api/tags/suggest?prefix=%20').status_code == 400
@@ -0,0 +1,62 @@
+"""
+Testes para backend/write_queue.py
+"""
+
+import pytest
+import sqlite3
+import threading
+
+from backend.write_queue import WriteQueue
+
+
+def _insert_user(cursor, email):
+    cursor.execute(
+        'INSERT INTO users (name, email, password_hash, user_type) VALUES (?, ?, ?, ?)',
+        ('User', email, 'hash', 'student')
+    )
+    return cursor.lastrowid
+
+
+def test_write_queue_returns_result_to_each_caller(test_db):
+    """Testa se cada operação recebe o seu próprio resultado e as que esperam viram um lote"""
+    queue = WriteQueue()
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_insert(cursor, email):
+        # Segura a escritora dentro da transação até as outras operações estarem na fila
+        started.set()
+        assert release.wait(timeout=5)
+        return _insert_user(cursor, email)
+
+    first = queue.submit(blocking_insert, 'user0@test.com')
+    assert started.wait(timeout=5)
+    futures = [queue.submit(_insert_user, f'user{i}@test.com') for i in range(1, 20)]
+    release.set()
+
+    user_ids = [first.result(timeout=5)] + [future.result(timeout=5) for future in futures]
+
+    assert len(set(user_ids)) == 20
+    stats = queue.stats()
+    assert stats['items'] == 20
+    # Um lote com a operação bloqueada e outro com as 19 que esperavam
+    assert stats['batches'] == 2
+    assert stats['batch_size_max'] == 19
+
+
+def test_write_queue_isolates_failing_item(test_db, db_connection):
+    """Testa se a falha de um item não desfaz os outros itens do lote"""
+    queue = WriteQueue(max_batch_delay_ms=50)
+
+    first = queue.submit(_insert_user, 'same@test.com')
+    duplicate = queue.submit(_insert_user, 'same@test.com')
+    other = queue.submit(_insert_user, 'other@test.com')
+
+    assert first.result(timeout=5)
+    assert other.result(timeout=5)
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(timeout=5)
+
+    count = db_connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    assert count == 2
+    assert queue.stats()['failed_items'] == 1